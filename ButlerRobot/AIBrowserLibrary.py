@@ -5,7 +5,7 @@ import copy
 import base64
 import io
 import time
-from dataclasses import asdict
+from dataclasses import asdict, replace
 from PIL import Image
 from enum import Enum, auto
 from robot.api.deco import keyword
@@ -40,8 +40,7 @@ class IAToRFParser:
             # Click in this format: 'action: Click At Bbox (x1=87, y1=146, x2=197, y2=175)'
             bbox: BBox = BBox.from_rf_string(action_lower)
             # BBox is in format (x1, y1, x2, y2) but Robot Framework needs (x, y, width, height)
-            bbox.width = bbox.width - bbox.x
-            bbox.height = bbox.height - bbox.y
+            bbox = replace(bbox, width=bbox.width - bbox.x, height=bbox.height - bbox.y)
             return ('Browser.Click At BBox', bbox)
         elif "input" in action_lower:
             # Input text in this format: 'action: Input Text "text"'
@@ -334,7 +333,7 @@ class AIBrowserLibrary(DataBrowserLibrary):
         # Use deepcopy to avoid change the original task
         root_task: Task = copy.deepcopy(root_)
         ai_task: Task = ai_task_
-        root_task.steps.append(ai_task)
+        root_task.add_step(ai_task)
         # Change name of ai_task
         ai_task.name = task
         task_history: list[PromptStep] =  AIExampleBuilder(root_task, self.with_tasks).build_history(ai_task)
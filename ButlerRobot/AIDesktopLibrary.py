@@ -2,6 +2,7 @@ import os
 import re
 import requests
 import copy
+from dataclasses import replace
 from typing import Optional
 from enum import Enum, auto
 from robot.api.deco import keyword
@@ -35,17 +36,16 @@ class IAToRFParser:
         if 'bbox' in action_lower:
             bbox = BBox.from_rf_string(action_lower)
             # BBox is in format (x1, y1, x2, y2) but Robot Framework needs (x, y, width, height)
-            bbox.width = bbox.width - bbox.x
-            bbox.height = bbox.height - bbox.y
+            bbox = replace(bbox, width=bbox.width - bbox.x, height=bbox.height - bbox.y)
             if self.offset != 0:
                 if self.direction == 'arriba':
-                    bbox.y = bbox.y - self.offset
+                    bbox = replace(bbox, y=bbox.y - self.offset)
                 elif self.direction == 'abajo':
-                    bbox.y = bbox.y + self.offset
+                    bbox = replace(bbox, y=bbox.y + self.offset)
                 elif self.direction == 'izquierda':
-                    bbox.x = bbox.x - self.offset
+                    bbox = replace(bbox, x=bbox.x - self.offset)
                 elif self.direction == 'derecha':
-                    bbox.x = bbox.x + self.offset
+                    bbox = replace(bbox, x=bbox.x + self.offset)
 
         if "click" in action_lower:
             assert bbox is not None, f'Click action needs a bbox: {action}'
@@ -320,7 +320,7 @@ class AIDesktopLibrary(DataDesktopLibrary):
         # Use deepcopy to avoid change the original task
         root_task: Task = copy.deepcopy(root_)
         ai_task: Task = ai_task_
-        root_task.steps.append(ai_task)
+        root_task.add_step(ai_task)
         # TODO: Filter the offset of the instruction
         conv_task = self._remove_spanish_characters(task)
         if 'ir atras' in conv_task.lower() or 've atras' in conv_task.lower() or 'atras' == conv_task.lower():
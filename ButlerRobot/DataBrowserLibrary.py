@@ -1,18 +1,16 @@
-import base64
 import datetime
+import time
 import os
 import random
 import json
 from dataclasses import asdict
 from typing import Optional, Union, Any, List, Dict
-from io import BytesIO
 from enum import Enum, auto
 from datetime import timedelta
 import urllib.request
 import zipfile
 from pathlib import Path
 import pkg_resources
-from PIL import Image
 from Browser import Browser, MouseButton
 from Browser.utils.data_types import(
     MouseButtonAction,
@@ -47,6 +45,10 @@ class TextType(Enum):
         
 
 class DataBrowserLibrary(DataWrapperLibrary):
+    # Keywords that leave an open page and prefixes of keywords that create or close browsers, contexts or pages
+    OPEN_PAGE_KEYWORDS = {'open_browser', 'new_persistent_context', 'new_stealth_persistent_context'}
+    BROWSER_LIFECYCLE_PREFIXES = ('new_', 'close_', 'connect_to_')
+    VIEWPORT_KEYWORDS = BROWSER_LIFECYCLE_PREFIXES + ('open_browser', 'switch_', 'set_viewport_size', 'wait_new_page')
 
     # Capture args and kwargs for the DataBrowserLibrary
     def __init__(self, *args, **kwargs):
@@ -59,6 +61,21 @@ class DataBrowserLibrary(DataWrapperLibrary):
         :param record: Record data. Default: True.
         :param console: Show logs in console. Default: True.
         :param stealth_mode: Run browser in stealth mode. Default: False.
+        :param journal: Append every finished step to <test>.journal and build the json at the end of the test. Default: False.
+        :param screenshot_store: Save screenshots once by content hash and reference them from the json. Default: False.
+        :param async_save: Save the recording in a background thread. Default: False.
+        :param recording_format: Format of the recordings, json or binary (.bhr). Default: json.
+        :param memory_budget_mb: Max MB of screenshots kept in memory (doms are stored compressed in the DomSet and not counted). Past it, the oldest are spilled to disk. Default: None (no limit).
+        :param screenshot_format: Format of the screenshots: png, webp (lossless) or jpeg. Default: png.
+        :param screenshot_quality: Quality of jpeg screenshots. Default: 90.
+        :param screenshot_max_size: Downscale screenshots to fit in <width>x<height>. Default: None (original size).
+        :param screenshot_workers: Threads that encode the screenshots out of the keyword. 0 encodes them in the keyword. Requires async_save without journal: the other saves serialize the new observation at the end of the keyword and would wait for its screenshot. Default: 0.
+        :param keep_screenshots: Keep the screenshot files of the observations in the output dir. Default: False (screenshots are only taken in memory).
+        :param log_level: Minimum level of the recorder messages: TRACE, DEBUG, INFO, WARN, ERROR or NONE. Default: INFO.
+        :param log_buffer: Recorder messages kept before writing them to the log in one batch. Default: 128.
+        :param debug_log: Write the recorder messages to this JSONL file instead of the log and console. Default: None.
+        :param change_detection: Reuse the last observation if the page has not changed (no DOM mutation, scroll, resize, input, navigation or running animation). Default: False.
+        :param profile: Time the phases of the recorder and save a Chrome trace (recorder_trace.json) and a summary at the end of the suite. Default: False.
         """
         # Arguments of the library are only evaluated in execution time. There are two ways to handle this:
         # 1. Add "ButlerRobot.DataBrowser" in "robot.libraries.libdoc.needsArgs" setting to add the arguments in the documentation.
@@ -85,11 +102,36 @@ class DataBrowserLibrary(DataWrapperLibrary):
         output_path = kwargs.pop('output_path', None)
         record = kwargs.pop('record', True)
         console = kwargs.pop('console', True)
+        journal = kwargs.pop('journal', False)
+        screenshot_store = kwargs.pop('screenshot_store', False)
+        async_save = kwargs.pop('async_save', False)
+        recording_format = kwargs.pop('recording_format', 'json')
+        memory_budget_mb = kwargs.pop('memory_budget_mb', None)
+        screenshot_format = kwargs.pop('screenshot_format', 'png')
+        screenshot_quality = kwargs.pop('screenshot_quality', 90)
+        screenshot_max_size = kwargs.pop('screenshot_max_size', None)
+        screenshot_workers = kwargs.pop('screenshot_workers', 0)
+        log_level = kwargs.pop('log_level', 'INFO')
+        log_buffer = kwargs.pop('log_buffer', 128)
+        debug_log = kwargs.pop('debug_log', None)
+        change_detection = kwargs.pop('change_detection', False)
+        profile = kwargs.pop('profile', False)
+        self.keep_screenshots = kwargs.pop('keep_screenshots', False)
         self.stealth_mode = kwargs.pop('stealth_mode', False)
         self.captcha_api_key = kwargs.pop('captcha_api_key', api_key_variables)
 
-        super().__init__(Browser(*args, **kwargs), output_path=output_path, record=record, console=console)
+        super().__init__(Browser(*args, **kwargs), output_path=output_path, record=record, console=console,
+                         journal=journal, screenshot_store=screenshot_store, async_save=async_save,
+                         recording_format=recording_format, memory_budget_mb=memory_budget_mb,
+                         screenshot_format=screenshot_format, screenshot_quality=screenshot_quality,
+                         screenshot_max_size=screenshot_max_size, screenshot_workers=screenshot_workers,
+                         log_level=log_level, log_buffer=log_buffer, debug_log=debug_log,
+                         change_detection=change_detection, profile=profile)
         self._library: Browser = self._library
+        # Cached open state of the browser. None if unknown. See _is_browser_open
+        self._browser_open: Optional[bool] = None
+        # Page state returned by _probe_selector. See _get_page_state
+        self._probed_page_state: Optional[dict] = None
 
         # To filter recorded actions
         self.action_tags = ['PageContent', 'ActionWrapper', 'AI']
@@ -156,7 +198,7 @@ class DataBrowserLibrary(DataWrapperLibrary):
     def _scroll_to_top(self):
         self._library.scroll_by(selector=None, vertical='-100%')
 
-    def _get_viewport(self) -> dict:
+    def _read_viewport(self) -> dict:
         """
         Returs the viewport size in dictionary format: {'width': int, 'height': int}
         Raises Exception if viewport is None.
@@ -176,20 +218,34 @@ class DataBrowserLibrary(DataWrapperLibrary):
         BuiltIn().run_keyword('Browser.Scroll Down', selector)
     
     def _get_screenshot(self, selector=None):
-        if not selector:
-            im_path = self._library.take_screenshot()
-        else:
-            im_path = self._library.take_screenshot(selector)
-        # Read im_path as a PIL image
-        im = Image.open(im_path)
-
-        # Convert to string
-        buff = BytesIO()
-        im.save(buff, format="PNG")
-        img_str = base64.b64encode(buff.getvalue()).decode('ascii')
-        return img_str
+        if self.keep_screenshots:
+            # Browser saves the screenshot in the output dir
+            im_path = self._library.take_screenshot(selector=selector)
+            return self._encode_screenshot(im_path)
+        # Bytes of the screenshot in memory, nothing is written to disk
+        im_bytes = self._library.take_screenshot(selector=selector, return_as=ScreenshotReturnType.bytes)
+        return self._encode_screenshot(im_bytes)
     
     def _is_browser_open(self):
+        """
+        Open state is cached. It is read from the catalog when it is unknown: at start, after a keyword that creates
+        or closes browsers, contexts or pages and after a keyword fails.
+        """
+        if self._browser_open is None:
+            self._browser_open = self._is_browser_open_in_catalog()
+        return self._browser_open
+
+    def _post_run_keyword(self, name: str, failed: bool) -> None:
+        if failed:
+            # The page may have been closed
+            self._browser_open = None
+        elif name in self.OPEN_PAGE_KEYWORDS or 'new_page' in name:
+            self._browser_open = True
+        elif name.startswith(self.BROWSER_LIFECYCLE_PREFIXES):
+            self._browser_open = None
+        super()._post_run_keyword(name, failed)
+
+    def _is_browser_open_in_catalog(self) -> bool:
         catalog = self._library.get_browser_catalog()
         if not catalog or len(catalog) == 0:
             return False
@@ -197,7 +253,7 @@ class DataBrowserLibrary(DataWrapperLibrary):
         if not contexts or len(contexts) == 0:
             return False
         pages = contexts[0]['pages']
-        return pages and len(pages) > 0
+        return bool(pages) and len(pages) > 0
     
     def _get_action_tags(self):
         return self.action_tags
@@ -208,6 +264,26 @@ class DataBrowserLibrary(DataWrapperLibrary):
     def _get_dom(self):
         return self._library.get_page_source()
 
+    def _get_page_state(self) -> Optional[dict]:
+        """
+        Url, viewport and change counters of the frames of the page. See getPageState in javascript/keywords.js.
+        The state returned by the last probe of a selector is used once, it was taken just before.
+        """
+        if self._probed_page_state is not None:
+            page_state, self._probed_page_state = self._probed_page_state, None
+            return page_state
+        try:
+            page_state = self._library.getPageState()
+            # The page state has the viewport after any resize. It is null without a fixed viewport (no_viewport),
+            # then the cached one is kept instead of reading it again in every keyword
+            if page_state.get('viewport'):
+                self._set_viewport(page_state['viewport'])
+            return page_state
+        except Exception as e:
+            # Without the js extension (Ex: not running in robot) the observation is always captured
+            self.logger.debug("Error getting page state: %s", e)
+            return None
+
     def _wait_for_browser(self):
         BuiltIn().sleep(0)  # For safe recording
 
@@ -219,8 +295,8 @@ class DataBrowserLibrary(DataWrapperLibrary):
         """
         return step
     
-    def _element_is_in_viewport(self, bbox: BBox) -> bool:
-        viewport = self._get_viewport()
+    def _element_is_in_viewport(self, bbox: BBox, viewport: Optional[dict] = None) -> bool:
+        viewport = viewport or self._get_viewport()
         return bbox.x + bbox.width <= viewport['width'] \
                 and bbox.y + bbox.height <= viewport['height'] \
                 and bbox.x >= 0 \
@@ -242,27 +318,27 @@ class DataBrowserLibrary(DataWrapperLibrary):
                 }
             }''')
         if not bbox:
-            BuiltIn().log(f'Error getting selector pointer and bbox: {x, y}', console=self.console, level='WARN')
+            self.logger.warn("Error getting selector pointer and bbox: %s", (x, y))
             return None
         if bbox == 'iframe':
             return None
         return BBox(bbox['x'], bbox['y'], bbox['width'], bbox['height'])
 
-    def _retrieve_bbox_and_pointer_from_page(self, selector) -> tuple[None, None] | tuple[BBox, tuple]:
-        # Here in browser libray, this function is going to make the element visible. If there is
-        # a scroll, it will be added to the stack.
-        
+    def _get_element_bbox(self, selector) -> Optional[dict]:
+        """
+        Bounding box of the element with the keywords of Browser. Returns None if the element is not found.
+        """
         # Get element
         try:
             web_element = self._library.get_element(selector)
         except AssertionError as exception:
-            BuiltIn().log(f'Element {selector} not found: {exception}', console=True)
+            self.logger.info("Element %s not found: %s", selector, exception, console=True)
             self.last_selector_error = str(exception)
-            return None, None
+            return None
         except Exception as exception:
-            BuiltIn().log(f'Error getting element {selector}: {exception}', console=self.console)
+            self.logger.info("Error getting element %s: %s", selector, exception)
             self.last_selector_error = str(exception)
-            return None, None
+            return None
         
         # Get element bbox
         try:
@@ -270,16 +346,61 @@ class DataBrowserLibrary(DataWrapperLibrary):
             self.last_selector_error = ""
         except TypeError as exception:
             self.last_selector_error = str(exception)
-            BuiltIn().log(f'Element {selector} found, but fails to get bounding box. Element may be inestable, try adding `Wait For Element State` before Exception: {exception}', console=True, level='WARN')
-            return None, None
+            self.logger.warn("Element %s found, but fails to get bounding box. Element may be inestable, try adding `Wait For Element State` before Exception: %s", selector, exception, console=True)
+            return None
         except Exception as exception:
             # We save the error instead of failing the test. In some cases is expected to do not hace valid selector.
             self.last_selector_error = str(exception)
-            BuiltIn().log(f'Error getting selector pointer and bbox: {exception}', console=self.console)
-            return None, None
+            self.logger.info("Error getting selector pointer and bbox: %s", exception)
+            return None
+        return bbox_
+
+    def _probe_selector(self, selector: str) -> Optional[dict]:
+        """
+        Resolve the selector with one call to the page. See probeSelector in javascript/keywords.js.
+        Returns None if the selector can not be probed: selectors with iframes (>>>), not native to Playwright, not
+        found yet or not unique. Then the element is resolved with the keywords of Browser, which wait for it and
+        report the errors.
+        """
+        if '>>>' in selector:
+            return None
+        try:
+            probe = self._library.probeSelector(selector)
+        except Exception as e:
+            self.logger.debug("Error probing selector %s: %s", selector, e)
+            return None
+        return probe if probe and probe.get('found') else None
+
+    def _retrieve_bbox_and_pointer_from_page(self, selector) -> tuple[None, None] | tuple[BBox, tuple]:
+        start = time.perf_counter()
+        try:
+            return self._retrieve_bbox_and_pointer(selector)
+        finally:
+            self.logger.debug("Selector %s resolved in %.1f ms", selector, (time.perf_counter() - start) * 1000)
+
+    def _retrieve_bbox_and_pointer(self, selector) -> tuple[None, None] | tuple[BBox, tuple]:
+        # Here in browser libray, this function is going to make the element visible. If there is
+        # a scroll, it will be added to the stack.
+        
+        # Bbox, viewport and page state in one call
+        probe = self._probe_selector(selector)
+        viewport: Optional[dict] = None
+        if probe is not None:
+            bbox_ = probe['bbox']
+            viewport = probe['viewport']
+            self._set_viewport(viewport)
+            self._probed_page_state = probe['state'] if self.change_detection else None
+            self.last_selector_error = ""
+        else:
+            bbox_ = self._get_element_bbox(selector)
+            if bbox_ is None:
+                return None, None
         
         # Get observation before scroll and after getting element
-        observation = self._get_observation()
+        try:
+            observation = self._get_observation()
+        finally:
+            self._probed_page_state = None
         # Could be the first observation of the test. Updating first observation
         if self.last_observation == Observation(datetime.datetime.now(), "", "", (0, 0)):
             self._update_start_observation_to_all_stack(observation)
@@ -289,7 +410,11 @@ class DataBrowserLibrary(DataWrapperLibrary):
         scroll_dict = None
         additional_err = ""
         try:
-            scroll_dict = self._library.scrollElementIfNeeded(selector)
+            if probe is not None and probe['in_view']:
+                # Completely visible. scrollElementIfNeeded would not scroll
+                scroll_dict = {'is_element_scrolled': False}
+            else:
+                scroll_dict = self._library.scrollElementIfNeeded(selector)
         except Exception as e:
             if "Unknown engine" in str(e):
                 # This error is raised when the locator is not native to playwright
@@ -297,11 +422,11 @@ class DataBrowserLibrary(DataWrapperLibrary):
             else:
                 level = 'WARN'
                 additional_err = "Element could be scrolled but the bbox is not updated."
-            BuiltIn().log(f'Error in _retrieve_bbox_and_pointer_from_page when trying to scroll with scrollElementIfNeeded: {additional_err}. {e}', console=self.console, level=level)
+            self.logger.log(level, "Error in _retrieve_bbox_and_pointer_from_page when trying to scroll with scrollElementIfNeeded: %s. %s", additional_err, e)
 
         if not scroll_dict:
-            if not self._element_is_in_viewport(BBox(**bbox_)):
-                BuiltIn().log(f'The element is not in the viewport. Check the element is visible. Selector: {selector}', console=self.console)
+            if not self._element_is_in_viewport(BBox(**bbox_), viewport):
+                self.logger.info("The element is not in the viewport. Check the element is visible. Selector: %s", selector)
             return (
                 BBox(**bbox_),
                 (bbox_['x'] + bbox_['width'] / 2,  bbox_['y'] + bbox_['height'] / 2)
@@ -336,8 +461,8 @@ class DataBrowserLibrary(DataWrapperLibrary):
             # For efficiency, don't update observation in complete_start_context
             self.no_record_next_observation = True 
 
-        if not self._element_is_in_viewport(BBox(**bbox_)):
-            BuiltIn().log(f'The element is not in the viewport. Check the element is visible. Selector: {selector}', console=self.console)
+        if not self._element_is_in_viewport(BBox(**bbox_), viewport):
+            self.logger.info("The element is not in the viewport. Check the element is visible. Selector: %s", selector)
 
         return (
                 BBox(**bbox_),
@@ -376,7 +501,7 @@ class DataBrowserLibrary(DataWrapperLibrary):
             # assert current_action.action_args.bbox, 'Trying to click element. The PageAction has no bbox. Last error was: \n' + str(self.last_selector_error)
             status, msg = BuiltIn().run_keyword_and_ignore_error('Browser.Click At BBox', str(current_action.action_args.bbox), True)
             if status == 'FAIL':
-                BuiltIn().log(f'Error clicking at bbox. Step will not be recorded. {msg}', console=self.console, level='WARN')
+                self.logger.warn("Error clicking at bbox. Step will not be recorded. %s", msg)
                 self._library.click(selector, button)
         finally:
             # Push keyword to ignore in end_keyword
@@ -647,12 +772,12 @@ class DataBrowserLibrary(DataWrapperLibrary):
         if seed == -1:
             seed = BuiltIn().get_variable_value('${SEED}', random.randint(0, 100))
         random.seed(seed)
-        height = self._library.get_viewport_size()['height']
+        height = self._get_viewport()['height']
 
         # Try with locator
         if pixels_selector:
             bbox, _ = self._get_bbox_and_pointer(pixels_selector)
-            viewport_height = self._library.get_viewport_size()['height']
+            viewport_height = self._get_viewport()['height']
             if bbox:
                 pixels = (bbox.y + bbox.height) - viewport_height + random.randint(0, height//8)
                 self.scroll_down(pixels)
@@ -689,7 +814,7 @@ class DataBrowserLibrary(DataWrapperLibrary):
         if seed == -1:
             seed = BuiltIn().get_variable_value('${SEED}', random.randint(0, 100))
         random.seed(seed)
-        height = self._library.get_viewport_size()['height']
+        height = self._get_viewport()['height']
 
         # Try with locator
         if pixels_selector:
@@ -739,7 +864,7 @@ class DataBrowserLibrary(DataWrapperLibrary):
         assert bbox, 'Error at Scroll in BBox. Trying to scroll element. The PageAction has no bbox'
         # Get the middle of the bbox
         top_left = (bbox.x, bbox.y)
-        viewport = self._library.get_viewport_size()
+        viewport = self._get_viewport()
         w = min(bbox.width, viewport['width'])
         h = min(bbox.height, viewport['height'])
         middle_coordinates = (top_left[0] + w//2, top_left[1] + h//2)
@@ -886,8 +1011,8 @@ class DataBrowserLibrary(DataWrapperLibrary):
         
         # Get the middle of the bbox
         bottom_right = (bbox.x + bbox.width, bbox.y + bbox.height)
-        view_port = self._library.get_viewport_size()
-        if bottom_right[0] > view_port.width or bottom_right[1] > view_port.height:
+        view_port = self._get_viewport()
+        if bottom_right[0] > view_port['width'] or bottom_right[1] > view_port['height']:
             BuiltIn().log(f'Error at Get Text From BBox. The bbox is out of the viewport. BBox: {asdict(bbox)}', 'WARN', console=True)
             return ''
         text = self._library.getTextFromBboxWithJs(bbox.x, bbox.y, bottom_right[0], bottom_right[1])
@@ -5,11 +5,8 @@ This module provides a library for capturing data from Desktop tests to use
 later for training deep learning models.
 """
 import os
-import base64
-from io import BytesIO
 from typing import Optional, Union
 import pyautogui
-from PIL import Image
 from RPA.Desktop import Desktop
 from RPA.Desktop.keywords.screen import log_image, get_output_dir, _create_unique_path,  Path
 from robot.api.deco import keyword
@@ -19,15 +16,36 @@ from .src.data_types import BBox, Step
 
 
 class DataDesktopLibrary(DataWrapperLibrary):
+    VIEWPORT_KEYWORDS = ('maximize_window',)
 
     # Capture args and kwargs for the DataBrowserLibrary
     def __init__(self, *args, **kwargs):
         """
         Implementation of the DataWrapperLibrary for the Browser library. 
         This library capture data from Browser tests to use later for training deep learning models.
-        """
 
-        super().__init__(Desktop(*args, **kwargs), record=False)
+        :param screenshot_format: Format of the screenshots: png, webp (lossless) or jpeg. Default: png.
+        :param screenshot_quality: Quality of jpeg screenshots. Default: 90.
+        :param screenshot_max_size: Downscale screenshots to fit in <width>x<height>. Default: None (original size).
+        :param screenshot_workers: Threads that encode the screenshots out of the keyword. 0 encodes them in the keyword. Requires async_save without journal: the other saves serialize the new observation at the end of the keyword and would wait for its screenshot. Default: 0.
+        :param log_level: Minimum level of the recorder messages: TRACE, DEBUG, INFO, WARN, ERROR or NONE. Default: INFO.
+        :param log_buffer: Recorder messages kept before writing them to the log in one batch. Default: 128.
+        :param debug_log: Write the recorder messages to this JSONL file instead of the log and console. Default: None.
+        :param profile: Time the phases of the recorder and save a Chrome trace (recorder_trace.json) and a summary at the end of the suite. Default: False.
+        """
+        screenshot_format = kwargs.pop('screenshot_format', 'png')
+        screenshot_quality = kwargs.pop('screenshot_quality', 90)
+        screenshot_max_size = kwargs.pop('screenshot_max_size', None)
+        screenshot_workers = kwargs.pop('screenshot_workers', 0)
+        log_level = kwargs.pop('log_level', 'INFO')
+        log_buffer = kwargs.pop('log_buffer', 128)
+        debug_log = kwargs.pop('debug_log', None)
+        profile = kwargs.pop('profile', False)
+
+        super().__init__(Desktop(*args, **kwargs), record=False, screenshot_format=screenshot_format,
+                         screenshot_quality=screenshot_quality, screenshot_max_size=screenshot_max_size,
+                         screenshot_workers=screenshot_workers, log_level=log_level, log_buffer=log_buffer,
+                         debug_log=debug_log, profile=profile)
         # To filter recorded actions
         self._library: Desktop = self._library
         # Add tags to keywords in SeleniumLibrary.keywords.element
@@ -68,14 +86,8 @@ class DataDesktopLibrary(DataWrapperLibrary):
             im_path = self.take_screenshot()
         else:
             raise NotImplementedError('Screenshot with selector not implemented in Desktop library')
-        # Read im_path as a PIL image
-        im = Image.open(im_path)
-
-        # Convert to string
-        buff = BytesIO()
-        im.save(buff, format="PNG")
-        img_str = base64.b64encode(buff.getvalue()).decode('ascii')
-        return img_str
+        # Image file is returned as is if no transform is needed
+        return self._encode_screenshot(im_path)
     
     def _is_browser_open(self):
         return True
@@ -109,7 +121,7 @@ class DataDesktopLibrary(DataWrapperLibrary):
         # Get the element location, but for this library, the location will be always a bbox.
         return None, None
 
-    def _get_viewport(self) -> dict:
+    def _read_viewport(self) -> dict:
         viewport: dict = self._library.get_display_dimensions()
         return viewport
 
@@ -1,8 +1,5 @@
-import base64
 import random
-from io import BytesIO
 from typing import Optional, Union
-from PIL import Image
 from SeleniumLibrary import SeleniumLibrary
 from robot.libraries.BuiltIn import BuiltIn
 from robot.api.deco import keyword
@@ -11,6 +8,7 @@ from .src.data_types import BBox, SaveStatus, Step
 
 
 class DataSeleniumLibrary(DataWrapperLibrary):
+    VIEWPORT_KEYWORDS = ('open_browser', 'close_', 'switch_', 'set_window_size', 'maximize_browser_window')
 
     # Capture args and kwargs for the DataBrowserLibrary
     def __init__(self, *args, **kwargs):
@@ -21,9 +19,28 @@ class DataSeleniumLibrary(DataWrapperLibrary):
         :param output_path: Path to save data. Default: RobotFramework output directory.
         :param all_json: Save all data in json format. This is use for debuggin purposes. Default: False.
         :param only_actions: Save only actions with tag PageAction. Default: True.
+        :param screenshot_format: Format of the screenshots: png, webp (lossless) or jpeg. Default: png.
+        :param screenshot_quality: Quality of jpeg screenshots. Default: 90.
+        :param screenshot_max_size: Downscale screenshots to fit in <width>x<height>. Default: None (original size).
+        :param screenshot_workers: Threads that encode the screenshots out of the keyword. 0 encodes them in the keyword. Requires async_save without journal: the other saves serialize the new observation at the end of the keyword and would wait for its screenshot. Default: 0.
+        :param log_level: Minimum level of the recorder messages: TRACE, DEBUG, INFO, WARN, ERROR or NONE. Default: INFO.
+        :param log_buffer: Recorder messages kept before writing them to the log in one batch. Default: 128.
+        :param debug_log: Write the recorder messages to this JSONL file instead of the log and console. Default: None.
+        :param profile: Time the phases of the recorder and save a Chrome trace (recorder_trace.json) and a summary at the end of the suite. Default: False.
         """
+        screenshot_format = kwargs.pop('screenshot_format', 'png')
+        screenshot_quality = kwargs.pop('screenshot_quality', 90)
+        screenshot_max_size = kwargs.pop('screenshot_max_size', None)
+        screenshot_workers = kwargs.pop('screenshot_workers', 0)
+        log_level = kwargs.pop('log_level', 'INFO')
+        log_buffer = kwargs.pop('log_buffer', 128)
+        debug_log = kwargs.pop('debug_log', None)
+        profile = kwargs.pop('profile', False)
 
-        super().__init__(SeleniumLibrary(*args, **kwargs))
+        super().__init__(SeleniumLibrary(*args, **kwargs), screenshot_format=screenshot_format,
+                         screenshot_quality=screenshot_quality, screenshot_max_size=screenshot_max_size,
+                         screenshot_workers=screenshot_workers, log_level=log_level, log_buffer=log_buffer,
+                         debug_log=debug_log, profile=profile)
         # To filter recorded actions
         self._library: SeleniumLibrary = self._library
         # Add tags to keywords in SeleniumLibrary.keywords.element
@@ -67,14 +84,8 @@ class DataSeleniumLibrary(DataWrapperLibrary):
             im_path = self._library.capture_page_screenshot()
         else:
             im_path = self._library.capture_element_screenshot(selector)
-        # Read im_path as a PIL image
-        im = Image.open(im_path)
-
-        # Convert to string
-        buff = BytesIO()
-        im.save(buff, format="PNG")
-        img_str = base64.b64encode(buff.getvalue()).decode('ascii')
-        return img_str
+        # Image file is returned as is if no transform is needed
+        return self._encode_screenshot(im_path)
     
     def _is_browser_open(self):
         return bool(self._library.get_browser_ids())
@@ -115,7 +126,7 @@ class DataSeleniumLibrary(DataWrapperLibrary):
         except:
             return None, None
 
-    def _get_viewport(self) -> dict:
+    def _read_viewport(self) -> dict:
         viewport: dict = self._library.execute_javascript('return {width: window.innerWidth, height: window.innerHeight}')
         return viewport
     
@@ -2,6 +2,8 @@ import os
 import inspect
 from datetime import datetime
 import re
+from collections import deque
+from concurrent.futures import wait as wait_futures
 from typing import Optional
 from robot.api.deco import keyword
 from robot.libraries.BuiltIn import BuiltIn
@@ -9,61 +11,103 @@ from robot.running.arguments.embedded import EmbeddedArguments
 # Install with pip install -e .
 # Needs this import to be able to reuse pickle (TODO: Check if it's necessary)
 from .src.data_types import BBox, Observation, Context, Step, PageAction, Task, DomSet, SaveStatus
+from .src.recording_journal import RecordingJournal
+from .src.blob_store import BlobStore, BlobRef
+from .src.background_saver import BackgroundSaver
+from .src.recording_format import RECORDING_EXTENSIONS, save_recording
+from .src.observation_arena import ObservationSpiller
+from .src.screenshot_codec import ScreenshotCodec, EncodingPool, PendingScreenshot, ScreenshotStats
+from .src.recorder_logger import RecorderLogger
+from .src.recorder_profiler import RecorderProfiler
+
+
+class ExecFrame:
+    """
+    A step in execution and the Tasks of the stack it depends on. Computed once when the step is pushed:
+    - parent_task: Task where the steps that end while this frame is on top are added. The step if it is a Task without
+      only_substeps status, else the parent_task of the frame below.
+    - last_task: First Task of the stack above the root (see ExecStack.get_last_task).
+    """
+    __slots__ = ('step', 'parent_task', 'last_task')
+
+    def __init__(self, step: Step, below: 'Optional[ExecFrame]'):
+        self.step = step
+        is_task = isinstance(step, Task)
+        if is_task and step.status != SaveStatus.only_substeps:
+            self.parent_task: Optional[Task] = step  # type: ignore
+        else:
+            self.parent_task = below.parent_task if below is not None else None
+        if below is None:
+            self.last_task: Optional[Task] = None
+        elif below.last_task is not None or not is_task:
+            self.last_task = below.last_task
+        else:
+            self.last_task = step  # type: ignore
 
 
 class ExecStack:
+    """
+    Steps in execution. Every frame references the Task where the finished steps are added, so attaching, removing
+    and popping steps do not search the stack. The status of a Task must be set before pushing it.
+    """
     def __init__(self):
-        self.stack: list[Step] = []
+        self.frames: list[ExecFrame] = []
 
-    def get_stack(self):
-        return self.stack
+    def get_stack(self) -> list[Step]:
+        """
+        Copy of the steps in the stack, from the root to the top. The recorder iterates the frames instead.
+        """
+        return [frame.step for frame in self.frames]
 
     def get_root(self):
-        assert not self.is_empty(), "Error getting root. Stack is empty."
-        return self.stack[0]
+        assert self.frames, "Error getting root. Stack is empty."
+        return self.frames[0].step
     
     def get_last_step(self):
-        assert not self.is_empty(), "Error getting last step. Stack is empty."
-        return self.stack[-1]
+        assert self.frames, "Error getting last step. Stack is empty."
+        return self.frames[-1].step
     
     def is_empty(self):
-        return len(self.stack) == 0
+        return not self.frames
     
-    def add_to_parent(self, step: Step):
-        if not isinstance(self.stack[-1], Task):
-            raise Exception(f"Keyword {self.stack[-1].name} is not a Task. Last step in stack is not a Task")
-        # Get the last task that has not only_steps status
-        for i in range(1, len(self.stack) + 1):
-            # Check if step is a task
-            if isinstance(self.stack[-i], Task):
-                if self.stack[-i].status != SaveStatus.only_substeps:
-                    self.stack[-i].steps.append(step)  # type: ignore
-                    return self
-        else:
+    def get_parent_task(self) -> Task:
+        """
+        Returns the Task where the next finished step will be added.
+        """
+        frame = self.frames[-1]
+        if not isinstance(frame.step, Task):
+            raise Exception(f"Keyword {frame.step.name} is not a Task. Last step in stack is not a Task")
+        if frame.parent_task is None:
             raise Exception("Fail adding step to parent. No Task found in stack without only_substeps status")
+        return frame.parent_task
+
+    def add_to_parent(self, step: Step):
+        self.get_parent_task().add_step(step)
+        return self
     
     def push(self, step: Step):
-        self.stack.append(step)
+        self.frames.append(ExecFrame(step, self.frames[-1] if self.frames else None))
         return self
 
     def pop(self):
-        return self.stack.pop()
+        return self.frames.pop().step
     
+    def get_last_task(self) -> Optional[Task]:
+        """
+        Returns the first Task above the root of the stack. None if there is no Task above the root.
+        """
+        return self.frames[-1].last_task if self.frames else None
+
     def remove_last_step_from_last_task(self) -> tuple[bool, str]:
         if not self.is_empty():
-            last_task: Optional[Task] = None
-            # Get last task
-            for i in range(len(self.stack)-1, 0, -1):
-                # Check if step is a task
-                step = self.stack[i]
-                if isinstance(step, Task):
-                    last_task = step
+            last_task = self.get_last_task()
             if last_task is None:
                 return False, "No task found in stack"
             
             if len(last_task.steps) > 0:
                 # Remove last step
-                step_removed = last_task.steps.pop()
+                step_removed = last_task.steps[-1]
+                last_task.remove_step(step_removed)
                 return True, f"Removed {step_removed.name} from task {last_task.name}"
             else:
                 return False, f"Task {last_task.name} has no steps. Doing nothing."
@@ -71,17 +115,15 @@ class ExecStack:
         else:
             return False, "Stack is empty. Doing nothing."
         
-    def remove_action(self):
+    def remove_action(self) -> PageAction:
         """
-        Replace a keyword with another.
+        Replace a keyword with another. Removes the PageAction at the top of the stack.
         """
-        assert not self.is_empty(), 'Trying to replace a keyword. The stack is empty'
-        # Get bbox where to click
-        assert isinstance(self.get_last_step(), PageAction), 'Trying to replace a keyword. The last step in the stack is not a PageAction'
-        # Remove this action from the stack
-        current_action: PageAction = self.stack.pop()  # type: ignore
-
-        return current_action
+        if not self.frames:
+            raise AssertionError('Trying to replace a keyword. The stack is empty')
+        if not isinstance(self.frames[-1].step, PageAction):
+            raise AssertionError('Trying to replace a keyword. The last step in the stack is not a PageAction')
+        return self.frames.pop().step  # type: ignore
     
 
 class DataWrapperLibrary:
@@ -118,6 +160,8 @@ class DataWrapperLibrary:
 
     ROBOT_LIBRARY_SCOPE = 'GLOBAL'
     ROBOT_LISTENER_API_VERSION = 2
+    # Prefixes of the keywords that can change the page or its size. The cached viewport is read again after them
+    VIEWPORT_KEYWORDS: tuple[str, ...] = ()
 
     # ====== UNDEFINED METHODS ======
 
@@ -144,6 +188,13 @@ class DataWrapperLibrary:
     
     def _pre_run_keyword(self) -> None:
         pass
+
+    def _post_run_keyword(self, name: str, failed: bool) -> None:
+        """
+        Called after running a keyword of the library, also if it fails. Ex: Track the pages that are open.
+        """
+        if failed or name.startswith(self.VIEWPORT_KEYWORDS):
+            self._viewport = None
     
     def _wait_for_browser(self) -> None:
         raise NotImplementedError
@@ -151,13 +202,38 @@ class DataWrapperLibrary:
     def _retrieve_bbox_and_pointer_from_page(self, selector: str) -> tuple[BBox, tuple]:
         raise NotImplementedError
     
+    def _read_viewport(self) -> dict:
+        """
+        Reads the viewport of the browser. Use _get_viewport, that caches it.
+        Format: {"width": width, "height": height}
+        """
+        raise NotImplementedError
+
     def _get_viewport(self) -> dict:
         """
         Returns the viewport of the browser.
         Format: {"width": width, "height": height}
+        The viewport is cached for the current page. It is read again after a keyword in VIEWPORT_KEYWORDS or a
+        failed keyword.
         """
-        raise NotImplementedError
+        if self._viewport is None:
+            viewport = self._read_viewport()
+            self._viewport = {'width': viewport['width'], 'height': viewport['height']}
+        return dict(self._viewport)
+
+    def _set_viewport(self, viewport: Optional[dict]) -> None:
+        """
+        Update the cached viewport with a viewport read from the page (Ex: in the page state). None invalidates it.
+        """
+        self._viewport = {'width': viewport['width'], 'height': viewport['height']} if viewport else None
     
+    def _get_page_state(self) -> Optional[dict]:
+        """
+        Cheap token of the state of the page, compared to know if the page changed since the last observation.
+        Returns None if the library can not tell. Then the observation is always captured.
+        """
+        return None
+
     def _run_scroll(self, selector: str) -> None:
         raise NotImplementedError
     
@@ -170,24 +246,76 @@ class DataWrapperLibrary:
     def _get_observation(self) -> Observation:
         """
         This method crates an Observation. The page must be open.
+        With change_detection, the last captured observation is returned if the page has not changed since then.
         """
-        # Check if dom exists in set to save space disk
-        dom = self._get_dom()
-        dom = self.dom_set.add_dom(dom)
+        with self.profiler.phase('observation'):
+            return self._capture_observation()
+
+    def _capture_observation(self) -> Observation:
+        if self.change_detection and self._captured_observation is not None:
+            with self.profiler.phase('page_state'):
+                page_state = self._get_page_state()
+            observation = self._captured_observation
+            if page_state is not None and page_state == self._captured_page_state:
+                self.observations_reused += 1
+                if observation.pointer_xy == self.last_pointer_xy:
+                    return observation
+                # Same screenshot and dom with the new pointer
+                observation = Observation(datetime.now(), observation._screenshot, observation._dom, self.last_pointer_xy)
+                observation._image_hash = self._captured_observation._image_hash
+                if self.spiller is not None:
+                    self.spiller.track(observation)
+                return observation
+
+        # Store the dom in the DomSet. The observation only holds a reference
+        with self.profiler.phase('dom'):
+            dom = self._get_dom()
+            dom = self.dom_set.add_dom(dom)
+        with self.profiler.phase('screenshot'):
+            screenshot = self._store_screenshot(self._get_screenshot())
         
-        return Observation(
+        observation = Observation(
             datetime.now(),
-            self._get_screenshot(), 
+            screenshot, 
             dom, 
             self.last_pointer_xy
         )
+        self.observations_captured += 1
+        if self.change_detection:
+            # State after the capture. Taking the screenshot can change the page (Ex: hiding the caret)
+            with self.profiler.phase('page_state'):
+                self._captured_page_state = self._get_page_state()
+            self._captured_observation = observation
+        if self.spiller is not None:
+            # Spill the oldest payloads to disk if the memory budget is exceeded
+            self.spiller.track(observation)
+        return observation
+
+    def _get_blob_store(self) -> BlobStore:
+        """
+        Store of screenshots of the current suite. Placed next to the json files.
+        """
+        root_dir = os.path.join(self.suite_out_path, BlobStore.DIR_NAME)
+        if self.blob_store is None or self.blob_store.root_dir != root_dir:
+            self.blob_store = BlobStore(root_dir)
+        return self.blob_store
+
+    def _store_screenshot(self, screenshot: str | PendingScreenshot) -> str | BlobRef | PendingScreenshot:
+        """
+        Save the screenshot in the BlobStore and return its reference. Does nothing if screenshot_store is disabled.
+        Screenshots of the encoding pool are stored by the pool.
+        """
+        if not self.screenshot_store or not screenshot or isinstance(screenshot, PendingScreenshot):
+            return screenshot
+        return self._get_blob_store().put_base64(screenshot)
     
     def _update_start_observation_to_all_stack(self, observation) -> None:
-        for prev_step in self.exec_stack.get_stack():
+        for frame in self.exec_stack.frames:
+            prev_step = frame.step
             if prev_step.context:
                 prev_step.context.start_observation = observation
             else:
-                BuiltIn().log(f"Step {prev_step.name} has no context. No setting it", level="WARN", console=self.console)
+                self.logger.warn("Step %s has no context. No setting it", prev_step.name)
 
     def _get_bbox_and_pointer(self, selector: str | BBox) -> tuple[None, None] | tuple[BBox, tuple]:
             """
@@ -213,24 +341,20 @@ class DataWrapperLibrary:
             self.last_observation = self._get_observation() if observation is None else observation
 
             # Could be a PageAction at the top of the stack. This function only updates the observation of the parents
-            if not self.exec_stack.is_empty() and isinstance(self.exec_stack.get_last_step(), PageAction):
-                last_page_action = self.exec_stack.pop()
-            else:
-                last_page_action = None
+            frames = self.exec_stack.frames
+            top = len(frames) - 1
+            if top >= 0 and isinstance(frames[top].step, PageAction):
+                top -= 1
             
             # Update observation to inmediate parents with no steps. For example, two task, is from 1 to 0 both included.
-            for prev_step_idx in range(len(self.exec_stack.get_stack())-1, -1, -1):
-                prev_step = self.exec_stack.get_stack()[prev_step_idx]
+            for i in range(top, -1, -1):
+                prev_step = frames[i].step
                 if isinstance(prev_step, Task) and len(prev_step.steps) == 0:
                     assert prev_step.context is not None, 'Trying to scroll to top. Error when updating context.'
                     prev_step.context.start_observation = self.last_observation
                 else:
                     break
 
-            # Push back the page action
-            if last_page_action:
-                self.exec_stack.push(last_page_action)
-
     def _add_scroll_when_recording(self, step: PageAction) -> PageAction:
         """
         This method adds a scroll to the step if the step element is not in the viewport.
@@ -275,6 +399,119 @@ class DataWrapperLibrary:
 
         return step
 
+    def _flush_saver(self):
+        """
+        Wait until the background saver writes all the pending recordings.
+        """
+        if self.saver is None:
+            return
+        for error in self.saver.flush():
+            self.logger.warn(error)
+
+    def _encode_screenshot(self, image: bytes | str) -> str | PendingScreenshot:
+        """
+        Encode the screenshot (bytes or path of the image) with the screenshot codec. Returns base64.
+        With an encoding pool the image is only read here. It is encoded (and stored) in the pool.
+        """
+        if self.encoding_pool is None:
+            data = self.screenshot_codec.encode_file(image) if isinstance(image, str) else self.screenshot_codec.encode(image)
+            return self.screenshot_codec.to_base64(data)
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                image = f.read()
+        store = self._get_blob_store().put if self.screenshot_store else None
+        pending = self.encoding_pool.submit(image, store, self._submitted_stats)
+        self._submitted_screenshots.append(pending)
+        return pending
+
+    def _log_screenshot_stats(self, name: str, wait: bool = False):
+        """
+        Report the screenshots of the keyword. Screenshots encoded in the pool are reported with the keyword that
+        submitted them once they are encoded, at the end of a later keyword. With wait, all of them are reported.
+        """
+        self._add_screenshot_stats(name, self.screenshot_codec.pop_stats())
+        if self._submitted_screenshots:
+            self._encoding_keywords.append((name, self._submitted_stats, self._submitted_screenshots))
+            self._submitted_stats = ScreenshotStats()
+            self._submitted_screenshots = []
+        while self._encoding_keywords:
+            keyword_name, stats, pending = self._encoding_keywords[0]
+            if not wait and not all(screenshot.done() for screenshot in pending):
+                break
+            wait_futures([screenshot.future for screenshot in pending])  # Errors are reported when they are saved
+            self._encoding_keywords.popleft()
+            self._add_screenshot_stats(keyword_name, stats)
+
+    def _add_screenshot_stats(self, name: str, stats: ScreenshotStats):
+        """
+        Log the screenshots of a keyword in debug and add them to the stats of the test, logged in info at its end.
+        """
+        if stats.count:
+            self.logger.debug("Screenshots of %s: %s", name, stats)
+            self.test_screenshot_stats.add(stats)
+
+    def _log_test_screenshot_stats(self, name: str):
+        self._log_screenshot_stats(name, wait=True)
+        if self.test_screenshot_stats.count:
+            self.logger.info("Screenshots of test %s: %s", name, self.test_screenshot_stats)
+        self.test_screenshot_stats = ScreenshotStats()
+
+    def _reset_spiller(self):
+        """
+        Discard the payloads spilled by the saved test. Observations still in use are loaded back into memory.
+        """
+        if self.spiller is None:
+            return
+        keep = [self.last_observation, self._captured_observation]
+        for frame in self.exec_stack.frames:
+            step = frame.step
+            if step.context is not None:
+                keep += [step.context.start_observation, step.context.end_observation]
+        self.spiller.reset(keep)
+
+    def _invalidate_keyword_caches(self):
+        self._keyword_dispatch = None
+        self._keyword_names = None
+        self._keyword_keys = None
+
+    def _check_keyword_caches(self):
+        """
+        The keyword caches are built from added_keywords. Invalidate them if it changed since they were built.
+        """
+        if self._cached_added_keywords != self.added_keywords:
+            self._invalidate_keyword_caches()
+            self._cached_added_keywords = list(self.added_keywords)
+
+    def _get_keyword_dispatch(self) -> dict:
+        """
+        Keyword name -> method of the wrapper that implements it. Keywords with @keyword decorator are found by robot
+        name (with '_' instead of ' ' and lower case) and method name, and take precedence over the added keywords.
+        """
+        self._check_keyword_caches()
+        if self._keyword_dispatch is None:
+            dispatch = {}
+            # In reverse order, so the first decorated method of a name wins
+            for func_name, value in reversed(self.keywords_decorator):
+                method = getattr(self, func_name)
+                dispatch[func_name] = method
+                dispatch[value.robot_name.replace(' ', '_').lower()] = method
+            for func_name in self.added_keywords:
+                dispatch.setdefault(func_name, getattr(self, func_name))
+            self._keyword_dispatch = dispatch
+        return self._keyword_dispatch
+
+    def _get_keyword_keys(self) -> set[str]:
+        """
+        Keyword names normalized with _get_key_from_keyword.
+        """
+        self._check_keyword_caches()
+        if self._keyword_keys is None:
+            self._keyword_keys = {self._get_key_from_keyword(k) for k in self.get_keyword_names()}
+        return self._keyword_keys
+
+    def _get_save_path(self, name: str) -> str:
+        return os.path.join(self.suite_out_path, f"{name}{RECORDING_EXTENSIONS[self.recording_format]}")
+
     def _teardown(self):
         pass  # TODO: Do it in the future
         # if not os.getenv('DEVELOPMENT_SERVER'):
@@ -288,22 +525,42 @@ class DataWrapperLibrary:
         This method is called when a suite starts. The things that are done here are:
         - Save dir name with the name of the suite.
         """
-        BuiltIn().log(f"Starting suite {name}", console=self.console)
+        self.logger.info("Starting suite %s", name)
 
         dir_name = f"{name}_{datetime.now().strftime('%Y-%m-%d_%H-%M')}"
         self.suite_out_path: str = os.path.join(BuiltIn().get_variable_value("${OUTPUT_DIR}"), 'data') if self.suite_out_path is None else self.suite_out_path
         self.suite_out_path: str = os.path.join(self.suite_out_path, dir_name)
 
     def _end_suite(self, name, attrs):
+        self._flush_saver()
+        self._log_screenshot_stats(name, wait=True)
+        self.logger.info("Screenshots of suite %s: %s", name, self.screenshot_codec.total_stats)
+        if self.change_detection:
+            self.logger.info("Observations of suite %s: %s captured, %s reused", name, self.observations_captured,
+                             self.observations_reused)
+        if self.profiler.enabled:
+            trace_path = os.path.join(self.suite_out_path, 'recorder_trace.json')
+            self.profiler.save_trace(trace_path)
+            self.logger.info("Recorder profile of suite %s. Trace in %s\n%s", name, trace_path, self.profiler.summary())
+            self.profiler.reset()
         # If is not a development server, uninstall python package
         self._teardown()
+        self.logger.flush()
         
+    def _close(self):
+        self._flush_saver()
+        if self.encoding_pool is not None:
+            self.encoding_pool.close()
+        if self.spiller is not None:
+            self.spiller.close()
+        self.logger.close()
+
     def _start_test(self, name, attrs):
         """
         This method is called when a test starts. The things that are done here are:
         - Create the first Task that will be the root of all nested tasks or actions.
         """
-        BuiltIn().log(f"Starting test {name}", console=self.console)
+        self.logger.info("Starting test %s", name)
 
         # Create a task with the steps of the test
         context = Context(start_observation=self.last_observation, status='NOT SET')
@@ -322,14 +579,24 @@ class DataWrapperLibrary:
         if last_step:
             self.exec_stack.push(last_step)
 
+        # Journal with the steps of the test. Steps are appended when they end
+        if self.record and self.use_journal:
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = RecordingJournal(os.path.join(self.suite_out_path, f"{test_task.name}.journal"))
+            self.journal.open(test_task)
+
     def _end_test(self, name, attrs):
         """
         This method is called when a test ends. The things that are done here are:
         - Warn test with no steps.
         """
-        BuiltIn().log(f"Ending test {name}", console=self.console)
+        self.logger.info("Ending test %s", name)
 
         if not self.record:
+            self._log_test_screenshot_stats(name)
+            self._reset_spiller()
+            self.logger.flush()
             return
 
         assert not self.exec_stack.is_empty(), "Error ending test. The stack must not be empty"
@@ -338,7 +605,7 @@ class DataWrapperLibrary:
 
         # Warn test with no steps
         if len(test_task.steps) <= 0:
-            BuiltIn().log("Test with no steps", "WARN", console=True)
+            self.logger.warn("Test with no steps", console=True)
 
         # Set end observation
         assert test_task.context is not None, "Error setting end observation to root Task. The context must not be None"
@@ -349,15 +616,40 @@ class DataWrapperLibrary:
         # Save test_task to json
         if not os.path.exists(self.suite_out_path):
             os.makedirs(self.suite_out_path)
-        BuiltIn().log(f"Saving test {test_task.name} from {self._library.__class__.__name__} to {self.suite_out_path}", console=True, level="DEBUG")
+        self.logger.debug("Saving test %s from %s to %s", test_task.name, self._library.__class__.__name__, self.suite_out_path, console=True)
 
         # Save in json
-        save_path = os.path.join(self.suite_out_path, f"{name}.json")
-        test_task.save(save_path)
+        save_path = self._get_save_path(name)
+        with self.profiler.phase('save_test'):
+            if self.journal is not None:
+                try:
+                    self.journal.close(test_task)
+                    self.journal.compact(save_path)
+                except Exception as e:
+                    self.logger.warn("Error compacting journal %s: %s. Saving test from memory", self.journal.path, e)
+                    save_recording(test_task, save_path)
+                self.journal = None
+            elif self.saver is not None:
+                self.saver.save(test_task, save_path)
+                self._flush_saver()
+            else:
+                save_recording(test_task, save_path)
+        self._log_test_screenshot_stats(name)
+        self._reset_spiller()
+        self.logger.flush()
 
     def _start_keyword(self, name, attrs) -> Optional[Step]:
         """
-        This method is called when a keyword starts. The things that are done here are:
+        This method is called when a keyword starts. Stacks the step of the keyword. See _start_keyword_step.
+        """
+        self._keyword_depth += 1
+        self.profiler.start_keyword(attrs['kwname'])
+        with self.profiler.phase('start_keyword'):
+            return self._start_keyword_step(name, attrs)
+
+    def _start_keyword_step(self, name, attrs) -> Optional[Step]:
+        """
+        The things that are done here are:
         - Set policy if is a keyword that have to be stored. 
             For now: Test Keyword, Browser(only actions if only_actions=True)
         - Create a step. Set start observation with existing last observation.
@@ -409,7 +701,7 @@ class DataWrapperLibrary:
             
         
         # ============ STEP CREATION ============
-        BuiltIn().log(f"Starting keyword {attrs['kwname']}", console=self.console)
+        self.logger.info("Starting keyword %s", attrs['kwname'])
         context = Context(start_observation=self.last_observation, status=attrs['status'])
         step: Step = Step(
             id=self.id_count, 
@@ -428,7 +720,7 @@ class DataWrapperLibrary:
 
         # Exclude by type
         if is_exclude_type(attrs['type']):
-            BuiltIn().log(f"Keyword {name} is of type {attrs['type']}. Excluding", console=False, level="INFO")
+            self.logger.info("Keyword %s is of type %s. Excluding", name, attrs['type'], console=False)
             step.status = SaveStatus.only_substeps
 
         # Classify keyword as task or action
@@ -451,27 +743,27 @@ class DataWrapperLibrary:
 
         # Filter keywords from other libraries that aren't the wrapper library
         if is_action_from_other_lib(step, attrs['libname']):
-            BuiltIn().log(f"Ignoring kw {name}. Page action not from {self._library.__class__.__name__}", level="INFO", console=self.console)
+            self.logger.info("Ignoring kw %s. Page action not from %s", name, self._library.__class__.__name__)
             step.status = SaveStatus.no_record
 
         # Filter keywords with exclude tags
         if has_exclude_tags(attrs['tags']):
-            BuiltIn().log(f"Ignoring kw {name}. Has exclude tags", level="INFO", console=self.console)
+            self.logger.info("Ignoring kw %s. Has exclude tags", name)
             step.status = SaveStatus.no_record
 
         # Filter keywords with only_substeps tags
         if has_only_substeps_tags(attrs['tags']):
-            BuiltIn().log(f"Keyword {name} has only_substeps tag. Only substeps will be recorded", level="INFO", console=self.console)
+            self.logger.info("Keyword %s has only_substeps tag. Only substeps will be recorded", name)
             step.status = SaveStatus.only_substeps
         
         # All keywords of BuiltIn library are ignored
         if attrs['libname'] == 'BuiltIn':
-            BuiltIn().log(f"Ignoring kw {name}. BuiltIn keyword", level="INFO", console=self.console)
+            self.logger.info("Ignoring kw %s. BuiltIn keyword", name)
             step.status = SaveStatus.only_substeps
 
         # If only_actions: ignore PageAction keywords that are not actions by tag
         if not is_keyword_register_in_lib_as_action(step, attrs['tags']):
-            BuiltIn().log(f"Ignoring kw {name}. No registered as action", level="INFO", console=self.console)
+            self.logger.info("Ignoring kw %s. No registered as action", name)
             step.status = SaveStatus.no_record
 
         if step.status == SaveStatus.no_record:
@@ -496,14 +788,35 @@ class DataWrapperLibrary:
         # ============ STEP STACKING ============
         # Last step must be a Task. If is a PageAction it means that it invokes another PageAction. Not expected, fails.
         if self.exec_stack.is_empty():
-            BuiltIn().log("Executing keyword without Test (interpreter only). To start recording use 'Start Task  ${task_name}'. This keyword won't be recorded.", 
-                console=self.console, level="INFO")
+            self.logger.info("Executing keyword without Test (interpreter only). To start recording use 'Start Task  ${task_name}'. This keyword won't be recorded.")
         # Stack step
         self.exec_stack.push(step)
 
     def _end_keyword(self, name, attrs):
         """
-        This method is called when a keyword ends. The things that are done here are:
+        This method is called when a keyword ends. Records the step and reports the screenshots taken by the keyword.
+        Messages of the recorder are written in the log when a keyword of the test ends.
+        """
+        try:
+            with self.profiler.phase('end_keyword'):
+                self._end_keyword_step(name, attrs)
+        finally:
+            self.profiler.end_keyword()
+            self._log_screenshot_stats(name)
+            self._keyword_depth = max(0, self._keyword_depth - 1)
+            if self._keyword_depth == 0:
+                self.logger.flush()
+
+    def _drop_from_journal(self, step: Step):
+        """
+        The substeps of a Task were journaled when they ended. If the Task is not recorded, they are dropped too.
+        """
+        if self.journal is not None and isinstance(step, Task):
+            self.journal.drop_step(step.id)
+
+    def _end_keyword_step(self, name, attrs):
+        """
+        The things that are done here are:
         - Check if keyword is the last step of the stack. Do nothing if not.
         - Unstack step from steps list.
         - Update last observation.
@@ -515,17 +828,17 @@ class DataWrapperLibrary:
             """
             return isinstance(step, Task) and any([tag in self._get_exclude_tasks() for tag in tags])
 
-        BuiltIn().log(f"Ending keyword {attrs['kwname']}", console=self.console)
+        self.logger.info("Ending keyword %s", attrs['kwname'])
 
         if self.exec_stack.is_empty():
-            BuiltIn().log(f"Steps stack is empty. Skipping keywrod!", console=self.console, level="WARN")
+            self.logger.warn("Steps stack is empty. Skipping keywrod!")
             return
         
         # If is try/except calls more times end_keyword than start_keyword
         if not name:
             # Check if the last step is type try/except. If not, ignore
             if not self.exec_stack.get_last_step() != name:
-                BuiltIn().log('Ignoring step with no name. end_keyword called more times than start_keyword', console=self.console, level="DEBUG")
+                self.logger.debug("Ignoring step with no name. end_keyword called more times than start_keyword")
 
         step: Step = self.exec_stack.pop()
         
@@ -534,26 +847,28 @@ class DataWrapperLibrary:
             if step.name.lower() == 'sleep':
                 if self._is_browser_open():
                     self.last_observation = self._get_observation()
-            BuiltIn().log(f"Not recording {step.name}. Not valid. Skipping", console=self.console)
+            self.logger.info("Not recording %s. Not valid. Skipping", step.name)
+            self._drop_from_journal(step)
             return
         
         if isinstance(step, PageAction) and attrs["status"] in ["FAIL", "NOT SET", "NOT RUN"]:
-            BuiltIn().log(f"Not recording {step.name}. Keyword with status'{attrs['status']}'. Skipping", console=self.console)
+            self.logger.info("Not recording %s. Keyword with status'%s'. Skipping", step.name, attrs['status'])
             return
         
         if is_exclude_task(step, attrs['tags']):
-            BuiltIn().log(f"Not recording {step.name}. Task with exclude tags. Skipping", console=self.console)
+            self.logger.info("Not recording %s. Task with exclude tags. Skipping", step.name)
+            self._drop_from_journal(step)
             return
 
         # Shoud be a task in the stack
         if self.exec_stack.is_empty():
-            BuiltIn().log(f"Not recording {step.name}. Steps stack is empty. Interpreter case only.", console=self.console)
+            self.logger.info("Not recording %s. Steps stack is empty. Interpreter case only.", step.name)
+            self._drop_from_journal(step)
             return
 
         # Remove task if is a Task and not have steps
         if isinstance(step, Task) and len(step.steps) == 0:
-            BuiltIn().log(
-                f"Not recording {step.name}. Is a Task and not have steps", console=self.console)
+            self.logger.info("Not recording %s. Is a Task and not have steps", step.name)
             return
 
         # Update if browser is not open
@@ -566,39 +881,95 @@ class DataWrapperLibrary:
         # Remove regex '-tmp.*-' from start of the name. This is for differentiating the some keywords with the same name (Search ${text} == Search in google ${text})
         if re.match(r'-tmp.*-', step.name):
             step.name = re.sub(r'-tmp.*-', '', step.name).strip()
-            BuiltIn().log(f"Removing tmp from step name. New name: {step.name}", console=self.console, level="DEBUG")
+            self.logger.debug("Removing tmp from step name. New name: %s", step.name)
         
         # Replace bbox to BBox in the name. This is for standardizing the name of the bbox
         if 'Bbox' in step.name:
             step.name = step.name.replace('Bbox', 'BBox')
-            BuiltIn().log(f"Replacing bbox to BBox in step name. New name: {step.name}", console=self.console, level="DEBUG")
+            self.logger.debug("Replacing bbox to BBox in step name. New name: %s", step.name)
             
         # Storing step
+        parent: Optional[Task] = None
         try:
-            self.exec_stack.add_to_parent(step)
-            BuiltIn().log(f"Step {step.name} stored", console=self.console, level="INFO")
+            parent = self.exec_stack.get_parent_task()
+            parent.add_step(step)
+            self.logger.info("Step %s stored", step.name)
         except Exception as e:
-            BuiltIn().log(f"Not recording {step.name}.Error adding to parent: {e}", console=self.console, level="ERROR")
+            self.logger.error("Not recording %s.Error adding to parent: %s", step.name, e)
+            parent = None
+            self._drop_from_journal(step)
         
         if self.record:
             try:
-                root: Step = self.exec_stack.get_root()
-                save_path = os.path.join(self.suite_out_path, f"{root.name}.json")
-                root.save(save_path)
+                with self.profiler.phase('save'):
+                    if self.journal is not None:
+                        # Append only the finished step instead of rewriting the whole root
+                        if parent is not None:
+                            self.journal.add_step(parent.id, step)
+                    else:
+                        root: Step = self.exec_stack.get_root()
+                        save_path = self._get_save_path(root.name)
+                        if self.saver is not None:
+                            # Serialized and written in the saver thread
+                            self.saver.save(root, save_path)
+                        else:
+                            save_recording(root, save_path)
             except Exception as e:
-                BuiltIn().log(f"Error saving step {step.name}: {e}", console=self.console, level="WARN")
+                self.logger.warn("Error saving step %s: %s", step.name, e)
         return
             
 
     # ========================= PROXY LIBRARY =========================
 
-    def __init__(self, library, console=True, record=True, output_path=None, only_actions=True):
+    def __init__(self, library, console=True, record=True, output_path=None, only_actions=True,
+                 journal=False, screenshot_store=False, async_save=False, recording_format='json',
+                 memory_budget_mb=None, screenshot_format='png', screenshot_quality=90, screenshot_max_size=None,
+                 log_level='INFO', log_buffer=128, debug_log=None, change_detection=False, screenshot_workers=0,
+                 profile=False):
         
         self._library = library
         self.keyword_libraries = ['BuiltIn']
         self.only_actions = only_actions
         self.ROBOT_LIBRARY_LISTENER = self
         self.record = record
+        # Append finished steps to <test>.journal instead of saving the whole test on every keyword
+        self.use_journal = journal
+        self.journal: Optional[RecordingJournal] = None
+        # Save screenshots once in <suite_out_path>/screenshots and reference them from the recordings
+        self.screenshot_store = screenshot_store
+        self.blob_store: Optional[BlobStore] = None
+        # Save the recording in a background thread instead of in every keyword
+        self.saver: Optional[BackgroundSaver] = BackgroundSaver() if async_save else None
+        # Format of the saved recordings: json or binary (.bhr)
+        assert recording_format in RECORDING_EXTENSIONS, f"recording_format must be one of {list(RECORDING_EXTENSIONS)}"
+        self.recording_format = recording_format
+        # Format of the screenshots. See ScreenshotCodec
+        self.screenshot_codec = ScreenshotCodec(screenshot_format, screenshot_quality, screenshot_max_size)
+        # Encode the screenshots in worker threads. The observations hold a PendingScreenshot until they are saved
+        # Only the saves of async_save run out of the keyword, the others would wait for the screenshot in the keyword
+        self.encoding_pool: Optional[EncodingPool] = None
+        if int(screenshot_workers) > 0:
+            assert async_save and not journal, "screenshot_workers requires async_save and can not be used with journal"
+            self.encoding_pool = EncodingPool(self.screenshot_codec, int(screenshot_workers))
+        # Screenshots submitted to the pool by the running keyword, and keywords with screenshots still encoding
+        self._submitted_stats = ScreenshotStats()
+        self._submitted_screenshots: list[PendingScreenshot] = []
+        self._encoding_keywords: deque[tuple[str, ScreenshotStats, list[PendingScreenshot]]] = deque()
+        # Screenshots of the keywords reported since the last test ended
+        self.test_screenshot_stats = ScreenshotStats()
+        # Time of the phases of the recording. Exported at the end of the suite. See RecorderProfiler
+        self.profiler = RecorderProfiler(profile)
+        # Reuse the last observation if the page has not changed. See _get_page_state
+        self.change_detection = change_detection
+        self._captured_observation: Optional[Observation] = None
+        self._captured_page_state: Optional[dict] = None
+        self.observations_captured = 0
+        self.observations_reused = 0
+        # Past the budget, screenshots of the oldest observations are spilled to a file in output_path. Doms are in the DomSet
+        self.spiller: Optional[ObservationSpiller] = None
+        if memory_budget_mb is not None:
+            self.spiller = ObservationSpiller(int(float(memory_budget_mb) * 1024 * 1024),
+                                              output_path or os.path.join(os.getcwd(), "data"))
         
         # Check if wait time is set
         if not hasattr(self, 'wait_time'):
@@ -631,18 +1002,28 @@ class DataWrapperLibrary:
 
         # Added keywords spec
         self.added_keywords = []
+        # Caches of keyword names and methods, built on first use. See _check_keyword_caches
+        self._keyword_dispatch: Optional[dict] = None
+        self._keyword_names: Optional[list] = None
+        self._keyword_keys: Optional[set] = None
+        self._cached_added_keywords: list = []
 
         # Create output path
         self.suite_out_path = output_path or os.path.join(os.getcwd(), "data")
         self.console = console
+        # Messages of the listener. Level-gated and written in batches. See RecorderLogger
+        self.logger = RecorderLogger(log_level, console, log_buffer, debug_log)
+        self._keyword_depth = 0
         self.last_selector_error: str = ""
+        # Viewport of the current page. See _get_viewport
+        self._viewport: Optional[dict] = None
 
         # This observation will be modified when browser opens
         self.last_observation = Observation(datetime.now(), "", "", (0, 0))
         self.no_record_next_observation = False
         # Create task's steps list and stack for embedded tasks
         self.exec_stack: ExecStack = ExecStack()
-        # Create a set of dom to save space disk
+        # Store of doms. Near copies of a page share most of their chunks
         self.dom_set: DomSet = DomSet()
         # Save last pointer x y
         self.last_pointer_xy = (0, 0)
@@ -654,12 +1035,10 @@ class DataWrapperLibrary:
         Explanation: getattr for methods and not variables
         """
         # Keyword names may not be initialized yet
-        try:
-            keyword_keys = [self._get_key_from_keyword(k) for k in self.get_keyword_names()]
-        except:
-            keyword_keys = []
+        if '_keyword_keys' not in self.__dict__:
+            return super().__getattribute__(name)
         # To make method behave like a keyword
-        if self._get_key_from_keyword(name) in keyword_keys:
+        if self._get_key_from_keyword(name) in self._get_keyword_keys():
             def method_as_keyword(*args, **kwargs):
                 return BuiltIn().run_keyword(name, *args, **kwargs)
             return method_as_keyword
@@ -718,14 +1097,16 @@ class DataWrapperLibrary:
             if isinstance(step, PageAction) and step.status != SaveStatus.no_record:
                 # Update pointer before action. This is due to the fact that the selector corresponds to start dom.
                 # Check if first argument keyword is a selector. Ignore if is a scroll to element
-                step = complete_page_action(step)
+                with self.profiler.phase('bbox'):
+                    step = complete_page_action(step)
 
                 try:
                     # Scroll if the element is not in the viewport
                     # Appends scroll in the stack and returns the updated step (for context)
-                    step = self._add_scroll_when_recording(step)
+                    with self.profiler.phase('scroll'):
+                        step = self._add_scroll_when_recording(step)
                 except Exception as e:
-                    BuiltIn().log(f'Error trying to scroll: {e}', 'DEBUG')
+                    self.logger.debug("Error trying to scroll: %s", e, console=False)
 
             # Updated and scrolled step
             self.exec_stack.push(step)
@@ -734,21 +1115,22 @@ class DataWrapperLibrary:
             # Not explicit wait because complete page action suppose to wait for the element
             if step.status != SaveStatus.no_record:
                 self._pre_run_keyword()  # Note: This is only used in BrowserLibrary to remove highlight (so far)
-                complete_start_context()
+                with self.profiler.phase('start_context'):
+                    complete_start_context()
 
         # ============ RUN KEYWORD ============
-        # Keywords with @keyword decorator
-        for n, value in self.keywords_decorator:
-                if name == value.robot_name.replace(' ', '_').lower() or name == n:
-                    return_value = getattr(self, n)(*args, **kwargs)
-                    break
-        else:
-            # Keywords added manually
-            if name in self.added_keywords:
-                return_value = getattr(self, name)(*args, **kwargs)
-            # Keywords from library
-            else:
-                return_value = self._library.run_keyword(name, args, kwargs)
+        # Keywords with @keyword decorator or added manually. Otherwise, keywords from library
+        method = self._get_keyword_dispatch().get(name)
+        try:
+            with self.profiler.phase('run_keyword'):
+                if method is not None:
+                    return_value = method(*args, **kwargs)
+                else:
+                    return_value = self._library.run_keyword(name, args, kwargs)
+        except Exception:
+            self._post_run_keyword(name, failed=True)
+            raise
+        self._post_run_keyword(name, failed=False)
         
         # ============ WAIT ACTION ============
         # TODO: Wait now is manage before the action, in complete page action.
@@ -756,11 +1138,14 @@ class DataWrapperLibrary:
         return return_value
     
     def get_keyword_names(self):
-        keyword_decorator = [value.robot_name.replace(' ', '_').lower() or name 
-                             for name, value in self.keywords_decorator]
-        keyword_names = self.added_keywords + self._library.get_keyword_names() + keyword_decorator
-        # Remove duplicates (overwritten keywords)
-        return list(dict.fromkeys(keyword_names))
+        self._check_keyword_caches()
+        if self._keyword_names is None:
+            keyword_decorator = [value.robot_name.replace(' ', '_').lower() or name 
+                                 for name, value in self.keywords_decorator]
+            keyword_names = self.added_keywords + self._library.get_keyword_names() + keyword_decorator
+            # Remove duplicates (overwritten keywords)
+            self._keyword_names = list(dict.fromkeys(keyword_names))
+        return list(self._keyword_names)
 
     def get_keyword_arguments(self, name):
         # Hand made keywords
@@ -832,13 +1217,14 @@ class DataWrapperLibrary:
         """
         for lib in lib_names:
             self.keyword_libraries.append(lib)
+        self._invalidate_keyword_caches()
 
     @keyword(name='Record Test', tags=['task', 'StaticWrapper'])
     def start_test_kw(self, task_name):
         """
         Start a task. Record when using RobotFramework in interpreter.
         """
-        BuiltIn().log(f"Starting task {task_name}", console=self.console)
+        self.logger.info("Starting task %s", task_name)
 
         # Configure output path
         if self.suite_out_path is None:
@@ -854,14 +1240,14 @@ class DataWrapperLibrary:
         """
         End a task. Record when using RobotFramework in interpreter.
         """
-        BuiltIn().log(f"Ending task", console=self.console)
+        self.logger.info("Ending task")
 
         assert not self.exec_stack.is_empty(), "Error ending task, stack is empty and should be 'End Task' step at least."
         self.exec_stack.pop()  # Ignore 'End Task' step
 
         # Check if steps_stack is empty
         if self.exec_stack.is_empty():
-            BuiltIn().log(f"Keyword 'Start Task' must be called before 'End Task. Doing nothing.", console=self.console, level="WARN")
+            self.logger.warn("Keyword 'Start Task' must be called before 'End Task. Doing nothing.")
             return
         
         task = self.exec_stack.get_last_step()
@@ -870,7 +1256,7 @@ class DataWrapperLibrary:
             'tags': ['json'] if to_json else [],
         }
         # Log name if the task
-        BuiltIn().log(f"Task name: {task.name}", console=self.console)
+        self.logger.info("Task name: %s", task.name)
 
         self._end_test(task.name, attrs)
 
@@ -879,7 +1265,7 @@ class DataWrapperLibrary:
         """
         Start a task. Record when using RobotFramework in interpreter.
         """
-        BuiltIn().log(f"Starting task {task_name}", console=self.console)
+        self.logger.info("Starting task %s", task_name)
 
         # Configure output path
         if self.suite_out_path is None:
@@ -887,21 +1273,23 @@ class DataWrapperLibrary:
         else:
             self.suite_out_path = self.suite_out_path
 
-        # Create task
-        self._start_keyword(task_name, {
-            'doc': 'Task created manually',
-            'assign': [],
-            'tags': ['task', 'manual_task'], 
-            'lineno': 0,
-            'source': f'{__file__}',
-            'type': 'KEYWORD',
-            'status': 'NOT SET',
-            'starttime': datetime.now().strftime("%Y%m%d %H:%M:%S.%f"),
-            'kwname': task_name,
-            'libname': 'DataWrapperLibrary',
-            'args': []
-            }
-        )
+        # Create task. Start Task is the keyword of the listener, so the depth of the keywords and the profiler are
+        # not changed here
+        with self.profiler.phase('start_keyword'):
+            self._start_keyword_step(task_name, {
+                'doc': 'Task created manually',
+                'assign': [],
+                'tags': ['task', 'manual_task'], 
+                'lineno': 0,
+                'source': f'{__file__}',
+                'type': 'KEYWORD',
+                'status': 'NOT SET',
+                'starttime': datetime.now().strftime("%Y%m%d %H:%M:%S.%f"),
+                'kwname': task_name,
+                'libname': 'DataWrapperLibrary',
+                'args': []
+                }
+            )
 
     @keyword(name='End Task', tags=['task', 'no_record'])
     def end_task_kw(self):
@@ -912,7 +1300,7 @@ class DataWrapperLibrary:
         self.exec_stack.pop()  # Ignore 'End Task' step, use end task
         assert 'manual_task' not in self.exec_stack.get_last_step().tags, "Error ending task, before calling 'End Task' a 'Start Task' must be called." + \
             "Last stack step: " + str(self.exec_stack.get_last_step().name)
-        BuiltIn().log(f"Ending task {self.exec_stack.get_last_step().name}", console=self.console)
+        self.logger.info("Ending task %s", self.exec_stack.get_last_step().name)
         # end_task will be called after this keyword. Hopefully, the last task in the stack is the one we want to end ('manual_task in tags). 
 
     @keyword(name='Remove Last Task', tags=['task', 'StaticWrapper'])
@@ -920,16 +1308,20 @@ class DataWrapperLibrary:
         """
         Remove last task from the stack.
         """
+        last_task = self.exec_stack.get_last_task() if not self.exec_stack.is_empty() else None
+        last_step_id = last_task.steps[-1].id if last_task and last_task.steps else None
         is_removed, msg = self.exec_stack.remove_last_step_from_last_task()
+        if is_removed and self.journal is not None and last_task is not None:
+            self.journal.remove_step(last_task.id, last_step_id)  # type: ignore
         level = 'WARN' if not is_removed else 'INFO'
-        BuiltIn().log(msg, console=self.console, level=level)
+        self.logger.log(level, msg)
 
     @keyword(name='Observation', tags=['action', 'AI'])
     def observation_kw(self, observation: str):
         """
         Add an observation to help the model with the prediction.
         """
-        BuiltIn().log(f"Adding observation {observation}", console=self.console)
+        self.logger.info("Adding observation %s", observation)
 
 if __name__ == '__main__':
     from robot.run import run
@@ -4,15 +4,17 @@ import ButlerRobot
 import tkinter as tk
 from tkinter import ttk
 import cv2
+import numpy as np
 from cv2.typing import MatLike
 import random
+from dataclasses import replace
 import imagehash
 from .src.utils import ocr
 from typing import Optional
 from PIL import Image, ImageTk
 from robot.libraries.BuiltIn import BuiltIn
 from robot.api.deco import keyword
-from Browser.utils.data_types import KeyboardInputAction, KeyAction
+from Browser.utils.data_types import KeyboardInputAction, KeyAction, ScreenshotReturnType
 from Browser import Browser
 from .src.data_types import BBox
 from .keywords.gpt4v import predict_instruction_accurate
@@ -174,10 +176,9 @@ class DataRecorderInterface:
         if self.previous_keyword:
             BuiltIn().run_keyword(self.previous_keyword, *self.previous_keyword_args)
 
-        filename_screenshot = os.path.join(self.tmp_dir, f"page_screenshot.png")
         # Wait to load
         BuiltIn().sleep(5)
-        page_screenshot = self.library.take_screenshot(filename_screenshot, fullPage=True)
+        page_screenshot = self._take_page_image(full_page=True)
         page_size = self.library.get_scroll_size()
         view_port_size = self.library.get_viewport_size()
         el_screenshots = []
@@ -280,7 +281,7 @@ class DataRecorderInterface:
         bbox_page = {"x": x, "y": y, "width": width, "height": height}
         crop_page = self._crop_and_save(
             self.matched_element_path, 
-            page_screenshot, 
+            img_page, 
             bbox_page, 
             0, 
             (0, 0)
@@ -319,6 +320,13 @@ class DataRecorderInterface:
             return ""
         return text
     
+    def _take_page_image(self, full_page: bool = False) -> MatLike:
+        """
+        Screenshot of the page loaded with opencv. The screenshot is taken in memory, nothing is written to disk.
+        """
+        im_bytes = self.library.take_screenshot(fullPage=full_page, return_as=ScreenshotReturnType.bytes)
+        return cv2.imdecode(np.frombuffer(im_bytes, np.uint8), cv2.IMREAD_COLOR)
+
     def _get_margin_from_filename(self, filename: str) -> tuple[int, int]:
         """
         Get the margin from the filename
@@ -331,12 +339,13 @@ class DataRecorderInterface:
         return (0, 0)
 
     @staticmethod
-    def _crop_and_save(save_dir, page_screenshot, bbox_element, count, margin_xy) -> str | None:
+    def _crop_and_save(save_dir, page_screenshot: str | MatLike, bbox_element, count, margin_xy) -> str | None:
         """
         Crop the element and save it in the tmp_dir. Returns the cropped image
+        :param page_screenshot: Path of the screenshot or image already loaded.
         """
             # Crop bounding box in filename_screenshot
-        img = cv2.imread(page_screenshot)
+        img = cv2.imread(page_screenshot) if isinstance(page_screenshot, str) else page_screenshot
         bbox_element = {k: int(v) for k, v in bbox_element.items()}  # Convert all elements in bbox_element into int
         crop_img = img[bbox_element['y']:bbox_element['y']+bbox_element['height'], bbox_element['x']:bbox_element['x']+bbox_element['width']]
         # Save the cropped image
@@ -354,11 +363,8 @@ class DataRecorderInterface:
             """
             Remove the margin from the bbox.
             """
-            bbox.x += margin_x
-            bbox.y += margin_y
-            bbox.width -= 2 * margin_x
-            bbox.height -= 2 * margin_y
-            return bbox
+            return replace(bbox, x=bbox.x + margin_x, y=bbox.y + margin_y,
+                           width=bbox.width - 2 * margin_x, height=bbox.height - 2 * margin_y)
 
         # Opencv template matching
         res = cv2.matchTemplate(img_page, img_element, cv2.TM_CCOEFF_NORMED)
@@ -623,8 +629,7 @@ class SingleClickRecorder(DataRecorderInterface):
 
         bbox = None
         for _ in range(self.max_scroll):
-            page_screenshot = self.library.take_screenshot()
-            img_screenshot = cv2.imread(page_screenshot)
+            img_screenshot = self._take_page_image()
             bbox = self._get_element_bbox(img_screenshot, img_element, el_margin)
             # Search element
             if bbox:
@@ -818,8 +823,7 @@ class TypeTextRecorder(DataRecorderInterface):
 
         bbox = None
         for _ in range(self.max_scroll):
-            page_screenshot = self.library.take_screenshot()
-            img_screenshot = cv2.imread(page_screenshot)
+            img_screenshot = self._take_page_image()
             bbox = self._get_element_bbox(img_screenshot, img_element, el_margin)
             # Search element
             if bbox:
@@ -457,8 +457,107 @@ async function getElementBboxHighlighted(page) {
     });
   }
 
+  async function getPageState(page, logger) {
+    // Cheap token of the state of the page, to know if an observation (screenshot and dom) can be reused.
+    // Every frame counts its changes: DOM mutations, scroll, resize, input, focus, hover and loaded resources.
+    // Running animations count as a change on every call. The counter is installed on the first call in a document.
+    // Returns an object with the following properties:
+    // url: string, url of the page
+    // viewport: object, viewport size
+    // frames: list of strings, <document id>:<changes> of every frame
+    const countChanges = () => {
+      if (!window.__butlerPageState) {
+        const state = { id: Math.random().toString(36).slice(2), changes: 0 };
+        const onChange = () => { state.changes++; };
+        new MutationObserver(onChange).observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+        for (const type of ["scroll", "resize"]) {
+          window.addEventListener(type, onChange, { capture: true, passive: true });
+        }
+        for (const type of ["input", "change", "focusin", "focusout", "mouseover", "mouseout", "load"]) {
+          document.addEventListener(type, onChange, { capture: true, passive: true });
+        }
+        window.__butlerPageState = state;
+      }
+      const state = window.__butlerPageState;
+      if (document.getAnimations && document.getAnimations().some((animation) => animation.playState === "running")) {
+        state.changes++;
+      }
+      return state.id + ":" + state.changes;
+    };
+
+    const frames = [];
+    for (const frame of page.frames()) {
+      try {
+        frames.push(await frame.evaluate(countChanges));
+      } catch (error) {
+        // Detached or navigating frame. Never equal to a previous state
+        logger("Error getting state of frame " + frame.url() + ": " + error);
+        frames.push("error:" + Math.random());
+      }
+    }
+    return { url: page.url(), viewport: page.viewportSize(), frames: frames };
+  }
+
+  async function probeSelector(page, args, logger) {
+    // Resolve a selector of the page in one call, instead of getting the element, its bounding box and the viewport.
+    // The element is not scrolled. Use scrollElementIfNeeded when it is not completely visible.
+    // Returns an object with the following properties:
+    // found: boolean, false if there is no element or more than one. Then the other properties are not set
+    // bbox: object, bounding box of the element
+    // viewport: object, viewport size
+    // in_view: boolean, true if the element is inside the viewport and its scrollable parent
+    // state: object, state of the page. See getPageState
+    const locator = page.locator(args[0]);
+    const count = await locator.count();
+    if (count !== 1) {
+      logger("Elements found: " + count);
+      return { found: false };
+    }
+
+    const probe = await locator.evaluate((element) => {
+      const isScrollable = function (ele) {
+        const hasScrollableContent = ele.scrollHeight > ele.clientHeight;
+        const overflowYStyle = window.getComputedStyle(ele).overflowY;
+        return hasScrollableContent && overflowYStyle.indexOf('hidden') === -1;
+      };
+      const getScrollableParent = function (ele) {
+        return !ele || ele === document.body
+            ? document.body
+            : isScrollable(ele)
+            ? ele
+            : getScrollableParent(ele.parentNode);
+      };
+
+      const rect = element.getBoundingClientRect();
+      const width = Math.max(document.documentElement.clientWidth || 0, window.innerWidth || 0);
+      const height = Math.max(document.documentElement.clientHeight || 0, window.innerHeight || 0);
+      let in_view = rect.left >= 0 && rect.top >= 0 && rect.right <= width && rect.bottom <= height;
+
+      const parent = getScrollableParent(element.parentNode);
+      if (in_view && parent !== document.body) {
+        const parent_rect = parent.getBoundingClientRect();
+        in_view = rect.top >= parent_rect.top && rect.bottom <= parent_rect.bottom;
+      }
+      return {
+        bbox: { x: rect.x, y: rect.y, width: rect.width, height: rect.height },
+        viewport: { width: width, height: height },
+        in_view: in_view
+      };
+    });
+
+    return {
+      found: true,
+      bbox: probe.bbox,
+      viewport: page.viewportSize() || probe.viewport,
+      in_view: probe.in_view,
+      state: await getPageState(page, logger)
+    };
+  }
+
   exports.__esModule = true;
   exports.getElementBboxHighlighted = getElementBboxHighlighted;
   exports.printBoundingBox = printBoundingBox;
   exports.getTextFromBboxWithJs = getTextFromBboxWithJs;
-  exports.scrollElementIfNeeded = scrollElementIfNeeded;
\ No newline at end of file
+  exports.scrollElementIfNeeded = scrollElementIfNeeded;
+  exports.getPageState = getPageState;
+  exports.probeSelector = probeSelector;
\ No newline at end of file
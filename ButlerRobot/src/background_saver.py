@@ -0,0 +1,99 @@
+"""
+Save recordings in a background thread.
+
+The listener hands a snapshot of the root Task to the writer thread. A Task is not modified once it is finished and
+added to its parent (only the Tasks in the stack are), so the snapshot copies only the header of the root: its Context
+and the number of steps added so far. The finished steps are shared and the writer only reads them: observations are
+read without storing anything in them (see Observation.screenshot), while the listener may spill their payloads.
+If several snapshots of the same file arrive while the writer is busy, only the last one is written. Files are written
+with `save_recording` in the format of their extension, writing a temp file and renaming it.
+"""
+
+from __future__ import annotations
+import threading
+from dataclasses import replace
+from typing import Optional
+from .data_types import Step, Task
+from .recording_format import save_recording
+
+
+class StepSnapshot:
+    """
+    Copy of the header of a step (name, status, tags and Context) and the number of its steps when it was taken.
+    Taking it does not depend on the size of the tree. The steps are sliced in the writer thread.
+    """
+    __slots__ = ('header', 'steps', 'length')
+
+    def __init__(self, step: Step):
+        context = replace(step.context) if step.context is not None else None
+        self.header = replace(step, context=context, tags=list(step.tags))
+        self.steps = step.steps if isinstance(step, Task) else []
+        self.length = len(self.steps)
+
+    def to_step(self) -> Step:
+        if isinstance(self.header, Task):
+            # Slicing a list is atomic, the listener can append to it meanwhile
+            return replace(self.header, steps=self.steps[:self.length])
+        return self.header
+
+
+class BackgroundSaver:
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending: dict[str, StepSnapshot] = {}  # Last snapshot of every file
+        self._busy = False
+        self._closed = False
+        self._errors: list[str] = []
+        self._thread = threading.Thread(target=self._run, name='ButlerRobotSaver', daemon=True)
+        self._thread.start()
+
+    def save(self, step: Step, save_path: str):
+        """
+        Queue the step to be saved in save_path. Replaces a previous snapshot of the same file not written yet.
+        """
+        snapshot = StepSnapshot(step)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BackgroundSaver is closed")
+            self._pending[save_path] = snapshot
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+                pending = self._pending
+                self._pending = {}
+                self._busy = True
+
+            for save_path, snapshot in pending.items():
+                try:
+                    save_recording(snapshot.to_step(), save_path)
+                except Exception as e:
+                    with self._condition:
+                        self._errors.append(f"Error saving {save_path}: {e}")
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> list[str]:
+        """
+        Wait until all queued snapshots are written. Returns the errors found since the last flush.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+            errors = self._errors
+            self._errors = []
+        return errors
+
+    def close(self) -> list[str]:
+        errors = self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        return errors
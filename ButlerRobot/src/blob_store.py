@@ -0,0 +1,97 @@
+"""
+Content-addressed store for screenshots.
+
+Screenshots are saved once as raw image bytes under `<recording dir>/screenshots/<2 first chars>/<sha256>` and
+the recordings only keep a reference like `sha256:<hex>` instead of the base64 image.
+"""
+
+from __future__ import annotations
+import os
+import base64
+import hashlib
+import threading
+from typing import Optional
+
+
+class BlobStore:
+    DIR_NAME = 'screenshots'
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    @classmethod
+    def for_recording(cls, recording_path: str) -> BlobStore:
+        """
+        Store of a recording. It is placed next to the json of the recording.
+        """
+        return cls(os.path.join(os.path.dirname(os.path.abspath(recording_path)), cls.DIR_NAME))
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put(self, data: bytes) -> BlobRef:
+        """
+        Save the bytes if they are not already in the store. Returns the reference to the bytes.
+        """
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write in a temp file and rename to never leave a half written blob
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return BlobRef(key, self)
+
+    def put_base64(self, data: str) -> BlobRef:
+        return self.put(base64.b64decode(data))
+
+    def get(self, key: str) -> bytes:
+        with open(self.path(key), 'rb') as f:
+            return f.read()
+
+
+class BlobRef:
+    """
+    Reference to a screenshot in a BlobStore. The image is only read when it is accessed.
+    """
+    PREFIX = 'sha256:'
+
+    def __init__(self, key: str, store: Optional[BlobStore] = None):
+        self.key = key
+        self.store = store
+
+    def __str__(self):
+        return f"{self.PREFIX}{self.key}"
+
+    def __repr__(self):
+        return f"BlobRef({self.key})"
+
+    def __eq__(self, other):
+        return isinstance(other, BlobRef) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @classmethod
+    def is_reference(cls, value) -> bool:
+        return isinstance(value, str) and value.startswith(cls.PREFIX)
+
+    @classmethod
+    def from_reference(cls, value: str, store: Optional[BlobStore] = None) -> BlobRef:
+        return cls(value[len(cls.PREFIX):], store)
+
+    def read(self) -> bytes:
+        if self.store is None:
+            raise ValueError(f"Screenshot {self} can't be resolved. No BlobStore given when loading the recording")
+        return self.store.get(self.key)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.read()).decode('ascii')
+
+    def to_dict(self):
+        return str(self)
@@ -1,6 +1,7 @@
 import logging
+from typing import Iterator
 from ..data_types import SaveStatus, Task, PageAction, Step
-from .data_types import AIExample, PromptStep
+from .data_types import AIExample, PromptStep, ScreenshotRef
 
 
 class AIExampleBuilder:
@@ -30,70 +31,120 @@ class AIExampleBuilder:
                 if 'scroll' not in step_prompt.name.lower():
                     history_no_scroll.append(step_prompt)
             task_history = history_no_scroll
-        
+
         return task_history
 
-    def build(self, ignore_scrolls: bool = True) -> 'list[AIExample]':
+    def build(self, ignore_scrolls: bool = True) -> Iterator[AIExample]:
         """
-        Build all Dataset examples from a task.
+        Build all Dataset examples from a task, one at a time.
+        The task is walked once. The PromptStep of every step is built once and the prompts of a step extend the prompts
+        of its parents, so examples share the PromptSteps. Screenshots are references to the observations (ScreenshotRef).
         """
-        examples = []
+        def keep(prompt_step: PromptStep) -> bool:
+            return not ignore_scrolls or prompt_step.type == 'task' or 'scroll' not in prompt_step.name.lower()
 
-        for step in self.task.get_all_steps():
-            if step.status == SaveStatus.no_record:
+        # Ancestors of the current step: (task, prompt until the step, history until the step)
+        ancestors: list[tuple[Task, list[PromptStep], list[PromptStep]]] = []
+        substeps: list[Iterator[Step]] = [iter([self.task])]
+        while substeps:
+            step = next(substeps[-1], None)
+            if step is None:
+                substeps.pop()
+                if ancestors:
+                    _, task_prompt, _ = ancestors.pop()
+                    if ancestors:
+                        # End of the task. Now it is a sibling of the next steps
+                        prompt_step = task_prompt[0]
+                        ancestors[-1][1].append(prompt_step)
+                        if keep(prompt_step):
+                            ancestors[-1][2].append(prompt_step)
                 continue
-            history = self.task.get_history_instructions(step_id=step.id, with_tasks=self.history_with_tasks)
-            intermediate_tasks = self._get_prompts(history)
-            start_screen = step.context.start_observation.screenshot if step.context else ''
-            end_screen = step.context.end_observation.screenshot if step.context else ''
-            if not start_screen or not end_screen:
-                logging.warning(f'No screenshot for step {step.id}')
-            # Add actions as examples
-            if isinstance(step, PageAction):
-                for prompt in intermediate_tasks:
-                    # Remove observations from history
-                    instruction_history = [s for s in prompt[:-1] if s.type == 'task' or (s.type == 'action' and 'observation' != s.name.lower())]
-                    # Remove scroll actions from history
-                    if ignore_scrolls:
-                        instruction_history = [s for s in prompt[:-1] if s.type == 'task' or (s.type == 'action' and 'scroll' not in s.name.lower())]
-                    else:
-                        instruction_history = prompt[:-1]
-                    examples.append(AIExample(
-                        instruction_history=instruction_history,
-                        screenshot=start_screen,
-                        action=prompt[-1]
-                    ))
-                # Add end of task as examples
-                is_last_step = self.task.get_parent(step.id).steps[-1].id == step.id
-                if is_last_step:
-                    examples.append(AIExample(
-                        instruction_history=intermediate_tasks[-1],
-                        screenshot=end_screen,
-                        action=PromptStep(name='end', args={}, type='action')
-                        ))
 
-            # TODO: Explore add end to tasks like: 
-            #   'Create user' -> 'Login' -> 'Go to users' -> 'Add user' -> 'end'
-            elif isinstance(step, Task) and self.history_with_tasks:
-                if step.context and step.context.end_observation is None:
-                    continue
-                for prompt in intermediate_tasks:
-                    examples.append(AIExample(
-                        instruction_history=prompt,
-                        screenshot=end_screen,
-                        action=PromptStep(name='end', args={}, type='action')
-                    ))
-        return examples
-    
+            prompt_step = self._prompt_step(step)
+            if step.status != SaveStatus.no_record:
+                yield from self._build_step_examples(step, prompt_step, ancestors)
+
+            if isinstance(step, Task):
+                ancestors.append((step, [prompt_step], [prompt_step] if keep(prompt_step) else []))
+                substeps.append(iter(step.steps))
+            elif ancestors:
+                ancestors[-1][1].append(prompt_step)
+                if keep(prompt_step):
+                    ancestors[-1][2].append(prompt_step)
+
+    def _build_step_examples(self, step: Step, prompt_step: PromptStep,
+                             ancestors: 'list[tuple[Task, list[PromptStep], list[PromptStep]]]') -> Iterator[AIExample]:
+        """
+        Examples of a step. The prompts are the same as _get_prompts(get_history_instructions(step.id)):
+        from the prompt of the parent task to the prompt of the root task (only the parent without history_with_tasks).
+        """
+        start_screen = ScreenshotRef(step.context.start_observation) if step.context else ''
+        end_observation = step.context.end_observation if step.context else None
+        end_screen = ScreenshotRef(end_observation) if end_observation is not None else ''
+        if not start_screen or not end_screen:
+            logging.warning(f'No screenshot for step {step.id}')
+
+        # Prompts and their histories (prompt without the last step and the scrolls if ignored), innermost first
+        prompts: list[list[PromptStep]] = []
+        histories: list[list[PromptStep]] = []
+        if isinstance(step, Task):
+            prompts.append([prompt_step])
+            histories.append([])
+        if ancestors and (self.history_with_tasks or not isinstance(step, Task)):
+            prompt, history = [prompt_step], []
+            levels = ancestors if self.history_with_tasks else ancestors[-1:]
+            for _, ancestor_prompt, ancestor_history in reversed(levels):
+                prompt = ancestor_prompt + prompt
+                history = ancestor_history + history
+                prompts.append(prompt)
+                histories.append(history)
+
+        # Add actions as examples
+        if isinstance(step, PageAction):
+            for prompt, history in zip(prompts, histories):
+                yield AIExample(
+                    instruction_history=history,
+                    screenshot=start_screen,
+                    action=prompt[-1]
+                )
+            # Add end of task as examples
+            parent = ancestors[-1][0]
+            if parent.steps[-1].id == step.id:
+                yield AIExample(
+                    instruction_history=prompts[-1],
+                    screenshot=end_screen,
+                    action=PromptStep(name='end', args={}, type='action')
+                )
+
+        # TODO: Explore add end to tasks like:
+        #   'Create user' -> 'Login' -> 'Go to users' -> 'Add user' -> 'end'
+        elif isinstance(step, Task) and self.history_with_tasks:
+            if step.context and step.context.end_observation is None:
+                return
+            for prompt in prompts:
+                yield AIExample(
+                    instruction_history=prompt,
+                    screenshot=end_screen,
+                    action=PromptStep(name='end', args={}, type='action')
+                )
+
+    @staticmethod
+    def _prompt_step(step: Step) -> PromptStep:
+        return PromptStep(
+            name=step.name,
+            args=step.action_args.to_dict() if isinstance(step, PageAction) else {},
+            type='task' if isinstance(step, Task) else 'action'
+        )
+
     @staticmethod
     def _get_prompts(history: dict) -> 'list[list[PromptStep]]':
-        """	
+        """
         For training.
         Get all possible prompts from a history, intermediate prompts included.
         :param history: The history to get the prompts from.
         :return: A list of prompts.
         """
-        def recursive_get_prompts(history: dict, prompts: list=[], save_prompt=True) -> list:
+        def recursive_get_prompts(history: dict, prompts: list, save_prompt=True) -> list:
             his_to_save = PromptStep(
                 name=history['name'],
                 args=history['args'],
@@ -110,4 +161,4 @@ class AIExampleBuilder:
                     new_prompt += recursive_get_prompts(step, prompts, save_prompt)[-1]
                 prompts.append(new_prompt)
                 return prompts
-        return recursive_get_prompts(history)
\ No newline at end of file
+        return recursive_get_prompts(history, [])
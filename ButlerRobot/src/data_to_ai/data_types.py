@@ -1,4 +1,5 @@
 from dataclasses import dataclass, asdict
+from ..data_types import Observation
 
 
 @dataclass
@@ -20,19 +21,55 @@ class PromptStep:
     def from_dict(cls, data):
         return cls(**data)
 
+class ScreenshotRef:
+    """
+    Screenshot of an observation of the recording. It is read from the observation (memory, BlobStore, arena...)
+    when it is needed, so examples do not hold a copy of the base64 image.
+    """
+    __slots__ = ('observation',)
+
+    def __init__(self, observation: Observation):
+        self.observation = observation
+
+    def __repr__(self):
+        return f'ScreenshotRef({self.observation.time})'
+
+    def __bool__(self):
+        screenshot = self.observation._screenshot
+        return not isinstance(screenshot, str) or bool(screenshot)
+
+    def to_base64(self) -> str:
+        return self.observation.screenshot
+
+    def read(self) -> bytes:
+        return self.observation.get_screenshot_bytes()
+
+
 @dataclass
 class AIExample:
     instruction_history: 'list[PromptStep]'
-    screenshot: str
+    screenshot: 'str | ScreenshotRef'  # Image in base64 or a reference to the screenshot of the observation
     action: PromptStep
 
     def __repr__(self):
         # To visualize the example easier when debugging
         return f'Instr: {self.instruction_history}, Act: {self.action}'
 
+    def get_screenshot(self) -> str:
+        """
+        Screenshot in base64.
+        """
+        if isinstance(self.screenshot, ScreenshotRef):
+            return self.screenshot.to_base64()
+        return self.screenshot
+
     # Create a dict to be used as a json
     def to_dict(self):
-        return asdict(self)
+        return {
+            'instruction_history': [step.to_dict() for step in self.instruction_history],
+            'screenshot': self.get_screenshot(),
+            'action': self.action.to_dict()
+        }
     
     # Create class from dict
     @classmethod
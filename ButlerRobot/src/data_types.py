@@ -32,11 +32,17 @@ import base64
 import json
 import os
 import re
+import zlib
+import hashlib
+import itertools
 import imagehash
 from io import BytesIO
 from PIL import Image
-from dataclasses import dataclass, field, asdict, is_dataclass
-from typing import Iterable, Optional
+from dataclasses import dataclass, field, asdict, fields, is_dataclass
+from collections.abc import Sequence
+from typing import Container, Iterable, Iterator, Optional
+from .blob_store import BlobStore, BlobRef
+from .screenshot_codec import PendingScreenshot
 
 
 class SaveStatus(Enum):
@@ -57,7 +63,7 @@ class SaveStatus(Enum):
         return self.value
 
 
-@dataclass
+@dataclass(slots=True)
 class Step:
     id: int
     name: str
@@ -77,11 +83,14 @@ class Step:
     def is_complete(self) -> bool:
         # Check if all the attributes are set and not None
         context_complete = self.context is not None and self.context.is_complete()
-        return all([hasattr(self, attr) and getattr(self, attr) is not None for attr in self.__dataclass_fields__]) and context_complete  # pylint: disable=no-member
+        # Private fields (Task._index) are not part of the step
+        return all([hasattr(self, attr) and getattr(self, attr) is not None for attr in self.__dataclass_fields__ if not attr.startswith('_')]) and context_complete  # pylint: disable=no-member
     
     def save(self, save_path: str):
         """
         Save to json file. If save path is a directory, save with the name of the task
+        Doms held in a DomSet are saved as references and the DomSet is saved once, with only the doms of the step,
+        in the "dom_set" key before the fields of the step.
         :param save_path: Path to save the task.
         """
         if os.path.exists(save_path) and os.path.isdir(save_path):
@@ -90,21 +99,54 @@ class Step:
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
             save_path = os.path.join(save_path, f"{self.name}.json")
 
-        # Save in json
-        with open(save_path, 'w') as f:
-            json.dump(asdict(self), f, indent=4, cls=CustomJSONEncoder)
+        # Save in json. Write a temp file and rename it to never leave a truncated json
+        tmp_path = f"{save_path}.tmp"
+        dom_set, dom_ids = self._get_dom_refs()
+        with open(tmp_path, 'w') as f:
+            if dom_set is None:
+                json.dump(self, f, indent=4, cls=CustomJSONEncoder)
+            else:
+                data = {"dom_set": dom_set.to_dict(dom_ids), **CustomJSONEncoder().default(self)}
+                json.dump(data, f, indent=4, cls=CustomJSONEncoder, dom_set=dom_set)
+        os.replace(tmp_path, save_path)
+
+    def _get_dom_refs(self) -> tuple[Optional[DomSet], list[str]]:
+        """
+        DomSet of the doms of the observations of the step and its substeps, and the ids of these doms.
+        Only the DomSet of the first reference is returned. Doms of other DomSets are saved as html.
+        """
+        dom_set: Optional[DomSet] = None
+        dom_ids: dict[str, None] = {}  # Ordered set
+        steps: list[Step] = [self]
+        while steps:
+            step = steps.pop()
+            if step.context is not None:
+                for observation in (step.context.start_observation, step.context.end_observation):
+                    dom_ref = observation.dom_ref if observation is not None else None
+                    if dom_ref is None or (dom_set is not None and dom_ref.dom_set is not dom_set):
+                        continue
+                    dom_set = dom_ref.dom_set
+                    dom_ids[dom_ref.dom_id] = None
+            if isinstance(step, Task):
+                steps.extend(reversed(step.steps))
+        return dom_set, list(dom_ids)
     
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, blob_store: Optional[BlobStore] = None, dom_set: Optional[DomSet] = None):
+        """
+        :param dom_set: DomSet to resolve the dom references. Default: the "dom_set" saved with the step, if any.
+        """
+        if dom_set is None and "dom_set" in data:
+            dom_set = DomSet.from_dict(data["dom_set"])
         context = None
         if "context" in data and data["context"] is not None:
-            context = Context.from_dict(data["context"])
+            context = Context.from_dict(data["context"], blob_store, dom_set)
         tags = []
         if "tags" in data:
             tags = data["tags"]
         return cls(data["id"], data["name"], SaveStatus(data["status"]), context, tags)
 
-@dataclass(init=False)
+@dataclass(init=False, slots=True)
 class PageAction(Step):
     action_args: ActionArgs
 
@@ -113,58 +155,167 @@ class PageAction(Step):
                  name: str, 
                  status: SaveStatus = SaveStatus.to_record,
                  context: Optional[Context] = None,
-                 tags: list[str] = [],
+                 tags: Optional[list[str]] = None,
                  action_args: Optional[ActionArgs] = None):
         # To set default value to kwname and not in ActionArgs
         self.id = id
         self.name = name
         self.context = context
-        self.tags = tags
+        self.tags = tags if tags is not None else []
         self.action_args = action_args if action_args else ActionArgs('', '', None)
         self.status = status
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, blob_store: Optional[BlobStore] = None, dom_set: Optional[DomSet] = None):
         action_args = None
         if "action_args" in data and data["action_args"] is not None:
             action_args = ActionArgs.from_dict(data["action_args"])
-        step = Step.from_dict(data)
+        step = Step.from_dict(data, blob_store, dom_set)
         return cls(step.id, step.name, step.status, step.context, step.tags, action_args)
 
 
-@dataclass
+class _TaskIndex:
+    """
+    Steps by id and parent of every step of a tree of tasks. Shared by all the tasks of the tree.
+    Ids are unique in a recording. If not, the first step in depth-first order is indexed, like the recursive search.
+    """
+    def __init__(self, root: Task):
+        self.root = root
+        self.steps: dict[int, Step] = {}
+        self.parents: dict[int, Task] = {}  # Step id -> parent task
+        self.add(root, None)
+
+    def add(self, step: Step, parent: Optional[Task]):
+        """
+        Index the step and its substeps.
+        """
+        stack: list[tuple[Step, Optional[Task]]] = [(step, parent)]
+        while stack:
+            step, parent = stack.pop()
+            if step.id not in self.steps:
+                self.steps[step.id] = step
+                if parent is not None:
+                    self.parents[step.id] = parent
+            if isinstance(step, Task):
+                step._index = self
+                stack.extend((sub_step, step) for sub_step in reversed(step.steps))
+
+    def discard(self, step: Step):
+        """
+        Remove the step and its substeps from the index.
+        """
+        stack: list[Step] = [step]
+        while stack:
+            step = stack.pop()
+            if self.steps.get(step.id) is step:
+                del self.steps[step.id]
+                self.parents.pop(step.id, None)
+            if isinstance(step, Task):
+                step._index = None
+                stack.extend(step.steps)
+
+
+class _HistorySteps(Sequence):
+    """
+    Steps of a history of iter_history_instructions: the first `length` entries of a list shared by the histories of
+    the siblings, followed by the last entry. The shared list is only appended to, so the histories already emitted
+    do not change and no prefix is copied. Read-only. Compares equal to the list with the same entries.
+    """
+    __slots__ = ('_entries', '_length', '_last')
+
+    def __init__(self, entries: list[dict], last: dict):
+        self._entries = entries
+        self._length = len(entries)
+        self._last = last
+
+    def __len__(self) -> int:
+        return self._length + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index <= self._length:
+            raise IndexError("History index out of range")
+        return self._last if index == self._length else self._entries[index]
+
+    def __iter__(self) -> Iterator[dict]:
+        yield from itertools.islice(self._entries, self._length)
+        yield self._last
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, _HistorySteps)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def to_dict(self) -> list[dict]:
+        return list(self)
+
+
+@dataclass(slots=True)
 class Task(Step):
+    """
+    Lookups by id use an index of the tree (_TaskIndex): the steps by id and the parent of every step. It is built on
+    the first lookup and kept up to date by add_step, remove_step and replace_step_by_id. Modify the steps of a task
+    with these methods, not the list.
+    """
     steps: list[Step] = field(default_factory=list)
+    # Private field: not an argument, not compared and not saved (see CustomJSONEncoder)
+    _index: Optional[_TaskIndex] = field(default=None, init=False, repr=False, compare=False)
+
+    def _get_index(self, rebuild: bool = False) -> _TaskIndex:
+        if self._index is None or rebuild:
+            old_index = self._index
+            _TaskIndex(old_index.root if old_index is not None else self)
+            if self._index is old_index:
+                # Not in the tree of the old index anymore
+                _TaskIndex(self)
+        return self._index  # type: ignore
+
+    def _get_indexed_step(self, step_id: int) -> Optional[Step]:
+        """
+        Step with the id in the tree of this task. The index is rebuilt once if the step is not found (the steps
+        were modified without add_step).
+        """
+        step = self._get_index().steps.get(step_id)
+        if step is None:
+            step = self._get_index(rebuild=True).steps.get(step_id)
+        return step
+
+    def _get_ancestors(self, step: Step) -> Optional[list[Task]]:
+        """
+        Tasks from the parent of the step up to this task. None if the step is not a substep of this task.
+        """
+        parents = self._get_index().parents
+        ancestors = []
+        parent = parents.get(step.id)
+        while parent is not None:
+            ancestors.append(parent)
+            if parent is self:
+                return ancestors
+            parent = parents.get(parent.id)
+        return None
 
     def _get_parents_ids(self, step_id: int) -> list[int]:
         """
         Returns the ids of the parents of the step but not the step itself. 
         The first is the root and the last is the parent of the step.
         """
-        def search_parent_step_rec(ids_: list, step: Task) -> tuple[bool, list]:
-            if step_id in [sub_step.id for sub_step in step.steps]:
-                return True, ids_
-            else:
-                for sub_step in step.steps:
-                    if isinstance(sub_step, Task):
-                        ids_.append(sub_step.id)
-                        is_step, ids_ = search_parent_step_rec(ids_, sub_step)
-                        if is_step:
-                            return True, ids_
-                        else:
-                            ids_.pop()
-                else:
-                    return False, ids_
-        
         # If the step is the root
         if step_id == self.id:
             return []
 
-        ids = [self.id]  # Add root
-        is_step, ids = search_parent_step_rec(ids, self)
-        if not is_step:
+        step = self._get_indexed_step(step_id)
+        ancestors = self._get_ancestors(step) if step is not None else None
+        if ancestors is None:
             raise ValueError(f"Step with id {step_id} not found")
-        return ids
+        return [task.id for task in reversed(ancestors)]
     
     def get_all_steps(self) -> Iterable[Step]:
         def recursive_get_steps(steps):
@@ -186,40 +337,34 @@ class Task(Step):
         return None  # type: ignore
     
     def find_step(self, step_id: int) -> Optional[Step]:
-        def search_step_rec(step: Step) -> Optional[Step]:
-            if step_id == step.id:
-                return step
-            else:
-                if isinstance(step, Task):
-                    for sub_step in step.steps:
-                        found_step = search_step_rec(sub_step)
-                        if found_step is not None:
-                            return found_step
-            return None
-        
-        step = search_step_rec(self)
-        if step is None:
+        if step_id == self.id:
+            return self
+        step = self._get_indexed_step(step_id)
+        if step is None or self._get_ancestors(step) is None:
             raise ValueError(f"Step with id {step_id} not found")
         return step
 
     def get_parent(self, step_id: int) -> Task:
-        ids = self._get_parents_ids(step_id)
-        task = self.find_step(ids[-1])
-        if not isinstance(task, Task):
-            raise ValueError(f"Found step with id {ids[-1]} is not a Task")
-        return task
+        step = self.find_step(step_id)
+        if step is self:
+            raise ValueError(f"Step with id {step_id} is the root, it has no parent")
+        return self._get_index().parents[step_id]  # type: ignore
 
     def add_step(self, step: Step):
         self.steps.append(step)
+        if self._index is not None:
+            self._index.add(step, self)
 
     def remove_step(self, step: Step):
-        self.steps.remove(step)
+        removed = self.steps.pop(self.steps.index(step))
+        if self._index is not None:
+            self._index.discard(removed)
     
     def remove_step_by_id(self, step_id: int):
         step = self.get_child(step_id)
         if step is None:
             raise ValueError(f"Step with id {step_id} not found")
-        self.steps.remove(step)
+        self.remove_step(step)
 
     def replace_step_by_id(self, step_id: int, new_step: Step):
         parent = self.get_parent(step_id)
@@ -227,6 +372,9 @@ class Task(Step):
         for i, step in enumerate(parent.steps):
             if step.id == step_id:
                 parent.steps[i] = new_step
+                if parent._index is not None:
+                    parent._index.discard(step)
+                    parent._index.add(new_step, parent)
                 return True
         return False
 
@@ -234,6 +382,7 @@ class Task(Step):
         """
         Get previous steps names in nested list. The first element is always a Task.
         The last element (max depth, last of 'steps' list) is the step with the given id.
+        To get the history of all the steps use iter_history_instructions, it walks the tree once.
         Example:
         {
             "id": 1,
@@ -264,61 +413,80 @@ class Task(Step):
             ]                
         }
         """
-        def recursive_get_history(parents: list) -> dict:
-            """
-            First element of parents is the current step.
-            """
-            step_id = parents.pop()
-            step = self.find_step(step_id)
-            assert step is not None, f"Error getting step from parents. Step id {step_id}"
-            if len(parents) == 0:
-                # Should be a Task (root). In this dictionary we will add all the steps
-                assert isinstance(step, Task), "Root element must be a Task"
-                return {
-                    "id": step.id,
-                    "name": step.name,
-                    "type": "task",
-                    "args": {},
-                    "steps": []
-                }
-            else:
-                all_history = recursive_get_history(parents[:])
-                assert isinstance(all_history, dict), "Recursive function fail, root element must be a dict"
-                # Get parent dictionary
-                parent_history = all_history
-                for parent_id in parents:
-                    for parent_step in parent_history["steps"]:
-                        if parent_step["id"] == parent_id:
-                            parent_history = parent_step
-                            break
-
-                # Add siblings to parent_history
-                parent = self.find_step(parents[-1])
-                assert isinstance(parent, Task), "Parent must be a Task"
-                for sibling in parent.steps:
-                    parent_history["steps"].append({
-                        "id": sibling.id,
-                        "name": sibling.name,
-                        "type": "task" if isinstance(sibling, Task) else "action",
-                        "args": sibling.action_args.to_dict() if isinstance(sibling, PageAction) else {},
-                        "steps": []
-                    })
-                    if sibling.id == step.id:
-                        break
-                return all_history
-            
-        ids = self._get_parents_ids(step_id) + [step_id]
+        step = self.find_step(step_id)
+        assert step is not None, f"Error getting step from parents. Step id {step_id}"
+        chain: list[Step] = [step]
+        if step is not self:
+            chain = list(reversed(self._get_ancestors(step))) + chain  # type: ignore
         # Only return siblings
         if not with_tasks:
-            step = self.find_step(step_id)
+            # A task returns only itself (formated in a dict). An action its task parent, siblings and itself.
+            chain = chain[-1:] if isinstance(step, Task) else chain[-2:]
+        # Should be a Task (root). In this dictionary we will add all the steps
+        assert isinstance(chain[0], Task), "Root element must be a Task"
+
+        history = self._history_entry(chain[-1])
+        for parent, child in zip(reversed(chain[:-1]), reversed(chain[1:])):
+            assert isinstance(parent, Task), "Parent must be a Task"
+            # Siblings before the child
+            siblings = []
+            for sibling in parent.steps:
+                if sibling.id == child.id:
+                    break
+                siblings.append(self._history_entry(sibling))
+            history = {**self._history_entry(parent), "steps": siblings + [history]}
+        return history
+
+    def iter_history_instructions(self, with_tasks: bool = False) -> Iterator[tuple[Step, dict]]:
+        """
+        History of every step, in the order of get_all_steps. Same as get_history_instructions for every step, but the
+        tree is walked once: the entry of every step is built once and the histories share them. The "steps" of every
+        ancestor are a read-only view of the sibling entries, shared by the histories of the siblings (use list() to
+        get a list, CustomJSONEncoder writes them as lists). Only the dicts of the ancestors of the step are new in
+        every history. Do not modify the histories.
+        """
+        root_entry = self._history_entry(self)
+        yield self, {**root_entry, "steps": []}
+        # Ancestors of the current step: (task, entry, entries of the substeps visited)
+        ancestors: list[tuple[Task, dict, list[dict]]] = [(self, root_entry, [])]
+        substeps: list[Iterator[Step]] = [iter(self.steps)]
+        while substeps:
+            step = next(substeps[-1], None)
+            if step is None:
+                # End of the task. Now it is a sibling of the next steps
+                substeps.pop()
+                _, entry, _ = ancestors.pop()
+                if ancestors:
+                    ancestors[-1][2].append(entry)
+                continue
+
+            entry = self._history_entry(step)
+            if with_tasks:
+                history = entry
+                for _, task_entry, siblings in reversed(ancestors):
+                    history = {**task_entry, "steps": _HistorySteps(siblings, history)}
+            elif isinstance(step, Task):
+                history = {**entry, "steps": []}
+            else:
+                _, task_entry, siblings = ancestors[-1]
+                history = {**task_entry, "steps": _HistorySteps(siblings, entry)}
+            yield step, history
+
             if isinstance(step, Task):
-                # Return only itself (formated in a dict)
-                return recursive_get_history([step_id])
+                ancestors.append((step, entry, []))
+                substeps.append(iter(step.steps))
             else:
-                # Return task parent, siblings and itself.
-                return recursive_get_history(ids[-2:])
-        else:
-            return recursive_get_history(ids)
+                ancestors[-1][2].append(entry)
+
+    @staticmethod
+    def _history_entry(step: Step) -> dict:
+        return {
+            "id": step.id,
+            "name": step.name,
+            "type": "task" if isinstance(step, Task) else "action",
+            "args": step.action_args.to_dict() if isinstance(step, PageAction) else {},
+            "steps": []
+        }
 
     def set_status_to_all_children(self, status: SaveStatus):
         for step in self.steps:
@@ -339,19 +507,31 @@ class Task(Step):
         return False
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, blob_store: Optional[BlobStore] = None, dom_set: Optional[DomSet] = None):
+        if dom_set is None and "dom_set" in data:
+            dom_set = DomSet.from_dict(data["dom_set"])
         steps = []
         if "steps" in data:
             for step_data in data["steps"]:
                 if 'steps' in step_data:
-                    step = Task.from_dict(step_data)
+                    step = Task.from_dict(step_data, blob_store, dom_set)
                 else:
-                    step = PageAction.from_dict(step_data)
+                    step = PageAction.from_dict(step_data, blob_store, dom_set)
                 steps.append(step)
-        step = Step.from_dict(data)
+        step = Step.from_dict(data, blob_store, dom_set)
         return cls(step.id, step.name, step.status, step.context, step.tags, steps)
 
-@dataclass
+    @classmethod
+    def load(cls, path: str, blob_store: Optional[BlobStore] = None) -> Task:
+        """
+        Load a recording saved with `save`. Screenshot references are resolved when accessed with the
+        BlobStore next to the json file if no blob_store is given.
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls.from_dict(data, blob_store or BlobStore.for_recording(path))
+
+@dataclass(slots=True)
 class Context:
     start_observation: Observation
     status: str  # Status for keyword: "NOT_SET", "PASS", "FAIL", etc. Now all this is handle with Step.status
@@ -364,15 +544,15 @@ class Context:
         return all([hasattr(self, attr) and getattr(self, attr) is not None for attr in self.__dataclass_fields__]) and start_complete and end_complete  # pylint: disable=no-member
     
     @classmethod
-    def from_dict(cls, data):
-        start_observation = Observation.from_dict(data["start_observation"])
+    def from_dict(cls, data, blob_store: Optional[BlobStore] = None, dom_set: Optional[DomSet] = None):
+        start_observation = Observation.from_dict(data["start_observation"], blob_store, dom_set)
         end_observation = None
         if "end_observation" in data and data["end_observation"] is not None:
-            end_observation = Observation.from_dict(data["end_observation"])
+            end_observation = Observation.from_dict(data["end_observation"], blob_store, dom_set)
         return cls(start_observation, data["status"], end_observation)  # type: ignore
 
 
-@dataclass
+@dataclass(slots=True)
 class ActionArgs:
     selector_dom: str  # Where the action was performed
     string: str  # The string that was used in the action. Ex: "Type text" -> "Hello World"
@@ -396,86 +576,395 @@ class ActionArgs:
         return cls(data["selector_dom"], data["string"], bbox)
 
 
-@dataclass
+def _payload_repr(payload) -> str:
+    return f"<{len(payload)} chars>" if isinstance(payload, str) else repr(payload)
+
+
+@dataclass(init=False)
 class Observation:
+    # screenshot and dom are properties over _screenshot and _dom
+    __slots__ = ('time', '_screenshot', '_dom', 'pointer_xy', '_image_hash')
+
     time: str
-    screenshot: str
-    dom: str
-    pointer_xy: tuple[int, int] = field(default=(0, 0))
+    screenshot: str  # Image in base64. Could be held as a reference to a BlobStore
+    dom: str  # Html. Could be held as a reference to a DomSet
+    pointer_xy: tuple[int, int]
 
     def __init__(self, time, screenshot, dom, pointer_xy=(0, 0)):
         if not isinstance(time, str):
             self.time: str = time.strftime('%Y-%m-%dT%H:%M:%S')
         else:
             self.time: str = time
-        self.screenshot: str = screenshot
-        self.dom: str = dom
+        self.screenshot = screenshot
+        self.dom = dom
         self.pointer_xy: tuple[int, int] = pointer_xy
 
+    def _resolve_screenshot(self):
+        """
+        Wait for a screenshot that is being encoded (PendingScreenshot) and hold its result instead.
+        """
+        if isinstance(self._screenshot, PendingScreenshot):
+            self._screenshot = self._screenshot.result()
+
+    def _held_screenshot(self):
+        """
+        Screenshot held, waiting for it if it is being encoded. Reads do not store the result: the saver thread reads
+        observations that the listener may be spilling (see ObservationSpiller).
+        """
+        screenshot = self._screenshot
+        if isinstance(screenshot, PendingScreenshot):
+            return screenshot.result()
+        return screenshot
+
+    @property
+    def screenshot(self) -> str:
+        """
+        Screenshot in base64. If the observation holds a reference, the image is read from the store.
+        """
+        screenshot = self._held_screenshot()
+        if isinstance(screenshot, str):
+            return screenshot
+        return screenshot.to_base64()
+
+    @screenshot.setter
+    def screenshot(self, screenshot: str | BlobRef):
+        self._screenshot = screenshot
+        self._image_hash: Optional[int] = None
+
+    @property
+    def screenshot_ref(self) -> Optional[BlobRef]:
+        screenshot = self._held_screenshot()
+        return screenshot if isinstance(screenshot, BlobRef) else None
+
+    @property
+    def dom(self) -> str:
+        """
+        Html of the page. If the observation holds a reference, the dom is rebuilt from the DomSet.
+        """
+        dom = self._dom
+        if isinstance(dom, str):
+            return dom
+        return dom.to_str()
+
+    @dom.setter
+    def dom(self, dom: str | DomRef):
+        self._dom = dom
+
+    @property
+    def dom_ref(self) -> Optional[DomRef]:
+        return self._dom if isinstance(self._dom, DomRef) else None
+
+    def get_screenshot_bytes(self) -> bytes:
+        """
+        Screenshot as image bytes. Handles that hold the raw image are read without going through base64.
+        """
+        screenshot = self._held_screenshot()
+        if not isinstance(screenshot, str) and hasattr(screenshot, 'read'):
+            return screenshot.read()
+        return base64.b64decode(screenshot if isinstance(screenshot, str) else screenshot.to_base64())
+
+    @property
+    def image_hash(self) -> Optional[int]:
+        """
+        Average hash of the screenshot as a 64 bits int. None if there is no screenshot.
+        Computed the first time it is needed and kept until the screenshot changes.
+        """
+        if not self._screenshot:
+            return None
+        if self._image_hash is None:
+            image = Image.open(BytesIO(self.get_screenshot_bytes()))
+            self._image_hash = int(str(imagehash.average_hash(image)), 16)
+        return self._image_hash
+
     def measure_similarity(self, other: Observation) -> int:
         """
-        Measure the similarity between two observations.
+        Measure the similarity between two observations. Number of different bits of the image hashes.
         """
-        image_hash = imagehash.average_hash(Image.open(BytesIO(base64.b64decode(self.screenshot))))
-        other_image_hash = imagehash.average_hash(Image.open(BytesIO(base64.b64decode(other.screenshot))))
-        return image_hash - other_image_hash
+        if self.image_hash is None or other.image_hash is None:
+            return 0 if self.image_hash == other.image_hash else 64
+        return bin(self.image_hash ^ other.image_hash).count('1')
 
     def is_complete(self) -> bool:
         # Check if all the attributes are set and not empty
-        # Ignore dom
-        dom = self.dom
-        self.dom = 'True'
-        complete = all([hasattr(self, attr) and getattr(self, attr) for attr in self.__dataclass_fields__])  # pylint: disable=no-member
-        self.dom = dom
-        return complete
+        # Ignore dom. Screenshot is checked without reading it from the store
+        return bool(self.time) and bool(self._screenshot) and bool(self.pointer_xy)
 
     def __hash__(self):
         """
-        Only hash the image with imagehasg.
+        Only hash the image with imagehash.
         """
-        if not self.screenshot:
-            return ''
-        return str(imagehash.average_hash(Image.open(BytesIO(base64.b64decode(self.screenshot)))))
+        return hash(self.image_hash)
 
     def __eq__(self, other):
         """
-        Only compare the image.
+        Only compare the image. The same payload or reference to the store is equal without reading the image.
+        Otherwise the image hashes are compared.
         """
-        return self.__hash__() == other.__hash__()
+        if not isinstance(other, Observation):
+            return NotImplemented
+        # Empty screenshots are compared without hashing the other image
+        if not self._screenshot or not other._screenshot:
+            return not self._screenshot and not other._screenshot
+        if self._screenshot is other._screenshot:
+            return True
+        if isinstance(self._screenshot, BlobRef) and self._screenshot == other._screenshot:
+            return True  # Same key in the store, the sha256 of the image
+        return self.image_hash == other.image_hash
+
+    def __repr__(self):
+        # Without the payloads: reading them loads spilled ones and waits for pending screenshots
+        return (f"Observation(time={self.time!r}, screenshot={_payload_repr(self._screenshot)}, "
+                f"dom={_payload_repr(self._dom)}, pointer_xy={self.pointer_xy!r})")
     
+    def to_dict(self, dom_set: Optional[DomSet] = None):
+        """
+        :param dom_set: Doms held in this DomSet are written as references (see Step.save). Other doms as html.
+        """
+        screenshot = self._held_screenshot()
+        if not isinstance(screenshot, str):
+            screenshot = screenshot.to_dict()
+        dom = self._dom
+        if dom_set is not None and isinstance(dom, DomRef) and dom.dom_set is dom_set:
+            dom = str(dom)
+        elif not isinstance(dom, str):
+            dom = dom.to_dict()
+        return {
+            "time": self.time,
+            "screenshot": screenshot,
+            "dom": dom,
+            "pointer_xy": self.pointer_xy
+        }
+
     @classmethod
-    def from_dict(cls, data):
-        return cls(data["time"], data["screenshot"], data["dom"], data["pointer_xy"])
+    def from_dict(cls, data, blob_store: Optional[BlobStore] = None, dom_set: Optional[DomSet] = None):
+        screenshot = data["screenshot"]
+        if BlobRef.is_reference(screenshot):
+            screenshot = BlobRef.from_reference(screenshot, blob_store)
+        dom = data["dom"]
+        if DomRef.is_reference(dom):
+            dom = DomRef.from_reference(dom, dom_set)
+        return cls(data["time"], screenshot, dom, data["pointer_xy"])
+
+
+def split_dom(dom: str, mask: int = 0x3f, window: int = 64, min_size: int = 512, max_size: int = 8 * 1024) -> list[str]:
+    """
+    Split the dom in chunks that are the same in two versions of a page except around the changes.
+    The dom is split in tokens ending in '>'. A chunk ends after a token when the crc32 of the `window` characters
+    before the end of the token has crc32 & mask == 0, so the boundaries only depend on the content around them.
+    The window spans several tokens: a tag repeated all over the page (Ex: '</div>') does not select every boundary
+    by itself. Chunks have at least min_size characters (except the last one) and at most max_size plus one token.
+    With the defaults a chunk has about 1.5 KB.
+    """
+    chunks = []
+    start = 0
+    # Tokens that end before min_size characters are not hashed
+    end = max(start, start + min_size - 1)
+    while True:
+        end = dom.find('>', end) + 1
+        if end == 0:
+            break
+        if end - start >= max_size or zlib.crc32(dom[max(0, end - window):end].encode('utf-8')) & mask == 0:
+            chunks.append(dom[start:end])
+            start = end
+            end = max(start, start + min_size - 1)
+    if start < len(dom):
+        chunks.append(dom[start:])
+    return chunks
+
+
+class DomRef:
+    """
+    Reference to a dom in a DomSet. Saved in json recordings as `dom:<id>` (see Step.save).
+    """
+    PREFIX = 'dom:'
+
+    def __init__(self, dom_id: str, dom_set: Optional[DomSet]):
+        self.dom_id = dom_id
+        self.dom_set = dom_set
+
+    def __str__(self):
+        return f"{self.PREFIX}{self.dom_id}"
+
+    def __repr__(self):
+        return f"DomRef({self.dom_id})"
+
+    def __deepcopy__(self, memo):
+        # Doms of the DomSet are never modified, copies share the DomSet
+        return self
+
+    @classmethod
+    def is_reference(cls, value) -> bool:
+        return isinstance(value, str) and value.startswith(cls.PREFIX)
+
+    @classmethod
+    def from_reference(cls, value: str, dom_set: Optional[DomSet] = None) -> DomRef:
+        return cls(value[len(cls.PREFIX):], dom_set)
+
+    def __eq__(self, other):
+        return isinstance(other, DomRef) and self.dom_id == other.dom_id
+
+    def __hash__(self):
+        return hash(self.dom_id)
+
+    def to_str(self) -> str:
+        if self.dom_set is None:
+            raise ValueError(f"Dom {self} can't be resolved. No DomSet given when loading the recording")
+        return self.dom_set.get_dom(self.dom_id)
+
+    def to_dict(self):
+        return self.to_str()
 
 
 @dataclass
 class DomSet:
-    dom_set: set[str] = field(default_factory=set)
+    """
+    Store of the doms of a recording. Consecutive doms of a page differ in a few attributes, so every dom is split
+    in chunks and only the chunks not seen before are stored, compressed with zlib. The first dom added is used as
+    shared zlib dictionary, so small chunks are also compressed. Doms are rebuilt on demand.
+    A new dom is diffed against the previous one: the chunks at its start and end that did not change are reused and
+    only the part in between is split again (see split_dom).
+    """
+    doms: dict[str, list[str]] = field(default_factory=dict)  # Dom id -> chunk ids
+    chunks: dict[str, bytes] = field(default_factory=dict)  # Chunk id -> compressed chunk
+    dictionary: bytes = b''
+    _previous: list[tuple[str, str]] = field(default_factory=list, repr=False, compare=False)  # Chunks and ids of the last dom added
+    _last: tuple[str, str] = field(default=('', ''), repr=False, compare=False)  # Last dom rebuilt (id, dom)
+    _compressor: Optional[zlib._Compress] = field(default=None, repr=False, compare=False)  # Copied for every chunk
 
-    def add_dom(self, dom: str):
-        if dom not in self.dom_set:
-            self.dom_set.add(dom)
-        else:
-            dom = next((d for d in self.dom_set if d == dom), None)  # type: ignore
+    DICTIONARY_SIZE = 32 * 1024  # Max window of zlib
+
+    def __contains__(self, dom_id: str) -> bool:
+        return dom_id in self.doms
+
+    def __len__(self) -> int:
+        return len(self.doms)
+
+    @staticmethod
+    def _key(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    def _split(self, dom: str) -> list[tuple[str, str]]:
+        """
+        Chunks of the dom with their ids. Reuses the chunks of the previous dom at the start and end of dom.
+        """
+        head: list[tuple[str, str]] = []
+        start = 0
+        for chunk, chunk_id in self._previous:
+            if not dom.startswith(chunk, start):
+                break
+            head.append((chunk, chunk_id))
+            start += len(chunk)
+
+        tail: list[tuple[str, str]] = []
+        end = len(dom)
+        for chunk, chunk_id in reversed(self._previous[len(head):]):
+            if end - len(chunk) < start or not dom.endswith(chunk, start, end):
+                break
+            tail.append((chunk, chunk_id))
+            end -= len(chunk)
+        tail.reverse()
+
+        middle = [(chunk, self._key(chunk.encode('utf-8'))) for chunk in split_dom(dom[start:end])]
+        return head + middle + tail
+
+    def add_dom(self, dom: str) -> str | DomRef:
+        """
+        Store the dom and return a reference to it. Empty doms are not stored.
+        """
+        if not dom:
+            return dom
+        dom_id = self._key(dom.encode('utf-8'))
+        if dom_id not in self.doms:
+            if not self.dictionary:
+                self.dictionary = dom.encode('utf-8')[:self.DICTIONARY_SIZE]
+            if self._compressor is None:
+                # Loading the dictionary is slower than copying a compressor that already has it
+                self._compressor = zlib.compressobj(zdict=self.dictionary)
+            chunks = self._split(dom)
+            for chunk, chunk_id in chunks:
+                if chunk_id not in self.chunks:
+                    compressor = self._compressor.copy()
+                    self.chunks[chunk_id] = compressor.compress(chunk.encode('utf-8')) + compressor.flush()
+            self.doms[dom_id] = [chunk_id for _, chunk_id in chunks]
+            self._previous = chunks
+        return DomRef(dom_id, self)
+
+    def get_dom(self, dom_id: str) -> str:
+        last = self._last  # Read once, the saver thread rebuilds doms too
+        if last[0] == dom_id:
+            return last[1]
+        if dom_id not in self.doms:
+            raise ValueError(f"Dom {dom_id} not found in the DomSet")
+        data = bytearray()
+        for chunk_id in self.doms[dom_id]:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+            data += decompressor.decompress(self.chunks[chunk_id])
+        dom = data.decode('utf-8')
+        self._last = (dom_id, dom)
         return dom
-    
+
+    def stored_bytes(self) -> int:
+        return len(self.dictionary) + sum(len(chunk) for chunk in self.chunks.values())
+
+    def to_dict(self, dom_ids: Optional[Iterable[str]] = None, skip_chunks: Container[str] = ()):
+        """
+        :param dom_ids: Only save these doms and their chunks. Default: all the doms.
+        :param skip_chunks: Chunks not saved because they were saved before (Ex: in a RecordingJournal).
+        """
+        if dom_ids is None:
+            doms = self.doms
+            chunk_ids: Iterable[str] = self.chunks
+        else:
+            doms = {dom_id: self.doms[dom_id] for dom_id in dom_ids}
+            chunk_ids = dict.fromkeys(chunk_id for chunks in doms.values() for chunk_id in chunks)
+        if skip_chunks:
+            chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in skip_chunks]
+        return {
+            "dictionary": base64.b64encode(self.dictionary).decode('ascii'),
+            "chunks": {chunk_id: base64.b64encode(self.chunks[chunk_id]).decode('ascii') for chunk_id in chunk_ids},
+            "doms": doms
+        }
+
+    def update(self, data):
+        """
+        Add the doms and chunks of a dict saved with to_dict. The dictionary is only taken if there is none yet.
+        """
+        if not self.dictionary and data.get("dictionary"):
+            self.dictionary = base64.b64decode(data["dictionary"])
+        self.chunks.update((chunk_id, base64.b64decode(chunk)) for chunk_id, chunk in data["chunks"].items())
+        self.doms.update(data["doms"])
+
     @classmethod
     def from_dict(cls, data):
-        return cls(set(data["dom_set"]))
+        if "dom_set" in data:
+            # Legacy set of strings
+            dom_set = cls()
+            for dom in data["dom_set"]:
+                dom_set.add_dom(dom)
+            return dom_set
+        return cls(
+            doms=data["doms"],
+            chunks={chunk_id: base64.b64decode(chunk) for chunk_id, chunk in data["chunks"].items()},
+            dictionary=base64.b64decode(data["dictionary"])
+        )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class BBox:
+    """
+    Immutable value, hashed by its coordinates. Use dataclasses.replace to get a moved or resized BBox.
+    """
     x: int
     y: int
     width: int
     height: int
 
     def __post_init__(self):
-        self.x = int(self.x)
-        self.y = int(self.y)
-        self.width = int(self.width)
-        self.height = int(self.height)
+        # Only coerce values that are not int already (most of them)
+        for name in ('x', 'y', 'width', 'height'):
+            value = getattr(self, name)
+            if type(value) is not int:
+                object.__setattr__(self, name, int(value))
 
     def pillow_print(self):
         return (self.x, self.y, self.x + self.width, self.y + self.height)
@@ -526,9 +1015,21 @@ class BBox:
     
 
 class CustomJSONEncoder(JSONEncoder):
+    def __init__(self, *args, dom_set: Optional[DomSet] = None, **kwargs):
+        """
+        :param dom_set: Doms of this DomSet are written as references. Step.save writes the DomSet in the file.
+        """
+        super().__init__(*args, **kwargs)
+        self.dom_set = dom_set
+
     def default(self, obj):
-        if is_dataclass(obj):
-            return asdict(obj)
-        elif hasattr(obj, 'to_dict'):
+        if isinstance(obj, Observation):
+            return obj.to_dict(self.dom_set)
+        # to_dict first, so observations write screenshot references instead of the images
+        if hasattr(obj, 'to_dict'):
             return obj.to_dict()
+        elif is_dataclass(obj):
+            # Shallow, the encoder calls default again for the nested objects. Private fields are not saved
+            return {f.name: getattr(obj, f.name) for f in fields(obj) if not f.name.startswith('_')}
         return super().default(obj)
+
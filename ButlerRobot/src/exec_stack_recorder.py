@@ -96,7 +96,7 @@ class ExecStackRecorder:
         
         # Add task to the root task
         self.id_count += 1
-        self.root_task.steps.append(task)
+        self.root_task.add_step(task)
         self.last_actions = []
         self.last_step = task
         logger.info(f"Stored task {task_name}")
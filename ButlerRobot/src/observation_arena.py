@@ -0,0 +1,246 @@
+"""
+Spill observation payloads to disk to bound the memory of long recordings.
+
+`ObservationArena` is an append-only file read back through mmap. `ObservationSpiller` keeps track of the payloads
+held in memory by the observations, in creation order. When they exceed the budget, the oldest ones are written to
+the arena and the observations keep handles instead of the strings. Observations read through the handles
+transparently (`Observation.screenshot`, `Observation.dom`), so serialization and `AIExampleBuilder` do not change.
+
+The budget covers the screenshots and the doms held as strings. Doms referenced from a DomSet (DomRef) are stored
+compressed in the DomSet and are not counted. A payload shared by several observations (Ex: an observation reused
+by change detection with a new pointer) is counted and written once.
+"""
+
+from __future__ import annotations
+import os
+import mmap
+import base64
+import tempfile
+import threading
+from collections import deque
+from typing import Iterable, Optional
+from .data_types import Observation
+from .screenshot_codec import PendingScreenshot
+
+
+class ObservationArena:
+    def __init__(self, dir_path: Optional[str] = None):
+        if dir_path is not None:
+            os.makedirs(dir_path, exist_ok=True)
+        # Unnamed file, removed when closed
+        self._f = tempfile.TemporaryFile(prefix='observations', suffix='.arena', dir=dir_path)
+        self._lock = threading.Lock()  # The background saver reads while the listener appends
+        self._mmap: Optional[mmap.mmap] = None
+        self.size = 0
+        self.generation = 0  # Handles of previous generations are invalid after reset
+
+    def append(self, data: bytes) -> int:
+        with self._lock:
+            offset = self.size
+            self._f.seek(offset)
+            self._f.write(data)
+            self.size += len(data)
+        return offset
+
+    def read(self, offset: int, length: int, generation: int) -> bytes:
+        with self._lock:
+            if generation != self.generation:
+                raise ValueError("Observation payload was spilled to an arena that has been reset")
+            if self._mmap is None or offset + length > len(self._mmap):
+                self._f.flush()
+                if self._mmap is not None:
+                    self._mmap.close()
+                self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap[offset:offset + length]
+
+    def reset(self):
+        """
+        Discard all the payloads. The space of the file is reused.
+        """
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._f.truncate(0)
+            self.size = 0
+            self.generation += 1
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._f.close()
+
+
+class ArenaScreenshot:
+    """
+    Screenshot spilled to an ObservationArena as raw image bytes.
+    """
+    def __init__(self, arena: ObservationArena, offset: int, length: int):
+        self.arena = arena
+        self.offset = offset
+        self.length = length
+        self.generation = arena.generation
+
+    def __repr__(self):
+        return f"ArenaScreenshot({self.offset}, {self.length})"
+
+    def __deepcopy__(self, memo):
+        # The payload in the arena is never modified, copies share it
+        return self
+
+    def read(self) -> bytes:
+        return self.arena.read(self.offset, self.length, self.generation)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.read()).decode('ascii')
+
+    def to_dict(self):
+        return self.to_base64()
+
+
+class ArenaDom:
+    """
+    Dom spilled to an ObservationArena as utf-8.
+    """
+    def __init__(self, arena: ObservationArena, offset: int, length: int):
+        self.arena = arena
+        self.offset = offset
+        self.length = length
+        self.generation = arena.generation
+
+    def __repr__(self):
+        return f"ArenaDom({self.offset}, {self.length})"
+
+    def __deepcopy__(self, memo):
+        # The payload in the arena is never modified, copies share it
+        return self
+
+    def to_str(self) -> str:
+        return self.arena.read(self.offset, self.length, self.generation).decode('utf-8')
+
+    def to_dict(self):
+        return self.to_str()
+
+
+def _payloads(observation: Observation) -> list[tuple[str, object, int]]:
+    """
+    (Attribute, payload, bytes) of the payloads held in memory by the observation.
+    """
+    payloads = []
+    if isinstance(observation._screenshot, str):
+        payloads.append(('_screenshot', observation._screenshot, len(observation._screenshot)))
+    elif isinstance(observation._screenshot, PendingScreenshot):
+        payloads.append(('_screenshot', observation._screenshot, observation._screenshot.size * 4 // 3))
+    if isinstance(observation._dom, str):
+        payloads.append(('_dom', observation._dom, len(observation._dom)))
+    return payloads
+
+
+def payload_size(observation: Observation) -> int:
+    """
+    Bytes of the payloads held in memory by the observation. Payloads behind handles are not counted.
+    Screenshots being encoded count as the base64 of the captured image.
+    """
+    return sum(size for _, _, size in _payloads(observation))
+
+
+class ObservationSpiller:
+    # After spilling, the payloads in memory are below this fraction of the budget
+    LOW_WATERMARK = 0.75
+
+    def __init__(self, budget_bytes: int, dir_path: Optional[str] = None):
+        self.budget_bytes = budget_bytes
+        self.dir_path = dir_path
+        self.arena: Optional[ObservationArena] = None
+        self.in_memory = 0
+        self.spilled = 0
+        self._observations: deque[Observation] = deque()  # Observations with payloads in memory, oldest first
+        # Id of a payload in memory -> observations that hold it. They keep the payload alive, so the id is not reused
+        self._holders: dict[int, list[Observation]] = {}
+
+    def _get_arena(self) -> ObservationArena:
+        if self.arena is None:
+            self.arena = ObservationArena(self.dir_path)
+        return self.arena
+
+    def track(self, observation: Observation):
+        """
+        Account the payloads of a new observation and spill the oldest ones if the budget is exceeded. Payloads
+        already held by a tracked observation are not counted again.
+        """
+        tracked = False
+        for _, payload, size in _payloads(observation):
+            if size == 0:
+                continue
+            holders = self._holders.setdefault(id(payload), [])
+            if not holders:
+                self.in_memory += size
+            holders.append(observation)
+            tracked = True
+        if not tracked:
+            return
+        self._observations.append(observation)
+        if self.in_memory > self.budget_bytes:
+            while self._observations and self.in_memory > self.budget_bytes * self.LOW_WATERMARK:
+                self.spill(self._observations.popleft())
+
+    def spill(self, observation: Observation):
+        """
+        Write the payloads of the observation to the arena. The other observations that hold them get the same
+        handles.
+        """
+        for attr, payload, size in _payloads(observation):
+            holders = self._holders.pop(id(payload), [observation])
+            if attr == '_screenshot':
+                observation._resolve_screenshot()
+                screenshot = observation._screenshot
+                if isinstance(screenshot, str) and screenshot:
+                    data = base64.b64decode(screenshot)
+                    arena = self._get_arena()
+                    screenshot = ArenaScreenshot(arena, arena.append(data), len(data))
+                for holder in holders:
+                    image_hash = holder._image_hash
+                    holder.screenshot = screenshot
+                    holder._image_hash = image_hash  # Same image
+            elif payload:
+                data = payload.encode('utf-8')  # type: ignore
+                arena = self._get_arena()
+                dom = ArenaDom(arena, arena.append(data), len(data))
+                for holder in holders:
+                    holder.dom = dom
+            self.in_memory -= size
+            self.spilled += size
+
+    def reset(self, keep: Iterable[Optional[Observation]] = ()):
+        """
+        Discard the spilled payloads (the recording that held them is saved). The observations in keep are loaded
+        back into memory before.
+        """
+        keep = list({id(observation): observation for observation in keep if observation is not None}.values())
+        loaded: dict[int, str] = {}  # Id of a handle -> payload. Observations that shared a handle share the payload
+        for observation in keep:
+            if isinstance(observation._screenshot, ArenaScreenshot):
+                image_hash = observation._image_hash
+                if id(observation._screenshot) not in loaded:
+                    loaded[id(observation._screenshot)] = observation._screenshot.to_base64()
+                observation.screenshot = loaded[id(observation._screenshot)]
+                observation._image_hash = image_hash
+            if isinstance(observation._dom, ArenaDom):
+                if id(observation._dom) not in loaded:
+                    loaded[id(observation._dom)] = observation._dom.to_str()
+                observation.dom = loaded[id(observation._dom)]
+        self._observations.clear()
+        self._holders.clear()
+        self.in_memory = 0
+        self.spilled = 0
+        if self.arena is not None:
+            self.arena.reset()
+        for observation in keep:
+            self.track(observation)
+
+    def close(self):
+        if self.arena is not None:
+            self.arena.close()
+            self.arena = None
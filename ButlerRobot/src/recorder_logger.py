@@ -0,0 +1,107 @@
+"""
+Logger of the recording listener.
+
+The listener logs several messages per keyword. Going through `BuiltIn().log` for each one runs the keyword logging
+machinery of Robot Framework and formats the message even when it is dropped. `RecorderLogger`:
+- Drops messages below its level before formatting them. Messages use %-style arguments: log.debug("Step %s", name).
+- Keeps the messages in a bounded buffer and writes them in batches: to output.xml (and console) with
+  `robot.api.logger`, or to a JSONL debug log if debug_log is set. Batches are written when the buffer is full,
+  when a WARN or ERROR arrives and when the listener calls flush (end of test and suite).
+
+Messages of a batch are written in the keyword that is running when the batch is flushed.
+"""
+
+from __future__ import annotations
+import json
+import time
+import itertools
+from collections import deque
+from typing import Optional
+from robot.api import logger
+
+
+class RecorderLogger:
+    LEVELS = {'TRACE': 0, 'DEBUG': 10, 'INFO': 20, 'WARN': 30, 'ERROR': 40, 'NONE': 100}
+
+    def __init__(self, level: str = 'INFO', console: bool = True, buffer_size: int = 128,
+                 debug_log: Optional[str] = None):
+        """
+        :param level: Messages below this level are dropped. TRACE, DEBUG, INFO, WARN, ERROR or NONE.
+        :param console: Also write the messages in the console. Default of the messages that do not set it.
+        :param buffer_size: Messages kept before writing them.
+        :param debug_log: Path of a JSONL file. If set, messages are written there instead of output.xml and console.
+        """
+        level = level.upper()
+        if level not in self.LEVELS:
+            raise ValueError(f"Unknown log level {level}. Use one of {list(self.LEVELS)}")
+        self.level = level
+        self._levelno = self.LEVELS[level]
+        self.console = console
+        self.debug_log = debug_log
+        self._buffer: deque[tuple[float, str, str, tuple, bool]] = deque(maxlen=max(1, int(buffer_size)))
+        self._file = None
+
+    def is_enabled(self, level: str) -> bool:
+        return self.LEVELS[level] >= self._levelno
+
+    def log(self, level: str, msg: str, *args, console: Optional[bool] = None):
+        levelno = self.LEVELS[level]
+        if levelno < self._levelno:
+            return
+        self._buffer.append((time.time(), level, msg, args, self.console if console is None else console))
+        if levelno >= self.LEVELS['WARN'] or len(self._buffer) == self._buffer.maxlen:
+            self.flush()
+
+    def trace(self, msg: str, *args, console: Optional[bool] = None):
+        self.log('TRACE', msg, *args, console=console)
+
+    def debug(self, msg: str, *args, console: Optional[bool] = None):
+        self.log('DEBUG', msg, *args, console=console)
+
+    def info(self, msg: str, *args, console: Optional[bool] = None):
+        self.log('INFO', msg, *args, console=console)
+
+    def warn(self, msg: str, *args, console: Optional[bool] = None):
+        self.log('WARN', msg, *args, console=console)
+
+    def error(self, msg: str, *args, console: Optional[bool] = None):
+        self.log('ERROR', msg, *args, console=console)
+
+    @staticmethod
+    def _format(msg: str, args: tuple) -> str:
+        return msg % args if args else msg
+
+    def flush(self):
+        if not self._buffer:
+            return
+        records = list(self._buffer)
+        self._buffer.clear()
+
+        if self.debug_log is not None:
+            if self._file is None:
+                self._file = open(self.debug_log, 'a', encoding='utf-8')
+            self._file.write(''.join(
+                json.dumps({"time": t, "level": level, "message": self._format(msg, args)}) + '\n'
+                for t, level, msg, args, _ in records))
+            self._file.flush()
+            return
+
+        console_lines = []
+        # One write per run of messages with the same level
+        for level, group in itertools.groupby(records, key=lambda record: record[1]):
+            lines = []
+            for _, _, msg, args, console in group:
+                line = self._format(msg, args)
+                lines.append(line)
+                # Robot Framework already writes warnings and errors in the console
+                if console and self.LEVELS[level] < self.LEVELS['WARN']:
+                    console_lines.append(line)
+            logger.write('\n'.join(lines), level)
+        if console_lines:
+            logger.console('\n'.join(console_lines))
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
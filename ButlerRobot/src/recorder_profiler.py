@@ -0,0 +1,120 @@
+"""
+Timing of the phases of the recording listener.
+
+`RecorderProfiler.phase(name)` is a context manager that records the duration of a phase (screenshot, dom, bbox,
+scroll, save, the wrapped keyword...) with the keyword that is running. At the end of the suite the events are
+exported as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) and summarized in a table.
+
+When the profiler is disabled, phase returns a shared context manager that does nothing.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler: RecorderProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class RecorderProfiler:
+    KEYWORD = 'keyword'
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # (category, name, keyword, start, end, thread id). Times from time.perf_counter
+        self.events: list[tuple[str, str, str, float, float, int]] = []
+        self._keywords: list[tuple[str, float]] = []  # Running keywords, innermost last
+        self._origin = time.perf_counter()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name: str, start: float, end: float, category: str = 'phase'):
+        keyword = self._keywords[-1][0] if self._keywords else ''
+        self.events.append((category, name, keyword, start, end, threading.get_ident()))
+
+    def start_keyword(self, name: str):
+        if self.enabled:
+            self._keywords.append((name, time.perf_counter()))
+
+    def end_keyword(self):
+        if self.enabled and self._keywords:
+            name, start = self._keywords.pop()
+            self.add(name, start, time.perf_counter(), self.KEYWORD)
+
+    def to_trace(self) -> dict:
+        """
+        Events in the Chrome trace event format. Times in microseconds.
+        """
+        pid = os.getpid()
+        events = [{
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": pid,
+            "tid": tid,
+            "args": {"keyword": keyword} if category != self.KEYWORD else {}
+        } for category, name, keyword, start, end, tid in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_trace(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_trace(), f)
+
+    def summary(self, top_keywords: int = 10) -> str:
+        """
+        Table with the time of every phase and of the slowest keywords. Phases can be nested, so their times overlap.
+        """
+        phases: dict[str, list[float]] = defaultdict(list)
+        keywords: dict[str, list[float]] = defaultdict(list)
+        for category, name, _, start, end, _ in self.events:
+            (keywords if category == self.KEYWORD else phases)[name].append(end - start)
+
+        def rows(durations: dict[str, list[float]], limit: Optional[int] = None) -> list[str]:
+            ordered = sorted(durations.items(), key=lambda item: sum(item[1]), reverse=True)[:limit]
+            return [f"{name[:40]:<40}{len(values):>8}{sum(values) * 1000:>12.1f}{sum(values) / len(values) * 1000:>10.2f}"
+                    f"{max(values) * 1000:>10.2f}" for name, values in ordered]
+
+        header = f"{'':<40}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"
+        lines = [f"{'Phase':<40}" + header[40:]] + rows(phases)
+        lines += ['', f"{'Keyword':<40}" + header[40:]] + rows(keywords, top_keywords)
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.events = []
+        self._keywords = []
+        self._origin = time.perf_counter()
@@ -0,0 +1,501 @@
+"""
+Recording formats.
+
+- json (.json): The format written by `Step.save`. Kept for compatibility.
+- binary (.bhr): Container of length-prefixed records. Steps are msgpack encoded records and screenshots are
+    stored as raw image bytes (not base64), only once per file. DOMs are stored as chunks, only once per file, so
+    near copies of a page only add the chunks that changed.
+    An index at the end of the file allows to read any step by id without reading the others.
+
+Binary layout:
+    MAGIC
+    record*: [type: 1 byte][length: uint32 little endian][payload]
+        - b'S': Step. msgpack map. Tasks are written before their children and without them.
+        - b'I': Screenshot. Raw image bytes.
+        - b'D': Dom. msgpack list with the offsets of its chunks (see `split_dom`).
+        - b'C': Chunk of a dom. utf-8 compressed with zlib. Chunks shared by several doms are stored once.
+        - b'X': Index. msgpack list of [step id, offset, parent id], in the order the steps were written.
+    footer: [offset of the index: uint64 little endian][MAGIC_END]
+
+Convert between formats:
+    python -m ButlerRobot.src.recording_format <input> <output>
+"""
+
+from __future__ import annotations
+import os
+import sys
+import base64
+import struct
+import zlib
+import hashlib
+import argparse
+from typing import Iterator, Optional
+from .blob_store import BlobStore
+from .data_types import Step, PageAction, Task, Context, Observation, ActionArgs, SaveStatus, split_dom
+from .recording_stream import iter_steps as iter_json_steps
+
+
+# ========================= MSGPACK =========================
+
+def _pack(obj, out: bytearray):
+    """
+    Encode obj with msgpack. Only the types used in the recordings are supported.
+    """
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 128:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        else:
+            out.append(0xd3)
+            out += struct.pack('>q', obj)
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack('>d', obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        elif size < 0x100:
+            out += struct.pack('>BB', 0xd9, size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xda, size)
+        else:
+            out += struct.pack('>BI', 0xdb, size)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        out += struct.pack('>BI', 0xc6, len(obj))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size < 16:
+            out.append(0x90 | size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xdc, size)
+        else:
+            out += struct.pack('>BI', 0xdd, size)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size < 16:
+            out.append(0x80 | size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xde, size)
+        else:
+            out += struct.pack('>BI', 0xdf, size)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Type {type(obj)} can't be packed")
+
+
+def packb(obj) -> bytes:
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def _unpack(data: bytes, pos: int):
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if 0x80 <= code <= 0x8f:
+        return _unpack_map(data, pos, code & 0x0f)
+    if 0x90 <= code <= 0x9f:
+        return _unpack_list(data, pos, code & 0x0f)
+    if 0xa0 <= code <= 0xbf:
+        size = code & 0x1f
+        return data[pos:pos + size].decode('utf-8'), pos + size
+    if code == 0xc0:
+        return None, pos
+    if code == 0xc2:
+        return False, pos
+    if code == 0xc3:
+        return True, pos
+    if code == 0xd3:
+        return struct.unpack_from('>q', data, pos)[0], pos + 8
+    if code == 0xcb:
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    if code in (0xd9, 0xda, 0xdb):
+        size_format = {0xd9: '>B', 0xda: '>H', 0xdb: '>I'}[code]
+        size = struct.unpack_from(size_format, data, pos)[0]
+        pos += struct.calcsize(size_format)
+        return data[pos:pos + size].decode('utf-8'), pos + size
+    if code == 0xc6:
+        size = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+        return data[pos:pos + size], pos + size
+    if code in (0xdc, 0xdd):
+        size_format = '>H' if code == 0xdc else '>I'
+        size = struct.unpack_from(size_format, data, pos)[0]
+        return _unpack_list(data, pos + struct.calcsize(size_format), size)
+    if code in (0xde, 0xdf):
+        size_format = '>H' if code == 0xde else '>I'
+        size = struct.unpack_from(size_format, data, pos)[0]
+        return _unpack_map(data, pos + struct.calcsize(size_format), size)
+    raise ValueError(f"Unsupported msgpack code {hex(code)}")
+
+
+def _unpack_list(data: bytes, pos: int, size: int):
+    items = []
+    for _ in range(size):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data: bytes, pos: int, size: int):
+    items = {}
+    for _ in range(size):
+        key, pos = _unpack(data, pos)
+        items[key], pos = _unpack(data, pos)
+    return items, pos
+
+
+def unpackb(data: bytes):
+    obj, _ = _unpack(data, 0)
+    return obj
+
+
+# ========================= READERS AND WRITERS =========================
+
+def iter_steps_with_parents(task: Task) -> Iterator[tuple[Optional[int], Step]]:
+    """
+    Yield (parent_id, step) of the tree. Tasks before their children.
+    """
+    def recursive_iter(step: Step, parent_id: Optional[int]):
+        yield parent_id, step
+        if isinstance(step, Task):
+            for sub_step in step.steps:
+                yield from recursive_iter(sub_step, step.id)
+    yield from recursive_iter(task, None)
+
+
+class RecordingWriter:
+    EXTENSION = ''
+
+    def write(self, task: Step, path: str):
+        raise NotImplementedError
+
+
+class RecordingReader:
+    EXTENSION = ''
+
+    def __init__(self, path: str, blob_store: Optional[BlobStore] = None):
+        self.path = path
+        self.blob_store = blob_store or BlobStore.for_recording(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def read(self) -> Task:
+        raise NotImplementedError
+
+    def iter_steps(self) -> Iterator[tuple[Optional[int], Step]]:
+        """
+        Yield (parent_id, step) without building the tree. Tasks are yielded before their children and without them.
+        """
+        raise NotImplementedError
+
+    def get_step(self, step_id: int) -> Step:
+        raise NotImplementedError
+
+
+class JsonRecordingWriter(RecordingWriter):
+    EXTENSION = '.json'
+
+    def write(self, task: Step, path: str):
+        task.save(path)
+
+
+class JsonRecordingReader(RecordingReader):
+    EXTENSION = '.json'
+
+    def read(self) -> Task:
+        return Task.load(self.path, self.blob_store)
+
+    def iter_steps(self) -> Iterator[tuple[Optional[int], Step]]:
+        yield from iter_json_steps(self.path, self.blob_store)
+
+    def get_step(self, step_id: int) -> Step:
+        step = self.read().find_step(step_id)
+        assert step is not None
+        return step
+
+
+class BinaryImage:
+    """
+    Screenshot stored as raw bytes in a binary recording. Only read when it is accessed.
+    """
+    def __init__(self, path: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return f"BinaryImage({self.path}, {self.offset}, {self.length})"
+
+    def read(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.length)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.read()).decode('ascii')
+
+    def to_dict(self):
+        return self.to_base64()
+
+
+class BinaryRecordingWriter(RecordingWriter):
+    EXTENSION = '.bhr'
+    MAGIC = b'BHREC\x00\x01\n'
+    MAGIC_END = b'BHRIDX'
+    RECORD_HEADER = struct.Struct('<cI')
+    FOOTER = struct.Struct('<Q')
+
+    def write(self, task: Step, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            self._f = f
+            self._written: dict[bytes, int] = {}  # Hash of images and doms already in the file
+            f.write(self.MAGIC)
+            index = []
+            for parent_id, step in iter_steps_with_parents(task):  # type: ignore
+                record = self._step_to_record(step)
+                index.append([step.id, self._write_record(b'S', packb(record)), parent_id])
+            index_offset = self._write_record(b'X', packb(index))
+            f.write(self.FOOTER.pack(index_offset))
+            f.write(self.MAGIC_END)
+        os.replace(tmp_path, path)
+
+    def _write_record(self, record_type: bytes, payload: bytes) -> int:
+        offset = self._f.tell()
+        self._f.write(self.RECORD_HEADER.pack(record_type, len(payload)))
+        self._f.write(payload)
+        return offset
+
+    def _write_once(self, record_type: bytes, data: bytes, encode=None) -> int:
+        """
+        Write the record if the same data was not written before. encode is applied to data only when it is written.
+        """
+        key = record_type + hashlib.sha256(data).digest()
+        if key not in self._written:
+            self._written[key] = self._write_record(record_type, encode(data) if encode else data)
+        return self._written[key]
+
+    def _write_dom(self, observation: Observation) -> int:
+        # Doms of a DomSet are known by their id, so they are only rebuilt the first time they are written
+        dom_ref = observation.dom_ref
+        ref_key = b'R' + dom_ref.dom_id.encode('ascii') if dom_ref is not None else b''
+        if ref_key in self._written:
+            return self._written[ref_key]
+        dom = observation.dom
+        key = b'D' + hashlib.sha256(dom.encode('utf-8')).digest()
+        if key not in self._written:
+            chunks = [self._write_once(b'C', chunk.encode('utf-8'), zlib.compress) for chunk in split_dom(dom)]
+            self._written[key] = self._write_record(b'D', packb(chunks))
+        if ref_key:
+            self._written[ref_key] = self._written[key]
+        return self._written[key]
+
+    def _observation_to_record(self, observation: Optional[Observation]) -> Optional[dict]:
+        if observation is None:
+            return None
+        screenshot = self._write_once(b'I', observation.get_screenshot_bytes()) if observation._screenshot else None
+        dom = self._write_dom(observation) if observation._dom else None
+        return {
+            "time": observation.time,
+            "screenshot": screenshot,
+            "dom": dom,
+            "pointer_xy": list(observation.pointer_xy)
+        }
+
+    def _step_to_record(self, step: Step) -> dict:
+        record = {
+            "id": step.id,
+            "name": step.name,
+            "status": str(step.status),
+            "tags": list(step.tags),
+            "task": isinstance(step, Task),
+            "context": None
+        }
+        if step.context is not None:
+            record["context"] = {
+                "start_observation": self._observation_to_record(step.context.start_observation),
+                "status": step.context.status,
+                "end_observation": self._observation_to_record(step.context.end_observation)
+            }
+        if isinstance(step, PageAction):
+            record["action_args"] = step.action_args.to_dict()
+        return record
+
+
+class BinaryRecordingReader(RecordingReader):
+    EXTENSION = '.bhr'
+
+    def __init__(self, path: str, blob_store: Optional[BlobStore] = None):
+        super().__init__(path, blob_store)
+        self._f = open(path, 'rb')
+        self._doms: dict[int, str] = {}  # Offset -> dom. Observations with the same dom share the string
+        header = BinaryRecordingWriter
+        if self._f.read(len(header.MAGIC)) != header.MAGIC:
+            raise ValueError(f"{path} is not a binary recording")
+        self._f.seek(-(header.FOOTER.size + len(header.MAGIC_END)), os.SEEK_END)
+        footer = self._f.read(header.FOOTER.size + len(header.MAGIC_END))
+        if footer[header.FOOTER.size:] != header.MAGIC_END:
+            raise ValueError(f"{path} has no index. The recording is not complete")
+        index_offset = header.FOOTER.unpack(footer[:header.FOOTER.size])[0]
+        _, payload = self._read_record(index_offset)
+        # Step id -> (offset, parent id). Ordered as written
+        self.index: dict[int, tuple[int, Optional[int]]] = {
+            step_id: (offset, parent_id) for step_id, offset, parent_id in unpackb(payload)
+        }
+
+    def close(self):
+        self._f.close()
+
+    def _read_record(self, offset: int) -> tuple[bytes, bytes]:
+        self._f.seek(offset)
+        record_type, length = BinaryRecordingWriter.RECORD_HEADER.unpack(
+            self._f.read(BinaryRecordingWriter.RECORD_HEADER.size))
+        return record_type, self._f.read(length)
+
+    def _read_dom(self, offset: int) -> str:
+        if offset not in self._doms:
+            chunks = unpackb(self._read_record(offset)[1])
+            self._doms[offset] = b''.join(zlib.decompress(self._read_record(chunk)[1]) for chunk in chunks).decode('utf-8')
+        return self._doms[offset]
+
+    def _record_to_observation(self, record: Optional[dict]) -> Optional[Observation]:
+        if record is None:
+            return None
+        screenshot = ''
+        if record["screenshot"] is not None:
+            self._f.seek(record["screenshot"])
+            _, length = BinaryRecordingWriter.RECORD_HEADER.unpack(self._f.read(BinaryRecordingWriter.RECORD_HEADER.size))
+            screenshot = BinaryImage(self.path, record["screenshot"] + BinaryRecordingWriter.RECORD_HEADER.size, length)
+        dom = ''
+        if record["dom"] is not None:
+            dom = self._read_dom(record["dom"])
+        return Observation(record["time"], screenshot, dom, tuple(record["pointer_xy"]))
+
+    def _read_step(self, step_id: int) -> Step:
+        _, payload = self._read_record(self.index[step_id][0])
+        record = unpackb(payload)
+        context = None
+        if record["context"] is not None:
+            context = Context(
+                self._record_to_observation(record["context"]["start_observation"]),  # type: ignore
+                record["context"]["status"],
+                self._record_to_observation(record["context"]["end_observation"]))  # type: ignore
+        status = SaveStatus(record["status"])
+        if record["task"]:
+            return Task(record["id"], record["name"], status, context, record["tags"], [])
+        action_args = ActionArgs.from_dict(record["action_args"]) if record.get("action_args") else None
+        return PageAction(record["id"], record["name"], status, context, record["tags"], action_args)
+
+    def iter_steps(self) -> Iterator[tuple[Optional[int], Step]]:
+        for step_id, (_, parent_id) in list(self.index.items()):
+            yield parent_id, self._read_step(step_id)
+
+    def _build_tree(self, root_id: int) -> Step:
+        root = self._read_step(root_id)
+        steps: dict[int, Step] = {root_id: root}
+        for step_id, (_, parent_id) in self.index.items():
+            if parent_id in steps and step_id not in steps:
+                step = self._read_step(step_id)
+                steps[step_id] = step
+                parent = steps[parent_id]
+                assert isinstance(parent, Task)
+                parent.add_step(step)
+        return root
+
+    def get_step(self, step_id: int) -> Step:
+        """
+        Read a step by id. Tasks are read with all their children.
+        """
+        if step_id not in self.index:
+            raise ValueError(f"Step with id {step_id} not found")
+        return self._build_tree(step_id)
+
+    def read(self) -> Task:
+        root_id = next(iter(self.index))
+        root = self._build_tree(root_id)
+        assert isinstance(root, Task), "Root element must be a Task"
+        return root
+
+
+# Name of the format -> extension of the files
+RECORDING_EXTENSIONS = {
+    'json': JsonRecordingWriter.EXTENSION,
+    'binary': BinaryRecordingWriter.EXTENSION
+}
+_WRITERS: dict[str, type[RecordingWriter]] = {
+    JsonRecordingWriter.EXTENSION: JsonRecordingWriter,
+    BinaryRecordingWriter.EXTENSION: BinaryRecordingWriter
+}
+_READERS: dict[str, type[RecordingReader]] = {
+    JsonRecordingReader.EXTENSION: JsonRecordingReader,
+    BinaryRecordingReader.EXTENSION: BinaryRecordingReader
+}
+
+
+def get_writer(path: str) -> RecordingWriter:
+    extension = os.path.splitext(path)[1]
+    if extension not in _WRITERS:
+        raise ValueError(f"Unknown recording format {extension}. Use one of {list(_WRITERS)}")
+    return _WRITERS[extension]()
+
+
+def get_reader(path: str, blob_store: Optional[BlobStore] = None) -> RecordingReader:
+    extension = os.path.splitext(path)[1]
+    if extension not in _READERS:
+        raise ValueError(f"Unknown recording format {extension}. Use one of {list(_READERS)}")
+    return _READERS[extension](path, blob_store)
+
+
+def save_recording(task: Step, path: str):
+    """
+    Save the recording in the format of the extension of path.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    get_writer(path).write(task, path)
+
+
+def load_recording(path: str, blob_store: Optional[BlobStore] = None) -> Task:
+    with get_reader(path, blob_store) as reader:
+        return reader.read()
+
+
+def convert(input_path: str, output_path: str):
+    task = load_recording(input_path)
+    save_recording(task, output_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert recordings between json and binary (.bhr) formats.')
+    parser.add_argument('input', help='Recording to convert (.json or .bhr)')
+    parser.add_argument('output', help='Converted recording (.json or .bhr)')
+    args = parser.parse_args()
+    convert(args.input, args.output)
+    print(f"{args.input} ({os.path.getsize(args.input)} bytes) -> {args.output} ({os.path.getsize(args.output)} bytes)")
+    sys.exit(0)
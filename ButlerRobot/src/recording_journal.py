@@ -0,0 +1,185 @@
+"""
+Append-only journal of a recording.
+
+Instead of rewriting the whole root Task every time a keyword ends, every finished step is appended to
+`<test>.journal` as one JSON line. The journal can be compacted into the usual `<test>.json` file at the end
+of the test, or read back to rebuild the Task tree of a test that crashed before finishing.
+
+Records (one per line):
+    - {"op": "start", "step": <root Task without steps>}
+    - {"op": "doms", "dom_set": <doms of the next step and their chunks not journaled yet>}
+    - {"op": "add", "parent_id": <id>, "step": <Step, Tasks without steps>}
+    - {"op": "remove", "parent_id": <id>, "step_id": <id>}
+    - {"op": "drop", "step_id": <id>}
+    - {"op": "end", "step": <root Task without steps>}
+
+A Task always ends after its children, so the children are journaled before the Task that contains them. If the Task
+is not recorded (Ex: excluded by its tags), it is dropped and its children are discarded.
+
+Doms held in a DomSet are journaled as references (`dom:<id>`), like in Step.save. Every chunk of the DomSet is
+journaled once, before the first step that uses it, so the journal and the compacted recording do not repeat the
+html of every observation.
+"""
+
+from __future__ import annotations
+import os
+import json
+from typing import Optional
+from .data_types import Step, PageAction, Task, CustomJSONEncoder, DomSet
+from .blob_store import BlobStore
+from .recording_format import save_recording
+
+
+class RecordingJournal:
+    def __init__(self, path: str):
+        """
+        :param path: Path of the journal file. Usually `<suite_out_path>/<test name>.journal`.
+        """
+        self.path = path
+        self._file = None
+        # DomSet of the first dom reference journaled. Doms of other DomSets are journaled as html
+        self.dom_set: Optional[DomSet] = None
+        self._journaled_doms: set[str] = set()
+        self._journaled_chunks: set[str] = set()
+
+    def _step_to_record(self, step: Step) -> dict:
+        """
+        Serialize a step without its children. Children are journaled on their own.
+        """
+        record = CustomJSONEncoder(dom_set=self.dom_set).default(step)
+        if isinstance(step, Task):
+            record["steps"] = []
+        return record
+
+    def _write(self, record: dict):
+        assert self._file is not None, f"Journal {self.path} is not open"
+        self._file.write(json.dumps(record, cls=CustomJSONEncoder, dom_set=self.dom_set) + '\n')
+        self._file.flush()
+
+    def _write_doms(self, step: Step):
+        """
+        Journal the doms of the observations of the step that are not journaled yet, without the chunks that are.
+        """
+        if step.context is None:
+            return
+        dom_ids = []
+        for observation in (step.context.start_observation, step.context.end_observation):
+            dom_ref = observation.dom_ref if observation is not None else None
+            if dom_ref is None or dom_ref.dom_set is None:
+                continue
+            if self.dom_set is None:
+                self.dom_set = dom_ref.dom_set
+            if dom_ref.dom_set is self.dom_set and dom_ref.dom_id not in self._journaled_doms:
+                self._journaled_doms.add(dom_ref.dom_id)
+                dom_ids.append(dom_ref.dom_id)
+        if not dom_ids:
+            return
+        assert self.dom_set is not None
+        data = self.dom_set.to_dict(dom_ids, skip_chunks=self._journaled_chunks)
+        if self._journaled_chunks:
+            del data["dictionary"]  # Journaled with the first chunks
+        self._journaled_chunks.update(data["chunks"])
+        self._write({"op": "doms", "dom_set": data})
+
+    def _write_step(self, record: dict, step: Step):
+        self._write_doms(step)
+        record["step"] = self._step_to_record(step)
+        self._write(record)
+
+    def open(self, root: Task):
+        """
+        Create the journal and write the root Task. An existing journal with the same path is overwritten.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write_step({"op": "start"}, root)
+
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def add_step(self, parent_id: int, step: Step):
+        self._write_step({"op": "add", "parent_id": parent_id}, step)
+
+    def remove_step(self, parent_id: int, step_id: int):
+        self._write({"op": "remove", "parent_id": parent_id, "step_id": step_id})
+
+    def drop_step(self, step_id: int):
+        """
+        The Task ended but is not recorded. Its journaled children are discarded.
+        """
+        self._write({"op": "drop", "step_id": step_id})
+
+    def close(self, root: Task | None = None):
+        """
+        Close the journal. If root is given, its final context and status are written before closing.
+        """
+        if self._file is None:
+            return
+        if root is not None:
+            self._write_step({"op": "end"}, root)
+        self._file.close()
+        self._file = None
+
+    def compact(self, save_path: str) -> Task:
+        """
+        Rebuild the Task from the journal, save it in save_path (json or binary by extension) and remove the journal.
+        """
+        self.close()
+        task = self.load(self.path)
+        save_recording(task, save_path)
+        os.remove(self.path)
+        return task
+
+    @classmethod
+    def load(cls, path: str, blob_store: Optional[BlobStore] = None) -> Task:
+        """
+        Rebuild the root Task from a journal. The journal may be half written (the test crashed): steps whose
+        parent Task never ended are attached to the root in journal order and a truncated last line is ignored.
+        If the test ended, these steps are discarded, like in the Task of the test saved from memory.
+        Screenshot references are resolved with the BlobStore next to the journal if no blob_store is given.
+        """
+        blob_store = blob_store or BlobStore.for_recording(path)
+        dom_set = DomSet()
+        root: Task | None = None
+        ended = False
+        children: dict[int, list[Step]] = {}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be half written
+                    break
+
+                if record["op"] == "doms":
+                    dom_set.update(record["dom_set"])
+                elif record["op"] in ("start", "end"):
+                    root = Task.from_dict(record["step"], blob_store, dom_set)
+                    ended = record["op"] == "end"
+                elif record["op"] == "add":
+                    step_data = record["step"]
+                    if 'steps' in step_data:
+                        step = Task.from_dict(step_data, blob_store, dom_set)
+                        step.steps = children.pop(step.id, [])
+                    else:
+                        step = PageAction.from_dict(step_data, blob_store, dom_set)
+                    children.setdefault(record["parent_id"], []).append(step)
+                elif record["op"] == "remove":
+                    siblings = children.get(record["parent_id"], [])
+                    for i in range(len(siblings) - 1, -1, -1):
+                        if siblings[i].id == record["step_id"]:
+                            del siblings[i]
+                            break
+                elif record["op"] == "drop":
+                    children.pop(record["step_id"], None)
+
+        if root is None:
+            raise ValueError(f"Journal {path} has no root Task")
+
+        root.steps = children.pop(root.id, [])
+        # Steps of Tasks that never ended (crash)
+        if not ended:
+            for orphans in children.values():
+                root.steps.extend(orphans)
+        return root
@@ -0,0 +1,266 @@
+"""
+Streaming loader for recordings saved with `Step.save`.
+
+`Task.from_dict` needs the whole json in memory. `iter_steps` reads the file incrementally and yields the steps one
+by one, so the memory used only depends on the size of one step. Screenshots are not read: the observations hold a
+`ScreenshotSlice` that points to the base64 in the file and reads it only when the screenshot is accessed.
+Dom references are resolved with the DomSet saved before the fields of the root (see `Step.save`), which is kept in
+memory while iterating.
+
+Tasks are yielded before their children and without them (steps=[]). The order is the same as `Task.get_all_steps`.
+"""
+
+from __future__ import annotations
+import re
+import json
+from typing import Iterator, Optional
+from .blob_store import BlobStore, BlobRef
+from .data_types import Step, PageAction, Task, Context, Observation, DomRef, DomSet
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class ScreenshotSlice:
+    """
+    Screenshot in base64 inside a recording file. Only read when it is accessed.
+    """
+    def __init__(self, path: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return f"ScreenshotSlice({self.path}, {self.offset}, {self.length})"
+
+    def to_base64(self) -> str:
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.length).decode('ascii')
+
+    def to_dict(self):
+        return self.to_base64()
+
+
+class _JsonStream:
+    """
+    Minimal pull parser over a json file. Keeps in memory only the part of the file that is being parsed.
+    The file is decoded as latin-1, so positions in the buffer are also positions in the file.
+    """
+    # Screenshots shorter than this are read (empty or references), longer ones are left in the file
+    SMALL_STRING = 256
+
+    def __init__(self, path: str, chunk_size: int):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._f = open(path, 'rb')
+        self._buf = ''
+        self._buf_start = 0  # Position in the file of _buf[0]
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def close(self):
+        self._f.close()
+
+    @property
+    def offset(self) -> int:
+        return self._buf_start + self._pos
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        if self._eof:
+            return False
+        # Drop what is already parsed
+        self._buf_start += self._pos
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        data = self._f.read(size or self.chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data.decode('latin-1')
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()  # type: ignore
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError(f"Unexpected end of recording {self.path}")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at position {self.offset} of {self.path}")
+        self._pos += 1
+
+    def next_is(self, char: str) -> bool:
+        """
+        Consume char if it is the next one.
+        """
+        if self.peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    def read_value(self):
+        """
+        Read a whole json value.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number at the end of the buffer could continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    break
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill(size)
+            size *= 2
+        raw = self._buf[self._pos:end]
+        if not raw.isascii():
+            value = json.loads(raw.encode('latin-1').decode('utf-8'))
+        self._pos = end
+        return value
+
+    def skip_string(self) -> tuple[int, int]:
+        """
+        Skip a string without keeping it in memory. Returns the position and length of its content in the file.
+        """
+        self.expect('"')
+        start = self.offset
+        while True:
+            i = self._pos
+            while True:
+                match = _STRING_SPECIAL.search(self._buf, i)
+                if match is None:
+                    i = len(self._buf)
+                    break
+                i = match.start()
+                if self._buf[i] == '"':
+                    self._pos = i + 1
+                    return start, self._buf_start + i - start
+                if i + 1 >= len(self._buf):
+                    # Escape cut at the end of the buffer
+                    break
+                i += 2
+            self._pos = i
+            if not self._fill():
+                raise ValueError(f"Unexpected end of recording {self.path}")
+
+    def read_file(self, offset: int, length: int) -> str:
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads('"' + f.read(length).decode('utf-8') + '"')
+
+
+class _StepParser:
+    def __init__(self, stream: _JsonStream, blob_store: Optional[BlobStore], with_dom: bool):
+        self.stream = stream
+        self.blob_store = blob_store
+        self.with_dom = with_dom
+        self.dom_set: Optional[DomSet] = None
+
+    def _iter_keys(self) -> Iterator[str]:
+        """
+        Iterate over the keys of an object. The value of every key must be consumed before the next one.
+        """
+        self.stream.expect('{')
+        if self.stream.next_is('}'):
+            return
+        while True:
+            key = self.stream.read_value()
+            self.stream.expect(':')
+            yield key
+            if self.stream.next_is('}'):
+                return
+            self.stream.expect(',')
+
+    def _parse_screenshot(self):
+        if self.stream.peek() != '"':
+            return self.stream.read_value()
+        offset, length = self.stream.skip_string()
+        if length > self.stream.SMALL_STRING:
+            return ScreenshotSlice(self.stream.path, offset, length)
+        screenshot = self.stream.read_file(offset, length)
+        if BlobRef.is_reference(screenshot):
+            return BlobRef.from_reference(screenshot, self.blob_store)
+        return screenshot
+
+    def _parse_observation(self) -> Optional[Observation]:
+        if self.stream.peek() != '{':
+            return self.stream.read_value()
+        data = {}
+        for key in self._iter_keys():
+            if key == 'screenshot':
+                data[key] = self._parse_screenshot()
+            elif key == 'dom' and not self.with_dom and self.stream.peek() == '"':
+                self.stream.skip_string()
+                data[key] = ''
+            elif key == 'dom':
+                dom = self.stream.read_value()
+                data[key] = DomRef.from_reference(dom, self.dom_set) if DomRef.is_reference(dom) else dom
+            else:
+                data[key] = self.stream.read_value()
+        return Observation(data["time"], data["screenshot"], data["dom"], data["pointer_xy"])
+
+    def _parse_context(self) -> Optional[Context]:
+        if self.stream.peek() != '{':
+            return self.stream.read_value()
+        data = {}
+        for key in self._iter_keys():
+            if key in ('start_observation', 'end_observation'):
+                data[key] = self._parse_observation()
+            else:
+                data[key] = self.stream.read_value()
+        return Context(data["start_observation"], data["status"], data.get("end_observation"))  # type: ignore
+
+    def parse_step(self, parent_id: Optional[int]) -> Iterator[tuple[Optional[int], Step]]:
+        data = {}
+        context = None
+        task: Optional[Task] = None
+        for key in self._iter_keys():
+            if key == 'dom_set':
+                self.dom_set = DomSet.from_dict(self.stream.read_value())
+            elif key == 'context':
+                context = self._parse_context()
+            elif key == 'steps':
+                # Steps is the last field of a Task. Yield the task before its children
+                task = Task.from_dict({**data, "steps": []}, self.blob_store)
+                task.context = context
+                yield parent_id, task
+                self.stream.expect('[')
+                if not self.stream.next_is(']'):
+                    while True:
+                        yield from self.parse_step(task.id)
+                        if self.stream.next_is(']'):
+                            break
+                        self.stream.expect(',')
+            else:
+                data[key] = self.stream.read_value()
+
+        if task is None:
+            step = PageAction.from_dict(data, self.blob_store)
+            step.context = context
+            yield parent_id, step
+
+
+def iter_steps(path: str, blob_store: Optional[BlobStore] = None, with_dom: bool = True,
+               chunk_size: int = 1 << 16) -> Iterator[tuple[Optional[int], Step]]:
+    """
+    Yield (parent_id, step) for every step of a recording without loading the whole file.
+    :param path: Json of the recording.
+    :param blob_store: Store to resolve screenshot references. Default: the store next to the json.
+    :param with_dom: Read the dom of the observations. If False, dom is set to ''.
+    :param chunk_size: Bytes read from the file at once.
+    """
+    stream = _JsonStream(path, chunk_size)
+    try:
+        parser = _StepParser(stream, blob_store or BlobStore.for_recording(path), with_dom)
+        yield from parser.parse_step(None)
+    finally:
+        stream.close()
@@ -0,0 +1,196 @@
+"""
+Encoding of the screenshots of the observations.
+
+The libraries get the screenshot as an image file or bytes (usually PNG). `ScreenshotCodec` returns it in the
+configured format:
+- png: Lossless. Default.
+- webp: Lossless WebP. Smaller than PNG but slower to encode.
+- jpeg: Lossy, with the given quality.
+
+With max_size the image is downscaled to fit in it, keeping the aspect ratio. Bounding boxes of the actions are in
+page coordinates, so they do not match a downscaled screenshot.
+
+If the image is already in the format and fits in max_size it is returned as is. PIL only reads the header to check
+it, so there is no decode/encode round trip.
+
+`EncodingPool` encodes in worker threads. The keyword thread only captures the image and the observation holds a
+`PendingScreenshot` until the screenshot is needed (Ex: saving the recording). PIL releases the GIL while decoding
+and encoding, so threads are enough to use several cores. Saving the recording waits for the screenshots, so the libraries only
+accept an EncodingPool when they save in the background (async_save).
+"""
+
+from __future__ import annotations
+import time
+import base64
+import copy
+import threading
+from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from PIL import Image
+
+
+@dataclass
+class ScreenshotStats:
+    count: int = 0
+    encoded: int = 0  # Screenshots that needed a transform
+    seconds: float = 0.0
+    bytes: int = 0
+
+    def add(self, other: ScreenshotStats):
+        self.count += other.count
+        self.encoded += other.encoded
+        self.seconds += other.seconds
+        self.bytes += other.bytes
+
+    def __str__(self):
+        return f"{self.count} screenshots ({self.encoded} encoded), {self.bytes / 1024:.1f} KB, {self.seconds * 1000:.1f} ms"
+
+
+class ScreenshotCodec:
+    FORMATS = {'png': 'PNG', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+    def __init__(self, format: str = 'png', quality: int = 90, max_size: Optional[tuple[int, int] | str] = None):
+        """
+        :param format: png, webp (lossless) or jpeg.
+        :param quality: Quality of jpeg, from 1 to 95.
+        :param max_size: (width, height) or "<width>x<height>". Larger screenshots are downscaled to fit in it.
+        """
+        format = format.lower()
+        if format == 'jpg':
+            format = 'jpeg'
+        if format not in self.FORMATS:
+            raise ValueError(f"Unknown screenshot format {format}. Use one of {list(self.FORMATS)}")
+        if isinstance(max_size, str):
+            width, height = max_size.lower().split('x')
+            max_size = (int(width), int(height))
+        self.format = format
+        self.quality = int(quality)
+        self.max_size = max_size
+        # Stats since the last call to pop_stats and since the codec was created
+        self.stats = ScreenshotStats()
+        self.total_stats = ScreenshotStats()
+        self._stats_lock = threading.Lock()  # Screenshots can be encoded in an EncodingPool
+
+    def _fits(self, size: tuple[int, int]) -> bool:
+        return self.max_size is None or (size[0] <= self.max_size[0] and size[1] <= self.max_size[1])
+
+    def _transform(self, im: Image.Image) -> bytes:
+        if not self._fits(im.size):
+            im.thumbnail(self.max_size, Image.LANCZOS)  # type: ignore
+        buff = BytesIO()
+        if self.format == 'jpeg':
+            if im.mode != 'RGB':
+                im = im.convert('RGB')
+            im.save(buff, format='JPEG', quality=self.quality)
+        elif self.format == 'webp':
+            im.save(buff, format='WEBP', lossless=True)
+        else:
+            im.save(buff, format='PNG')
+        return buff.getvalue()
+
+    def _record(self, start: float, data: bytes, encoded: bool, stats: Optional[ScreenshotStats] = None):
+        screenshot_stats = ScreenshotStats(1, int(encoded), time.perf_counter() - start, len(data))
+        with self._stats_lock:
+            (self.stats if stats is None else stats).add(screenshot_stats)
+            self.total_stats.add(screenshot_stats)
+
+    def encode(self, data: bytes, stats: Optional[ScreenshotStats] = None) -> bytes:
+        """
+        Image bytes in the configured format.
+        :param stats: Stats where the screenshot is added instead of the stats of the codec (Ex: the stats of the
+            keyword that submitted it to an EncodingPool). Always added to total_stats.
+        """
+        start = time.perf_counter()
+        im = Image.open(BytesIO(data))  # Lazy, only the header is read
+        encoded = im.format != self.FORMATS[self.format] or not self._fits(im.size)
+        if encoded:
+            data = self._transform(im)
+        self._record(start, data, encoded, stats)
+        return data
+
+    def encode_image(self, im: Image.Image) -> bytes:
+        """
+        Encode an image already decoded (Ex: pyautogui screenshot).
+        """
+        start = time.perf_counter()
+        data = self._transform(im)
+        self._record(start, data, True)
+        return data
+
+    def encode_file(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return self.encode(f.read())
+
+    def to_base64(self, data: bytes) -> str:
+        return base64.b64encode(data).decode('ascii')
+
+    def pop_stats(self) -> ScreenshotStats:
+        """
+        Stats since the last call. Used to report the screenshots of every keyword.
+        """
+        with self._stats_lock:
+            stats = self.stats
+            self.stats = ScreenshotStats()
+        return stats
+
+
+class PendingScreenshot:
+    """
+    Screenshot being encoded in an EncodingPool. The result is the screenshot in base64 or its BlobRef if it is
+    stored. Observation reads the result without replacing it. The spiller replaces it when it spills the screenshot.
+    """
+    def __init__(self, future: Future, size: int):
+        self.future = future
+        self.size = size  # Bytes of the captured image
+
+    def result(self) -> Any:
+        return self.future.result()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def __repr__(self):
+        return f"PendingScreenshot({self.size} bytes, done={self.future.done()})"
+
+    def __deepcopy__(self, memo):
+        # The future can't be copied, the copy gets the encoded screenshot
+        return copy.deepcopy(self.result(), memo)
+
+
+class EncodingPool:
+    def __init__(self, codec: ScreenshotCodec, workers: int = 2, max_pending: int = 8):
+        """
+        :param codec: Codec of the screenshots.
+        :param workers: Threads that encode.
+        :param max_pending: Screenshots waiting or being encoded. Past it, submit waits, so the captured images
+            can not pile up in memory.
+        """
+        self.codec = codec
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='screenshot-encoder')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _encode(self, data: bytes, store: Optional[Callable[[bytes], Any]], stats: Optional[ScreenshotStats]) -> Any:
+        try:
+            data = self.codec.encode(data, stats)
+            return store(data) if store is not None else self.codec.to_base64(data)
+        finally:
+            self._slots.release()
+
+    def submit(self, data: bytes, store: Optional[Callable[[bytes], Any]] = None,
+               stats: Optional[ScreenshotStats] = None) -> PendingScreenshot:
+        """
+        Encode the image bytes in a worker. If store is set, it is called with the encoded bytes and its return is
+        the result (Ex: BlobStore.put). Otherwise the result is base64. See ScreenshotCodec.encode for stats.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._encode, data, store, stats)
+        except BaseException:
+            self._slots.release()
+            raise
+        return PendingScreenshot(future, len(data))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
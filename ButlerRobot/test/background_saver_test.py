@@ -0,0 +1,119 @@
+import unittest
+import tempfile
+import threading
+import os
+import json
+import base64
+from concurrent.futures import Future
+from unittest import mock
+from ButlerRobot.src.background_saver import BackgroundSaver, StepSnapshot
+from ButlerRobot.src.data_types import Context, Observation, PageAction, Task
+from ButlerRobot.src.observation_arena import ArenaScreenshot, ObservationSpiller
+from ButlerRobot.src.recording_format import save_recording
+from ButlerRobot.src.screenshot_codec import PendingScreenshot
+
+
+class TestBackgroundSaver(unittest.TestCase):
+
+    def test_snapshot_is_not_modified_by_new_steps(self):
+        sub_task = Task(id=1, name='Login', steps=[PageAction(id=2, name='Click')])
+        observation = Observation(time='2023-01-01T12:00:00', screenshot='', dom='')
+        task = Task(id=0, name='Test', steps=[sub_task], context=Context(observation, 'NOT SET'))
+        snapshot = StepSnapshot(task)
+
+        task.add_step(PageAction(id=3, name='Click'))
+        task.context.status = 'PASS'  # type: ignore
+        task.tags.append('done')
+
+        step = snapshot.to_step()
+        assert isinstance(step, Task) and step.context is not None
+        self.assertEqual([step.id for step in step.get_all_steps()], [0, 1, 2])
+        self.assertEqual(step.context.status, 'NOT SET')
+        self.assertEqual(step.tags, [])
+
+    def test_steps_modified_while_saving(self):
+        screenshots = [base64.b64encode(os.urandom(3000)).decode('ascii') for _ in range(2)]
+        encoded: Future = Future()
+        encoded.set_result(screenshots[0])
+        start_observation = Observation(time='2023-01-01T12:00:00', screenshot=PendingScreenshot(encoded, 2250), dom='')
+        observation = Observation(time='2023-01-01T12:00:01', screenshot=screenshots[1], dom='<html></html>')
+        action = PageAction(id=1, name='Click', context=Context(observation, 'PASS', observation))
+        task = Task(id=0, name='Test', steps=[action], context=Context(start_observation, 'NOT SET'))
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.json')
+            spiller = ObservationSpiller(budget_bytes=1, dir_path=tmpdirname)
+            saver = BackgroundSaver()
+            writing = threading.Event()
+            release = threading.Event()
+
+            def slow_save(step, save_path):
+                writing.set()
+                release.wait()
+                save_recording(step, save_path)
+
+            with mock.patch('ButlerRobot.src.background_saver.save_recording', slow_save):
+                saver.save(task, file_path)
+                writing.wait()
+                # The listener keeps recording while the writer is saving
+                task.add_step(PageAction(id=2, name='Click', context=Context(observation, 'PASS', observation)))
+                task.context.status = 'PASS'  # type: ignore
+                task.context.end_observation = observation  # type: ignore
+                spiller.track(observation)
+                self.assertIsInstance(observation._screenshot, ArenaScreenshot)
+                release.set()
+                self.assertEqual(saver.flush(), [])
+            saver.close()
+
+            data = Task.load(file_path)
+            assert data.context is not None and data.steps[0].context is not None
+            self.assertEqual([step.id for step in data.steps], [1])
+            self.assertEqual(data.context.status, 'NOT SET')
+            self.assertIsNone(data.context.end_observation)
+            self.assertEqual(data.context.start_observation.screenshot, screenshots[0])
+            self.assertEqual(data.steps[0].context.start_observation.screenshot, screenshots[1])
+            # The writer did not store anything in the observations of the listener
+            self.assertIsInstance(start_observation._screenshot, PendingScreenshot)
+            spiller.close()
+
+    def test_save_coalesces_and_flushes(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.json')
+            saver = BackgroundSaver()
+            task = Task(id=0, name='Test')
+            # Keep the writer busy so the next snapshots are coalesced
+            writing = threading.Event()
+            release = threading.Event()
+            save = Task.save
+            saved_snapshots = []
+
+            def slow_save(step, save_path):
+                saved_snapshots.append(len(step.steps))
+                writing.set()
+                release.wait()
+                save(step, save_path)
+
+            Task.save = slow_save  # type: ignore
+            try:
+                saver.save(task, file_path)
+                writing.wait()
+                for i in range(1, 10):
+                    task.add_step(PageAction(id=i, name='Click'))
+                    saver.save(task, file_path)
+                release.set()
+                self.assertEqual(saver.flush(), [])
+                # The first snapshot and only the last one of the burst
+                self.assertEqual(saved_snapshots, [0, 9])
+            finally:
+                Task.save = save  # type: ignore
+            saver.close()
+
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+            self.assertEqual(len(data['steps']), 9)
+            self.assertEqual(os.listdir(tmpdirname), ['task.json'])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBackgroundSaver)
+    unittest.TextTestRunner(verbosity=2).run(suite)
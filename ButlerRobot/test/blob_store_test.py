@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import base64
+import os
+import json
+from ButlerRobot.src.blob_store import BlobStore, BlobRef
+from ButlerRobot.src.data_types import ActionArgs, Context, Observation, PageAction, Task
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def test_put_is_content_addressed(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            store = BlobStore(os.path.join(tmpdirname, BlobStore.DIR_NAME))
+            ref = store.put(b'image bytes')
+            same_ref = store.put(b'image bytes')
+            other_ref = store.put(b'other image bytes')
+
+            self.assertEqual(ref, same_ref)
+            self.assertNotEqual(ref, other_ref)
+            self.assertIn(ref.key, store)
+            self.assertEqual(store.get(ref.key), b'image bytes')
+            self.assertEqual(len(os.listdir(os.path.join(tmpdirname, BlobStore.DIR_NAME))), 2)
+
+    def test_save_and_load_references(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            store = BlobStore(os.path.join(tmpdirname, BlobStore.DIR_NAME))
+            screenshot = base64.b64encode(b'image bytes').decode('ascii')
+            ref = store.put_base64(screenshot)
+
+            # Same screenshot as end of the action and start of the task
+            observation = Observation(time='2023-01-01T12:00:00', screenshot=ref, dom='', pointer_xy=(0, 0))
+            context = Context(start_observation=observation, status='PASS', end_observation=observation)
+            page_action = PageAction(id=1, name='Click', context=context, action_args=ActionArgs('button', ''))
+            task = Task(id=0, name='Test', context=context, steps=[page_action])
+            self.assertEqual(observation.screenshot, screenshot)
+
+            file_path = os.path.join(tmpdirname, 'task.json')
+            task.save(file_path)
+
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+            self.assertEqual(data['context']['start_observation']['screenshot'], str(ref))
+            self.assertEqual(data['steps'][0]['context']['end_observation']['screenshot'], str(ref))
+
+            restored_task = Task.load(file_path)
+            restored_observation = restored_task.steps[0].context.start_observation  # type: ignore
+            self.assertEqual(restored_observation.screenshot_ref, ref)
+            self.assertEqual(restored_observation.screenshot, screenshot)
+
+    def test_unresolved_reference(self):
+        observation = Observation.from_dict({
+            'time': '2023-01-01T12:00:00',
+            'screenshot': f'{BlobRef.PREFIX}abcdef',
+            'dom': '',
+            'pointer_xy': [0, 0]
+        })
+        self.assertTrue(observation.is_complete())
+        with self.assertRaises(ValueError):
+            observation.screenshot
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBlobStore)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,35 @@
+import unittest
+from ButlerRobot.test.fake_library import FakePageLibrary
+
+
+class TestChangeDetection(unittest.TestCase):
+
+    def test_reuse_unchanged_page(self):
+        library = FakePageLibrary()
+        first = library._get_observation()
+        self.assertIs(library._get_observation(), first)
+        self.assertEqual((library.screenshots, library.doms), (1, 1))
+
+        library.changes += 1
+        second = library._get_observation()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.dom, '<html><body>1</body></html>')
+        self.assertEqual((library.observations_captured, library.observations_reused), (2, 1))
+
+        # The pointer moved but the page did not change. Same screenshot and dom
+        library.last_pointer_xy = (10, 20)
+        moved = library._get_observation()
+        self.assertIsNot(moved, second)
+        self.assertEqual(moved.pointer_xy, (10, 20))
+        self.assertEqual((moved.screenshot, moved.dom), (second.screenshot, second.dom))
+        self.assertEqual(library.screenshots, 2)
+
+    def test_disabled(self):
+        library = FakePageLibrary(change_detection=False)
+        self.assertIsNot(library._get_observation(), library._get_observation())
+        self.assertEqual(library.screenshots, 2)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestChangeDetection)
+    unittest.TextTestRunner(verbosity=2).run(suite)
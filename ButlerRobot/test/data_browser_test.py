@@ -0,0 +1,131 @@
+import unittest
+from unittest import mock
+from ButlerRobot.test.fake_library import FakeLibrary
+try:
+    from ButlerRobot.DataBrowserLibrary import DataBrowserLibrary
+except ImportError:
+    # Installed with <robotframework-butlerhat>[full]
+    DataBrowserLibrary = None
+
+
+class FakeBrowser(FakeLibrary):
+    """
+    Browser with one page. probeSelector answers with `probe` or raises it if it is an exception.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(['go_to', 'new_page', 'close_page'])
+        self.pages = ['page']
+        self.probe = None
+        self.element = 'element'
+        self.catalog_reads = 0
+        self.viewport_reads = 0
+        self.page_viewport = None  # Viewport of the page state. None without a fixed viewport
+
+    def probeSelector(self, selector):
+        self.calls.append('probeSelector')
+        if isinstance(self.probe, Exception):
+            raise self.probe
+        return self.probe
+
+    def get_element(self, selector):
+        self.calls.append('get_element')
+        if self.element is None:
+            raise AssertionError(f'Element {selector} not found')
+        return self.element
+
+    def get_boundingbox(self, element):
+        return {'x': 10, 'y': 20, 'width': 30, 'height': 40}
+
+    def get_viewport_size(self):
+        self.viewport_reads += 1
+        return self.viewport
+
+    def getPageState(self):
+        return {'url': 'https://example.com', 'viewport': self.page_viewport, 'frames': ['main:0']}
+
+    def get_browser_catalog(self):
+        self.catalog_reads += 1
+        return [{'contexts': [{'pages': self.pages}]}]
+
+
+def _new_library():
+    with mock.patch('ButlerRobot.DataBrowserLibrary.Browser', FakeBrowser):
+        return DataBrowserLibrary(console=False, record=False)  # type: ignore
+
+
+@unittest.skipIf(DataBrowserLibrary is None, 'Browser is not installed')
+class TestDataBrowserLibrary(unittest.TestCase):
+
+    def test_probe_selector_fallbacks(self):
+        library = _new_library()
+        browser: FakeBrowser = library._library  # type: ignore
+        found = {'found': True, 'bbox': {'x': 1, 'y': 2, 'width': 3, 'height': 4}, 'viewport': {'width': 800, 'height': 600},
+                 'in_view': True, 'state': {}}
+
+        # Selectors with iframes are not probed
+        browser.probe = found
+        self.assertIsNone(library._probe_selector('iframe >>> id=button'))
+        self.assertNotIn('probeSelector', browser.calls)
+        self.assertEqual(library._probe_selector('id=button'), found)
+
+        # Not found, not unique or not native to Playwright: resolved with the keywords of Browser
+        for probe in ({'found': False}, None, Exception('Unknown engine "custom"')):
+            browser.probe = probe
+            self.assertIsNone(library._probe_selector('id=button'))
+
+        browser.calls.clear()
+        self.assertEqual(library._get_element_bbox('id=button'), {'x': 10, 'y': 20, 'width': 30, 'height': 40})
+        self.assertEqual(browser.calls, ['get_element'])
+        browser.element = None
+        self.assertEqual(library._retrieve_bbox_and_pointer('id=missing'), (None, None))
+        self.assertIn('not found', library.last_selector_error)
+
+    def test_browser_open_state(self):
+        library = _new_library()
+        browser: FakeBrowser = library._library  # type: ignore
+        self.assertTrue(library._is_browser_open())
+        self.assertTrue(library._is_browser_open())
+        self.assertEqual(browser.catalog_reads, 1)
+
+        # Keywords that do not change the pages keep the state
+        library.run_keyword('go_to', ['https://example.com'], {})
+        self.assertTrue(library._is_browser_open())
+        self.assertEqual(browser.catalog_reads, 1)
+
+        # Closing a page may close the last one. Read again
+        browser.pages = []
+        library.run_keyword('close_page', [], {})
+        self.assertFalse(library._is_browser_open())
+        self.assertEqual(browser.catalog_reads, 2)
+
+        # New pages are open without reading the catalog
+        browser.pages = ['page']
+        library.run_keyword('new_page', [], {})
+        self.assertTrue(library._is_browser_open())
+        self.assertEqual(browser.catalog_reads, 2)
+
+        # After a failure the state is unknown
+        with self.assertRaises(AssertionError):
+            library.run_keyword('go_to', ['fail'], {})
+        self.assertIsNone(library._browser_open)
+        self.assertTrue(library._is_browser_open())
+        self.assertEqual(browser.catalog_reads, 3)
+
+    def test_page_state_without_viewport(self):
+        library = _new_library()
+        browser: FakeBrowser = library._library  # type: ignore
+        self.assertEqual(library._get_viewport(), {'width': 800, 'height': 600})
+        for _ in range(3):
+            library._get_page_state()
+            self.assertEqual(library._get_viewport(), {'width': 800, 'height': 600})
+        self.assertEqual(browser.viewport_reads, 1)
+
+        browser.page_viewport = {'width': 1024, 'height': 768}
+        library._get_page_state()
+        self.assertEqual(library._get_viewport(), {'width': 1024, 'height': 768})
+        self.assertEqual(browser.viewport_reads, 1)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDataBrowserLibrary)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,100 @@
+import unittest
+import types
+import random
+from ButlerRobot.src.data_types import ActionArgs, Context, Observation, PageAction, SaveStatus, Task
+from ButlerRobot.src.data_to_ai.data_example_builder import AIExampleBuilder
+from ButlerRobot.src.data_to_ai.data_types import AIExample, PromptStep, ScreenshotRef
+
+
+def build_recording(n_steps: int, seed: int = 0) -> Task:
+    """
+    Random recording with nested tasks, scrolls and steps that are not recorded.
+    """
+    rand = random.Random(seed)
+
+    def context(step_id):
+        return Context(Observation('2023-01-01T12:00:00', f'start-{step_id}', ''), 'PASS',
+                       Observation('2023-01-01T12:00:01', f'end-{step_id}', ''))
+
+    root = Task(id=0, name='Test', context=context(0))
+    tasks = [root]
+    for step_id in range(1, n_steps):
+        parent = rand.choice(tasks[-5:])
+        status = SaveStatus.no_record if rand.random() < 0.1 else SaveStatus.to_record
+        kind = rand.random()
+        if kind < 0.3:
+            step = Task(id=step_id, name=f'Task {step_id}', status=status, context=context(step_id))
+            tasks.append(step)
+        else:
+            name = 'Scroll Down' if kind < 0.4 else f'Click {step_id}'
+            step = PageAction(id=step_id, name=name, status=status, context=context(step_id),
+                              action_args=ActionArgs(f'id=button-{step_id}', 'text' if kind > 0.8 else ''))
+        parent.add_step(step)
+    return root
+
+
+def reference_build(builder: AIExampleBuilder, ignore_scrolls: bool) -> list:
+    """
+    Examples built from the history of every step, like the builder did before streaming.
+    """
+    examples = []
+    for step in builder.task.get_all_steps():
+        if step.status == SaveStatus.no_record:
+            continue
+        history = builder.task.get_history_instructions(step.id, with_tasks=builder.history_with_tasks)
+        intermediate_tasks = builder._get_prompts(history)
+        start_screen = step.context.start_observation.screenshot
+        end_screen = step.context.end_observation.screenshot
+        end = PromptStep(name='end', args={}, type='action')
+        if isinstance(step, PageAction):
+            for prompt in intermediate_tasks:
+                instruction_history = prompt[:-1]
+                if ignore_scrolls:
+                    instruction_history = [s for s in instruction_history if s.type == 'task' or 'scroll' not in s.name.lower()]
+                examples.append(AIExample(instruction_history, start_screen, prompt[-1]).to_dict())
+            if builder.task.get_parent(step.id).steps[-1].id == step.id:
+                examples.append(AIExample(intermediate_tasks[-1], end_screen, end).to_dict())
+        elif isinstance(step, Task) and builder.history_with_tasks:
+            for prompt in intermediate_tasks:
+                examples.append(AIExample(prompt, end_screen, end).to_dict())
+    return examples
+
+
+class TestAIExampleBuilder(unittest.TestCase):
+
+    def test_same_examples(self):
+        root = build_recording(200)
+        for with_tasks in (False, True):
+            for ignore_scrolls in (True, False):
+                builder = AIExampleBuilder(root, with_tasks)
+                examples = builder.build(ignore_scrolls)
+                self.assertIsInstance(examples, types.GeneratorType)
+                self.assertEqual([example.to_dict() for example in examples], reference_build(builder, ignore_scrolls))
+
+    def test_screenshot_references(self):
+        root = Task(id=0, name='Test')
+        start = Observation('2023-01-01T12:00:00', 'c3RhcnQ=', '')
+        action = PageAction(id=1, name='Click', context=Context(start, 'PASS', Observation('2023-01-01T12:00:01', '', '')),
+                            action_args=ActionArgs('id=submit', ''))
+        root.add_step(action)
+        with self.assertLogs(level='WARNING'):
+            example, end_example = AIExampleBuilder(root).build()
+        self.assertIsInstance(example.screenshot, ScreenshotRef)
+        self.assertIs(example.screenshot.observation, start)
+        self.assertEqual(example.get_screenshot(), 'c3RhcnQ=')
+        self.assertEqual(example.screenshot.read(), b'start')
+        self.assertFalse(end_example.screenshot)
+        self.assertEqual(end_example.to_dict()['screenshot'], '')
+
+    def test_get_prompts_has_no_state(self):
+        root = build_recording(20)
+        histories = [root.get_history_instructions(step.id, with_tasks=True) for step in root.get_all_steps()]
+        first = [AIExampleBuilder._get_prompts(history) for history in histories]
+        # Prompts of previous calls are not returned again
+        self.assertEqual([AIExampleBuilder._get_prompts(history) for history in histories], first)
+        self.assertEqual(AIExampleBuilder._get_prompts(histories[0]), [[PromptStep('Test', {}, 'task')]])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestAIExampleBuilder)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -2,7 +2,28 @@ import unittest
 import tempfile
 import os
 import json
-from ButlerRobot.src.data_types import ActionArgs, Context, Observation, PageAction, Task, BBox
+import base64
+import copy
+import pickle
+from concurrent.futures import Future
+import dataclasses
+import imagehash
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+from ButlerRobot.src.data_types import ActionArgs, Context, Observation, PageAction, Task, BBox, CustomJSONEncoder
+from ButlerRobot.src.blob_store import BlobRef
+from ButlerRobot.src.screenshot_codec import PendingScreenshot
+
+
+def _screenshot(color, split=False) -> str:
+    im = Image.new('L', (64, 64), color)
+    if split:
+        im.paste(255 - color, (0, 0, 32, 64))
+    buff = BytesIO()
+    im.save(buff, format='PNG')
+    return base64.b64encode(buff.getvalue()).decode('ascii')
+
 
 class TestStepSaveMethod(unittest.TestCase):
 
@@ -108,8 +129,82 @@ class TestStepSaveMethod(unittest.TestCase):
             self.assertEqual(restored_context.end_observation.time, context.end_observation.time)
 
 
+class TestObservationHash(unittest.TestCase):
+
+    def test_hash_is_computed_once(self):
+        observation = Observation(time='2023-01-01T12:00:00', screenshot=_screenshot(0, split=True), dom='')
+        same = Observation(time='2023-01-01T12:00:01', screenshot=_screenshot(0, split=True), dom='')
+        with mock.patch('ButlerRobot.src.data_types.imagehash.average_hash', wraps=imagehash.average_hash) as average_hash:
+            for _ in range(3):
+                self.assertEqual(observation, same)
+            self.assertEqual(average_hash.call_count, 2)
+        self.assertEqual(hash(observation), hash(same))
+
+        observation.screenshot = _screenshot(0)
+        self.assertNotEqual(observation, same)
+        self.assertEqual(observation.measure_similarity(observation), 0)
+        self.assertGreater(observation.measure_similarity(same), 0)
+
+    def test_empty_screenshot(self):
+        empty = Observation(time='2023-01-01T12:00:00', screenshot='', dom='')
+        observation = Observation(time='2023-01-01T12:00:00', screenshot=_screenshot(0, split=True), dom='')
+        with mock.patch('ButlerRobot.src.data_types.imagehash.average_hash') as average_hash:
+            self.assertEqual(empty, Observation(time='2023-01-01T12:00:01', screenshot='', dom=''))
+            self.assertNotEqual(observation, empty)
+            average_hash.assert_not_called()
+        self.assertIsNone(empty.image_hash)
+        self.assertEqual(empty.measure_similarity(observation), 64)
+
+    def test_repr_and_eq_do_not_read_payloads(self):
+        encoding = PendingScreenshot(Future(), 100)  # Never encoded, reading it would wait forever
+        observation = Observation(time='2023-01-01T12:00:00', screenshot=encoding, dom='<html></html>')
+        self.assertEqual(repr(observation), "Observation(time='2023-01-01T12:00:00', screenshot=PendingScreenshot(100 bytes, "
+                                            "done=False), dom=<13 chars>, pointer_xy=(0, 0))")
+        self.assertEqual(observation, Observation(time='2023-01-01T12:00:01', screenshot=encoding, dom=''))
+        stored = Observation(time='2023-01-01T12:00:00', screenshot=BlobRef('0' * 64), dom='')
+        self.assertEqual(stored, Observation(time='2023-01-01T12:00:01', screenshot=BlobRef('0' * 64), dom=''))
+        self.assertIn('BlobRef', repr(stored))
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        observation = Observation(time='2023-01-01T12:00:00', screenshot='', dom='')
+        action = PageAction(id=1, name='Click', context=Context(observation, 'PASS', observation),
+                            action_args=ActionArgs('id=submit', '', BBox(1, 2, 3, 4)))
+        task = Task(id=0, name='Test', steps=[action])
+        for obj in (observation, action.context, action, action.action_args, action.action_args.bbox, task):
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+        with self.assertRaises(AttributeError):
+            action.not_a_field = True  # type: ignore
+
+        # Private fields are not saved
+        self.assertIs(task.find_step(1), action)
+        self.assertNotIn('_index', json.dumps(task, cls=CustomJSONEncoder))
+        self.assertEqual(copy.deepcopy(task), task)
+        self.assertEqual(pickle.loads(pickle.dumps(task)), task)
+
+    def test_page_action_tags_not_shared(self):
+        action = PageAction(id=1, name='Click')
+        action.tags.append('manual_task')
+        self.assertEqual(PageAction(id=2, name='Click').tags, [])
+
+    def test_bbox_value(self):
+        bbox = BBox(1.0, '2', 3, 4)
+        self.assertEqual(bbox, BBox(1, 2, 3, 4))
+        self.assertEqual(len({bbox, BBox(1, 2, 3, 4), BBox(1, 2, 3, 5)}), 2)
+        self.assertIs(type(bbox.x), int)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            bbox.x = 10  # type: ignore
+        self.assertEqual(dataclasses.replace(bbox, x=10), BBox(10, 2, 3, 4))
+        self.assertEqual(copy.deepcopy(bbox), bbox)
+        self.assertEqual(pickle.loads(pickle.dumps(bbox)), bbox)
+
+
 if __name__ == '__main__':
     # unittest.main()
     suite = unittest.TestLoader().loadTestsFromTestCase(TestStepSaveMethod)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestObservationHash))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestSlots))
     unittest.TextTestRunner(verbosity=2).run(suite)
     
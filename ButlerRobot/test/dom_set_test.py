@@ -0,0 +1,127 @@
+import unittest
+import tempfile
+import json
+import os
+import random
+from ButlerRobot.src.data_types import Context, DomRef, DomSet, Observation, PageAction, Task, split_dom
+from ButlerRobot.src.recording_stream import iter_steps
+
+
+def _page(values: list[int]) -> str:
+    rows = ''.join(f'<tr class="row"><td id="cell{i}">{value}</td><td><a href="/item/{i}">Item {i}</a></td></tr>\n'
+                   for i, value in enumerate(values))
+    return f'<html><head><title>Table</title></head><body><table>{rows}</table></body></html>'
+
+
+def _div_page(values: list[int]) -> str:
+    rows = ''.join(f'<div class="row"><div class="cell">Item {value}</div><div class="cell"><span>{i}</span></div></div>'
+                   for i, value in enumerate(values))
+    return f'<html><body><div id="app"><div class="list">{rows}</div></div></body></html>'
+
+
+class TestDomSet(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.values = [random.randint(0, 1000) for _ in range(2000)]
+
+    def test_split_dom(self):
+        dom = _page(self.values)
+        chunks = split_dom(dom)
+        self.assertEqual(''.join(chunks), dom)
+        self.assertGreater(len(chunks), 10)
+
+        # A change only affects the chunks around it
+        values = list(self.values)
+        values[1000] = -1
+        changed_chunks = split_dom(_page(values))
+        self.assertLessEqual(len(set(changed_chunks) - set(chunks)), 2)
+
+    def test_split_dom_repeated_tag(self):
+        # '</div>' closes most tokens of the page. It must not end a chunk every time
+        dom = _div_page(self.values)
+        chunks = split_dom(dom)
+        self.assertEqual(''.join(chunks), dom)
+        self.assertTrue(all(len(chunk) >= 512 for chunk in chunks[:-1]))
+        self.assertLess(len(chunks), len(dom) // 1000)
+
+        values = list(self.values)
+        values[1000] = -1
+        self.assertLessEqual(len(set(split_dom(_div_page(values))) - set(chunks)), 2)
+
+    def test_near_copies_share_chunks(self):
+        dom_set = DomSet()
+        doms = []
+        refs = []
+        values = list(self.values)
+        for i in range(20):
+            values[random.randrange(len(values))] = -i
+            doms.append(_page(values))
+            refs.append(dom_set.add_dom(doms[-1]))
+
+        self.assertEqual(dom_set.add_dom(doms[3]), refs[3])
+        self.assertEqual(len(dom_set), 20)
+        self.assertEqual(dom_set.add_dom(''), '')
+        for dom, ref in zip(doms, refs):
+            assert isinstance(ref, DomRef)
+            self.assertEqual(ref.to_str(), dom)
+        # Much less than one compressed copy per dom
+        self.assertLess(dom_set.stored_bytes(), len(doms[0]) // 2)
+
+        restored = DomSet.from_dict(json.loads(json.dumps(dom_set.to_dict())))
+        self.assertEqual(restored.get_dom(refs[5].dom_id), doms[5])  # type: ignore
+        legacy = DomSet.from_dict({"dom_set": doms[:2]})
+        self.assertEqual(len(legacy), 2)
+
+    def test_observation_with_reference(self):
+        dom_set = DomSet()
+        dom = _page(self.values)
+        observation = Observation(time='2023-01-01T12:00:00', screenshot='', dom=dom_set.add_dom(dom), pointer_xy=(0, 0))
+        self.assertIsInstance(observation.dom_ref, DomRef)
+        self.assertEqual(observation.dom, dom)
+
+        # Saved as a reference in the json, with the DomSet once per file
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.json')
+            Task(id=0, name='Test', context=Context(observation, 'PASS', observation)).save(file_path)
+            with open(file_path) as f:
+                data = json.load(f)
+            self.assertEqual(data['context']['start_observation']['dom'], f'dom:{observation.dom_ref.dom_id}')  # type: ignore
+            self.assertEqual(list(data['dom_set']['doms']), [observation.dom_ref.dom_id])  # type: ignore
+            restored_task = Task.load(file_path)
+            assert restored_task.context is not None
+            self.assertEqual(restored_task.context.start_observation.dom, dom)
+
+    def test_save_only_doms_of_the_recording(self):
+        dom_set = DomSet()
+        values = list(self.values)
+        tasks = []
+        for i in range(3):
+            values[i] = -1
+            observation = Observation('2023-01-01T12:00:00', '', dom_set.add_dom(_div_page(values)))
+            tasks.append(Task(id=i, name=f'Test {i}', context=Context(observation, 'PASS', observation)))
+        # Html of other DomSets and plain strings
+        other = DomSet()
+        tasks[1].add_step(PageAction(id=10, name='Click', context=Context(
+            Observation('2023-01-01T12:00:00', '', other.add_dom(_page(values))), 'PASS',
+            Observation('2023-01-01T12:00:01', '', '<html></html>'))))
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.json')
+            tasks[1].save(file_path)
+            with open(file_path) as f:
+                data = json.load(f)
+            self.assertEqual(list(data['dom_set']['doms']), [tasks[1].context.start_observation.dom_ref.dom_id])  # type: ignore
+            self.assertEqual(data['steps'][0]['context']['start_observation']['dom'], _page(values))
+
+            for restored in (Task.load(file_path), next(iter_steps(file_path))[1]):
+                assert restored.context is not None
+                self.assertEqual(restored.context.start_observation.dom, tasks[1].context.start_observation.dom)  # type: ignore
+            restored_action = list(iter_steps(file_path))[1][1]
+            self.assertEqual(restored_action.context.start_observation.dom, _page(values))  # type: ignore
+            self.assertEqual(restored_action.context.end_observation.dom, '<html></html>')  # type: ignore
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDomSet)
+    unittest.TextTestRunner(verbosity=2).run(suite)
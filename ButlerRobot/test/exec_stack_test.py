@@ -0,0 +1,111 @@
+import unittest
+import random
+from ButlerRobot.DataWrapperLibrary import ExecStack
+from ButlerRobot.src.data_types import ActionArgs, Context, Observation, PageAction, SaveStatus, Task
+from ButlerRobot.test.fake_library import FakeDataLibrary
+
+
+def search_parent_task(stack: list) -> Task:
+    """
+    Previous search of the Task where the finished steps are added.
+    """
+    if not isinstance(stack[-1], Task):
+        raise Exception("Last step in stack is not a Task")
+    for step in reversed(stack):
+        if isinstance(step, Task) and step.status != SaveStatus.only_substeps:
+            return step
+    raise Exception("No Task found in stack without only_substeps status")
+
+
+def search_last_task(stack: list):
+    """
+    Previous search of the last task: the first Task above the root.
+    """
+    last_task = None
+    for i in range(len(stack) - 1, 0, -1):
+        if isinstance(stack[i], Task):
+            last_task = stack[i]
+    return last_task
+
+
+class TestExecStack(unittest.TestCase):
+
+    def random_step(self, rand: random.Random, step_id: int):
+        kind = rand.random()
+        if kind < 0.5:
+            status = SaveStatus.only_substeps if rand.random() < 0.5 else SaveStatus.to_record
+            return Task(id=step_id, name=f'Task {step_id}', status=status)
+        return PageAction(id=step_id, name=f'Click {step_id}', action_args=ActionArgs(f'id=button-{step_id}', ''))
+
+    def test_same_as_search(self):
+        rand = random.Random(0)
+        stack = ExecStack()
+        reference = []
+        for step_id in range(2000):
+            if reference and rand.random() < 0.45:
+                step = stack.pop()
+                self.assertIs(step, reference.pop())
+            else:
+                step = self.random_step(rand, step_id)
+                stack.push(step)
+                reference.append(step)
+            self.assertEqual(stack.get_stack(), reference)
+            self.assertEqual(stack.is_empty(), not reference)
+            if not reference:
+                self.assertIsNone(stack.get_last_task())
+                continue
+            self.assertIs(stack.get_root(), reference[0])
+            self.assertIs(stack.get_last_step(), reference[-1])
+            self.assertIs(stack.get_last_task(), search_last_task(reference))
+            try:
+                expected = search_parent_task(reference)
+            except Exception:
+                self.assertRaises(Exception, stack.get_parent_task)
+            else:
+                self.assertIs(stack.get_parent_task(), expected)
+
+    def test_add_and_remove(self):
+        root = Task(id=0, name='Test')
+        loop = Task(id=1, name='FOR', status=SaveStatus.only_substeps)
+        action = PageAction(id=2, name='Click', action_args=ActionArgs('id=submit', ''))
+        stack = ExecStack().push(root).push(loop)
+        stack.add_to_parent(action)
+        self.assertEqual(root.steps, [action])
+        self.assertEqual(loop.steps, [])
+
+        # Only the first Task above the root is the last task
+        self.assertIs(stack.get_last_task(), loop)
+        self.assertEqual(stack.remove_last_step_from_last_task(), (False, "Task FOR has no steps. Doing nothing."))
+        stack.pop()
+        self.assertIsNone(stack.get_last_task())
+        self.assertEqual(stack.remove_last_step_from_last_task(), (False, "No task found in stack"))
+
+        stack.push(action)
+        self.assertIs(stack.remove_action(), action)
+        with self.assertRaises(AssertionError):
+            stack.remove_action()
+        with self.assertRaises(Exception):
+            stack.push(action).add_to_parent(PageAction(id=3, name='Click', action_args=ActionArgs('id=next', '')))
+
+    def test_observation_of_parents_without_steps(self):
+        library = FakeDataLibrary()
+        first = Observation(time='2023-01-01T12:00:00', screenshot='', dom='')
+        contexts = [Context(first, 'NOT SET') for _ in range(4)]
+        root = Task(id=0, name='Test', steps=[PageAction(id=4, name='Click')], context=contexts[0])
+        tasks = [Task(id=i, name=f'Task {i}', context=contexts[i]) for i in (1, 2)]
+        action = PageAction(id=3, name='Click', context=contexts[3])
+        for step in (root, *tasks, action):
+            library.exec_stack.push(step)
+
+        observation = Observation(time='2023-01-01T12:00:01', screenshot='', dom='')
+        library._update_observation_and_set_in_parents(observation)
+        self.assertEqual([context.start_observation.time for context in contexts],
+                         [first.time, observation.time, observation.time, first.time])
+
+        library._update_start_observation_to_all_stack(observation)
+        self.assertTrue(all(context.start_observation is observation for context in contexts))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestExecStack)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,95 @@
+"""
+Fake libraries shared by the tests of DataWrapperLibrary. They run without a browser or Robot Framework execution.
+"""
+
+import base64
+from robot.api.deco import keyword
+from ButlerRobot.DataWrapperLibrary import DataWrapperLibrary
+
+
+class FakeLibrary:
+    """
+    Wrapped library. Records the keywords run. A keyword fails if its name or its first argument is 'fail'.
+    """
+    def __init__(self, keyword_names=()):
+        self.keyword_names = list(keyword_names)
+        self.calls = []
+        self.viewport = {'width': 800, 'height': 600}
+
+    def get_keyword_names(self):
+        return self.keyword_names
+
+    def run_keyword(self, name, args, kwargs=None):
+        self.calls.append(name)
+        if name == 'fail' or args and args[0] == 'fail':
+            raise AssertionError('Keyword failed')
+        if name == 'set_viewport_size':
+            self.viewport = {'width': args[0], 'height': args[1]}
+        return name
+
+
+class FakeDataLibrary(DataWrapperLibrary):
+    """
+    Library with an added keyword and a keyword that overrides one of the wrapped library.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('console', False)
+        kwargs.setdefault('record', False)
+        super().__init__(FakeLibrary(['click', 'type_text']), **kwargs)
+        self.added_keywords.extend(['added_keyword'])
+        self.exclude_tags = []
+        self.finished = []
+
+    def _is_browser_open(self):
+        return False
+
+    def _get_action_tags(self):
+        return ['action']
+
+    def _post_run_keyword(self, name, failed):
+        self.finished.append((name, failed))
+
+    def added_keyword(self):
+        return 'added'
+
+    @keyword(name='Type Text', tags=['action'])
+    def type_text_override(self, text):
+        return f'override {text}'
+
+
+class FakeViewportLibrary(DataWrapperLibrary):
+    """
+    Counts the reads of the viewport of the page.
+    """
+    VIEWPORT_KEYWORDS = ('set_viewport_size',)
+
+    def __init__(self):
+        super().__init__(FakeLibrary(['set_viewport_size', 'click']), console=False, record=False)
+        self.reads = 0
+
+    def _read_viewport(self):
+        self.reads += 1
+        return self._library.viewport
+
+
+class FakePageLibrary(DataWrapperLibrary):
+    """
+    Page that changes when `changes` is incremented. Counts the screenshots and doms captured.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('change_detection', True)
+        super().__init__(FakeLibrary(), console=False, record=False, **kwargs)
+        self.changes = 0
+        self.screenshots = 0
+        self.doms = 0
+
+    def _get_screenshot(self, selector=None):
+        self.screenshots += 1
+        return base64.b64encode(bytes([self.changes % 256]) * 64).decode()
+
+    def _get_dom(self):
+        self.doms += 1
+        return f'<html><body>{self.changes}</body></html>'
+
+    def _get_page_state(self):
+        return {'url': 'https://example.com', 'viewport': {'width': 800, 'height': 600}, 'frames': [f'main:{self.changes}']}
@@ -0,0 +1,37 @@
+import unittest
+from ButlerRobot.test.fake_library import FakeDataLibrary
+
+
+class TestKeywordCache(unittest.TestCase):
+
+    def test_dispatch(self):
+        library = FakeDataLibrary()
+        self.assertEqual(library.run_keyword('type_text', ['a'], {}), 'override a')
+        self.assertEqual(library.run_keyword('type_text_override', ['b'], {}), 'override b')
+        self.assertEqual(library.run_keyword('added_keyword', [], {}), 'added')
+        self.assertEqual(library.run_keyword('click', [], {}), 'click')
+        self.assertEqual(library._library.calls, ['click'])
+
+        with self.assertRaises(AssertionError):
+            library.run_keyword('fail', [], {})
+        self.assertEqual(library.finished[-2:], [('click', False), ('fail', True)])
+
+    def test_invalidation(self):
+        library = FakeDataLibrary()
+        self.assertIn('added_keyword', library.get_keyword_names())
+        self.assertFalse(hasattr(library, 'new_keyword'))
+
+        library.new_keyword = lambda: 'new'  # type: ignore
+        library.added_keywords.append('new_keyword')
+        self.assertIn('new_keyword', library.get_keyword_names())
+        self.assertEqual(library.run_keyword('new_keyword', [], {}), 'new')
+
+        # Keywords of the library behave like methods
+        self.assertTrue(callable(library.click))
+        with self.assertRaises(AttributeError):
+            library.not_a_keyword
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestKeywordCache)
+    unittest.TextTestRunner(verbosity=2).run(suite)
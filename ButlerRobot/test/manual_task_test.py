@@ -0,0 +1,34 @@
+import unittest
+from ButlerRobot.test.fake_library import FakeDataLibrary
+
+
+def _attrs(kwname, tags):
+    return {'kwname': kwname, 'libname': 'FakeDataLibrary', 'tags': tags, 'type': 'KEYWORD', 'status': 'PASS',
+            'args': []}
+
+
+class TestManualTask(unittest.TestCase):
+
+    def test_start_and_end_task(self):
+        library = FakeDataLibrary(profile=True)
+        library._start_keyword('Start Task', _attrs('Start Task', ['task', 'no_record']))
+        library.start_task_kw('Manual task')
+        self.assertEqual(library.exec_stack.get_last_step().name, 'Manual task')
+        self.assertEqual(library._keyword_depth, 1)
+        library._end_keyword('Start Task', _attrs('Start Task', ['task', 'no_record']))
+
+        library._start_keyword('End Task', _attrs('End Task', ['task', 'no_record']))
+        library.end_task_kw()
+        library._end_keyword('End Task', _attrs('End Task', ['task', 'no_record']))
+
+        # Only the keywords of the listener are timed, and the messages are written when they end
+        self.assertEqual(library._keyword_depth, 0)
+        self.assertEqual(len(library.logger._buffer), 0)
+        self.assertEqual(library.profiler._keywords, [])
+        keywords = [event[1] for event in library.profiler.events if event[0] == library.profiler.KEYWORD]
+        self.assertEqual(keywords, ['Start Task', 'End Task'])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestManualTask)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,106 @@
+import unittest
+import tempfile
+import base64
+import os
+import copy
+from ButlerRobot.src.data_types import Context, DomSet, Observation, Task
+from ButlerRobot.src.observation_arena import ArenaDom, ArenaScreenshot, ObservationSpiller, payload_size
+
+
+class TestObservationArena(unittest.TestCase):
+
+    def setUp(self):
+        self.screenshots = [base64.b64encode(os.urandom(3000)).decode('ascii') for _ in range(10)]
+        self.observations = [Observation(time='2023-01-01T12:00:00', screenshot=screenshot, dom=f'<html>{i}ñ</html>', pointer_xy=(i, i))
+                             for i, screenshot in enumerate(self.screenshots)]
+
+    def test_spill_oldest_past_budget(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            size = payload_size(self.observations[0])
+            spiller = ObservationSpiller(budget_bytes=size * 4, dir_path=tmpdirname)
+            for observation in self.observations:
+                spiller.track(observation)
+                self.assertLessEqual(spiller.in_memory, spiller.budget_bytes)
+
+            self.assertIsInstance(self.observations[0]._screenshot, ArenaScreenshot)
+            self.assertIsInstance(self.observations[0]._dom, ArenaDom)
+            self.assertIsInstance(self.observations[-1]._screenshot, str)
+            for i, (observation, screenshot) in enumerate(zip(self.observations, self.screenshots)):
+                self.assertEqual(observation.screenshot, screenshot)
+                self.assertEqual(observation.dom, f'<html>{i}ñ</html>')
+                self.assertEqual(observation.get_screenshot_bytes(), base64.b64decode(screenshot))
+
+            # Saved through the handles
+            task = Task(id=0, name='Test', context=Context(self.observations[0], 'PASS', self.observations[-1]))
+            file_path = os.path.join(tmpdirname, 'task.json')
+            task.save(file_path)
+            restored_task = Task.load(file_path)
+            assert restored_task.context is not None
+            self.assertEqual(restored_task.context.start_observation.screenshot, self.screenshots[0])
+            spiller.close()
+
+    def test_reset_keeps_observations_in_use(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            spiller = ObservationSpiller(budget_bytes=1, dir_path=tmpdirname)
+            for observation in self.observations:
+                spiller.track(observation)
+            self.assertGreater(spiller.spilled, 0)
+
+            spiller.reset(keep=[self.observations[1], None])
+            self.assertEqual(self.observations[1].screenshot, self.screenshots[1])
+            self.assertEqual(self.observations[1].dom, '<html>1ñ</html>')
+            with self.assertRaises(ValueError):
+                self.observations[2].screenshot
+            spiller.close()
+
+    def test_shared_payloads_counted_once(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            size = payload_size(self.observations[0])
+            spiller = ObservationSpiller(budget_bytes=size * 3, dir_path=tmpdirname)
+            # Reused with a new pointer, like change detection does
+            first = self.observations[0]
+            moved = Observation('2023-01-01T12:00:01', first._screenshot, first._dom, (1, 1))
+            spiller.track(first)
+            spiller.track(moved)
+            self.assertEqual(spiller.in_memory, size)
+
+            for observation in self.observations[1:4]:
+                spiller.track(observation)
+            self.assertIsInstance(moved._screenshot, ArenaScreenshot)
+            self.assertIs(moved._screenshot, first._screenshot)
+            self.assertIs(moved._dom, first._dom)
+            # The payloads of first and of the next observation, written once
+            self.assertEqual(spiller.spilled, size * 2)
+            self.assertEqual(spiller.arena.size, sum(len(base64.b64decode(self.screenshots[i])) + len(self.observations[i].dom.encode('utf-8'))  # type: ignore
+                                                     for i in range(2)))
+            self.assertEqual(moved.screenshot, self.screenshots[0])
+
+            spiller.reset(keep=[first, moved])
+            self.assertIs(moved._screenshot, first._screenshot)
+            self.assertEqual(spiller.in_memory, size)
+            spiller.close()
+
+    def test_deepcopy_shares_spilled_payloads(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            spiller = ObservationSpiller(budget_bytes=1, dir_path=tmpdirname)
+            dom_set = DomSet()
+            self.observations[-1].dom = dom_set.add_dom('<html><body>Test</body></html>')
+            for observation in self.observations:
+                spiller.track(observation)
+            self.assertIsInstance(self.observations[0]._screenshot, ArenaScreenshot)
+
+            task = Task(id=0, name='Test', context=Context(self.observations[0], 'PASS', self.observations[-1]))
+            copied_task = copy.deepcopy(task)
+            assert copied_task.context is not None
+            self.assertIsNot(copied_task.context.start_observation, self.observations[0])
+            self.assertIs(copied_task.context.start_observation._screenshot, self.observations[0]._screenshot)
+            self.assertEqual(copied_task.context.start_observation.screenshot, self.screenshots[0])
+            self.assertEqual(copied_task.context.start_observation.dom, '<html>0ñ</html>')
+            self.assertIs(copied_task.context.end_observation.dom_ref.dom_set, dom_set)  # type: ignore
+            self.assertEqual(copied_task.context.end_observation.dom, '<html><body>Test</body></html>')
+            spiller.close()
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestObservationArena)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import json
+import os
+from unittest import mock
+from ButlerRobot.src.recorder_logger import RecorderLogger
+
+
+class Formatted:
+    """
+    Counts how many times the message is formatted.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return 'formatted'
+
+
+class TestRecorderLogger(unittest.TestCase):
+
+    def test_level_and_batches(self):
+        with mock.patch('ButlerRobot.src.recorder_logger.logger') as robot_logger:
+            log = RecorderLogger('INFO', console=False, buffer_size=3)
+            arg = Formatted()
+            log.debug("Dropped %s", arg)
+            self.assertEqual(arg.count, 0)
+            self.assertFalse(log.is_enabled('DEBUG'))
+
+            log.info("Step %s", 1)
+            log.info("Step %s", 2, console=True)
+            robot_logger.write.assert_not_called()
+            log.info("Step %s", 3)  # Buffer full
+            robot_logger.write.assert_called_once_with('Step 1\nStep 2\nStep 3', 'INFO')
+            robot_logger.console.assert_called_once_with('Step 2')
+
+            log.info("Step %s", 4)
+            log.warn("Warning %s", arg)  # Warnings are written at once
+            self.assertEqual(robot_logger.write.call_args_list[1:], [mock.call('Step 4', 'INFO'), mock.call('Warning formatted', 'WARN')])
+            self.assertEqual(arg.count, 1)
+
+            log.flush()
+            self.assertEqual(robot_logger.write.call_count, 3)
+
+        with self.assertRaises(ValueError):
+            RecorderLogger('VERBOSE')
+
+    def test_debug_log(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, 'recorder.jsonl')
+            with mock.patch('ButlerRobot.src.recorder_logger.logger') as robot_logger:
+                log = RecorderLogger('DEBUG', debug_log=path)
+                log.debug("Ignoring kw %s", 'Click')
+                log.error("Error %s%%", 100)
+                log.close()
+                robot_logger.write.assert_not_called()
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([(r['level'], r['message']) for r in records], [('DEBUG', 'Ignoring kw Click'), ('ERROR', 'Error 100%')])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRecorderLogger)
+    unittest.TextTestRunner(verbosity=2).run(suite)
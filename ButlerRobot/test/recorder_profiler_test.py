@@ -0,0 +1,51 @@
+import unittest
+import tempfile
+import json
+import os
+from ButlerRobot.src.recorder_profiler import RecorderProfiler, _NULL_SPAN
+
+
+class TestRecorderProfiler(unittest.TestCase):
+
+    def test_disabled(self):
+        profiler = RecorderProfiler()
+        profiler.start_keyword('Click')
+        with profiler.phase('screenshot') as span:
+            self.assertIs(span, _NULL_SPAN)
+        profiler.end_keyword()
+        self.assertEqual(profiler.events, [])
+
+    def test_trace_and_summary(self):
+        profiler = RecorderProfiler(True)
+        profiler.start_keyword('Click')
+        with profiler.phase('screenshot'):
+            pass
+        with self.assertRaises(ValueError):
+            with profiler.phase('run_keyword'):
+                raise ValueError('Keyword failed')
+        profiler.end_keyword()
+
+        self.assertEqual([(e[0], e[1], e[2]) for e in profiler.events],
+                         [('phase', 'screenshot', 'Click'), ('phase', 'run_keyword', 'Click'), ('keyword', 'Click', '')])
+        summary = profiler.summary()
+        self.assertIn('screenshot', summary)
+        self.assertIn('Click', summary.split('Keyword')[1])
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            path = os.path.join(tmpdirname, 'suite', 'recorder_trace.json')
+            profiler.save_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+        events = trace['traceEvents']
+        self.assertEqual([e['name'] for e in events], ['screenshot', 'run_keyword', 'Click'])
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0 for e in events))
+        # The keyword contains its phases
+        self.assertLessEqual(events[2]['ts'], events[0]['ts'])
+
+        profiler.reset()
+        self.assertEqual(profiler.events, [])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRecorderProfiler)
+    unittest.TextTestRunner(verbosity=2).run(suite)
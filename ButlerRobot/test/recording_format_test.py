@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import base64
+import json
+import os
+from ButlerRobot.src.blob_store import BlobStore
+from ButlerRobot.src.data_types import ActionArgs, BBox, Context, Observation, PageAction, Task, SaveStatus, \
+    CustomJSONEncoder
+from ButlerRobot.src.recording_format import BinaryImage, BinaryRecordingReader, convert, get_reader, load_recording, \
+    packb, save_recording, unpackb
+
+
+def _context(screenshot) -> Context:
+    return Context(start_observation=Observation(time='2023-01-01T12:00:00', screenshot=screenshot, dom='<html>ñ</html>', pointer_xy=(1, 2)),
+                   status='PASS',
+                   end_observation=Observation(time='2023-01-01T12:00:01', screenshot=screenshot, dom='<html></html>', pointer_xy=(3, 4)))
+
+
+class TestRecordingFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.image = os.urandom(3000)
+        self.screenshot = base64.b64encode(self.image).decode('ascii')
+        action = PageAction(id=3, name='Type Text', context=_context(self.screenshot), tags=['PageContent'],
+                            action_args=ActionArgs('input', 'Hello "World"', BBox(1, 2, 3, 4)))
+        sub_task = Task(id=2, name='Login', status=SaveStatus.confirm_record, context=_context(''), steps=[action])
+        empty_task = Task(id=4, name='Empty', context=None)
+        self.task = Task(id=1, name='Test', context=_context(self.screenshot), steps=[sub_task, empty_task])
+
+    def test_msgpack(self):
+        value = {'a': [None, True, False, 0, 127, -1, -33, 1 << 40, 1.5, 'ñ' * 40, 'x' * 70000, b'\x00\xff'],
+                 'b': list(range(20)), 'c': {str(i): i for i in range(20)}}
+        self.assertEqual(unpackb(packb(value)), value)
+
+    def test_binary_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.bhr')
+            save_recording(self.task, file_path)
+            # The same screenshot is stored once and without base64
+            self.assertLess(os.path.getsize(file_path), len(self.screenshot) * 2)
+
+            restored_task = load_recording(file_path)
+            self.assertEqual(json.dumps(restored_task, cls=CustomJSONEncoder), json.dumps(self.task, cls=CustomJSONEncoder))
+            action = restored_task.get_child(2).steps[0]  # type: ignore
+            self.assertIsInstance(action.context.start_observation._screenshot, BinaryImage)
+            self.assertEqual(action.context.start_observation.get_screenshot_bytes(), self.image)
+
+    def test_get_step_by_id(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.bhr')
+            save_recording(self.task, file_path)
+
+            with BinaryRecordingReader(file_path) as reader:
+                action = reader.get_step(3)
+                assert isinstance(action, PageAction)
+                self.assertEqual(action.action_args.bbox, BBox(1, 2, 3, 4))
+                sub_task = reader.get_step(2)
+                assert isinstance(sub_task, Task)
+                self.assertEqual([step.id for step in sub_task.steps], [3])
+                self.assertEqual(sub_task.status, SaveStatus.confirm_record)
+                self.assertEqual([(parent_id, step.id) for parent_id, step in reader.iter_steps()],
+                                 [(None, 1), (1, 2), (2, 3), (1, 4)])
+                with self.assertRaises(ValueError):
+                    reader.get_step(5)
+
+    def test_convert_with_references(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            store = BlobStore(os.path.join(tmpdirname, BlobStore.DIR_NAME))
+            self.task.context = _context(store.put_base64(self.screenshot))
+            json_path = os.path.join(tmpdirname, 'task.json')
+            binary_path = os.path.join(tmpdirname, 'task.bhr')
+            self.task.save(json_path)
+
+            convert(json_path, binary_path)
+            os.remove(json_path)
+            convert(binary_path, json_path)
+
+            with get_reader(json_path) as reader:
+                restored_task = reader.read()
+            assert restored_task.context is not None
+            # References are resolved, the binary recording holds the images
+            self.assertEqual(restored_task.context.start_observation.screenshot, self.screenshot)
+            self.assertEqual([step.id for step in restored_task.get_all_steps()], [1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRecordingFormat)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,164 @@
+import unittest
+import tempfile
+import os
+import json
+from ButlerRobot.src.data_types import ActionArgs, Context, DomSet, Observation, PageAction, Task
+from ButlerRobot.src.recording_journal import RecordingJournal
+from ButlerRobot.test.fake_library import FakeDataLibrary
+
+
+def _context(time: str) -> Context:
+    return Context(start_observation=Observation(time=time, screenshot='', dom='', pointer_xy=(0, 0)),
+                   status='PASS',
+                   end_observation=Observation(time=time, screenshot='', dom='', pointer_xy=(0, 0)))
+
+
+class TestRecordingJournal(unittest.TestCase):
+
+    def test_rebuild_nested_task(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=_context('2023-01-01T12:00:00'))
+            journal.open(root)
+
+            # Children end before their parent Task
+            click = PageAction(id=2, name='Click', context=_context('2023-01-01T12:00:01'),
+                               action_args=ActionArgs(selector_dom='button', string=''))
+            type_text = PageAction(id=3, name='Type Text', context=_context('2023-01-01T12:00:02'),
+                                   action_args=ActionArgs(selector_dom='input', string='Hello'))
+            journal.add_step(1, click)
+            journal.add_step(1, type_text)
+            login = Task(id=1, name='Login', context=_context('2023-01-01T12:00:00'), steps=[click, type_text])
+            journal.add_step(0, login)
+            journal.close(root)
+
+            restored = RecordingJournal.load(journal.path)
+            self.assertEqual(restored.id, 0)
+            self.assertEqual([step.id for step in restored.steps], [1])
+            restored_login = restored.steps[0]
+            assert isinstance(restored_login, Task)
+            self.assertEqual([step.name for step in restored_login.steps], ['Click', 'Type Text'])
+            restored_type = restored_login.steps[1]
+            assert isinstance(restored_type, PageAction)
+            self.assertEqual(restored_type.action_args.string, 'Hello')
+
+    def test_remove_step(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=_context('2023-01-01T12:00:00'))
+            journal.open(root)
+            journal.add_step(0, PageAction(id=1, name='Click', context=_context('2023-01-01T12:00:01')))
+            journal.add_step(0, PageAction(id=2, name='Scroll Down', context=_context('2023-01-01T12:00:02')))
+            journal.remove_step(0, 2)
+            journal.close(root)
+
+            restored = RecordingJournal.load(journal.path)
+            self.assertEqual([step.id for step in restored.steps], [1])
+
+    def test_load_half_written_journal(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=_context('2023-01-01T12:00:00'))
+            journal.open(root)
+            # Task 1 never ends
+            journal.add_step(1, PageAction(id=2, name='Click', context=_context('2023-01-01T12:00:01')))
+            journal._file.write('{"op": "add", "parent_id": 1, "st')  # type: ignore
+            journal.close()
+
+            restored = RecordingJournal.load(journal.path)
+            self.assertEqual([step.id for step in restored.steps], [2])
+
+    def test_compact(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=_context('2023-01-01T12:00:00'))
+            journal.open(root)
+            journal.add_step(0, PageAction(id=1, name='Click', context=_context('2023-01-01T12:00:01')))
+            root.context.status = 'FAIL'  # type: ignore
+            journal.close(root)
+
+            save_path = os.path.join(tmpdirname, 'test.json')
+            journal.compact(save_path)
+
+            self.assertFalse(os.path.exists(journal.path))
+            with open(save_path, 'r') as f:
+                data = json.load(f)
+            self.assertEqual(data['context']['status'], 'FAIL')
+            self.assertEqual(len(data['steps']), 1)
+            self.assertEqual(data['steps'][0]['name'], 'Click')
+
+    def test_drop_task(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=_context('2023-01-01T12:00:00'))
+            journal.open(root)
+            journal.add_step(0, PageAction(id=1, name='Click', context=_context('2023-01-01T12:00:01')))
+            # Task 2 is not recorded
+            journal.add_step(2, PageAction(id=3, name='Click', context=_context('2023-01-01T12:00:02')))
+            journal.drop_step(2)
+            # Task 4 never ends, but the test ends
+            journal.add_step(4, PageAction(id=5, name='Click', context=_context('2023-01-01T12:00:03')))
+            journal.close(root)
+
+            restored = RecordingJournal.load(journal.path)
+            self.assertEqual([step.id for step in restored.steps], [1])
+
+    def test_dom_references(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            dom_set = DomSet()
+            pages = [''.join(f'<div class="row"><span>Item {i}</span><span>{i * page}</span></div>' for i in range(500))
+                     for page in range(3)]
+            doms = [dom_set.add_dom(f'<html><body>{page}</body></html>') for page in pages]
+            observations = [Observation(f'2023-01-01T12:00:0{i}', '', dom, (0, 0)) for i, dom in enumerate(doms)]
+
+            journal = RecordingJournal(os.path.join(tmpdirname, 'test.journal'))
+            root = Task(id=0, name='Test', context=Context(observations[0], 'PASS', observations[2]))
+            journal.open(root)
+            for i in range(2):
+                action = PageAction(id=i + 1, name='Click', context=Context(observations[i], 'PASS', observations[i + 1]))
+                root.add_step(action)
+                journal.add_step(0, action)
+            journal.close(root)
+
+            # Every chunk is journaled once, the observations hold references
+            with open(journal.path) as f:
+                records = [json.loads(line) for line in f]
+            journaled_chunks = [chunk_id for record in records if record['op'] == 'doms'
+                                for chunk_id in record['dom_set']['chunks']]
+            self.assertEqual(sorted(journaled_chunks), sorted(dom_set.chunks))
+            self.assertEqual(records[-1]['step']['context']['end_observation']['dom'], str(doms[2]))
+
+            # Same json as the Task saved from memory
+            plain_path = os.path.join(tmpdirname, 'plain.json')
+            root.save(plain_path)
+            compacted_path = os.path.join(tmpdirname, 'test.json')
+            journal.compact(compacted_path)
+            with open(plain_path) as plain, open(compacted_path) as compacted:
+                self.assertEqual(json.load(compacted), json.load(plain))
+            restored = Task.load(compacted_path)
+            self.assertEqual(restored.steps[1].context.end_observation.dom, doms[2].to_str())  # type: ignore
+
+    def test_excluded_task_like_plain_mode(self):
+        def record(tmpdirname: str, journal: bool) -> dict:
+            library = FakeDataLibrary(record=True, journal=journal, output_path=tmpdirname)
+            library._start_test('Test', {'originalname': 'Test'})
+            task_attrs = {'kwname': 'Excluded', 'libname': '', 'tags': ['no_record'], 'type': 'KEYWORD',
+                          'status': 'PASS', 'args': []}
+            click_attrs = {'kwname': 'Click', 'libname': 'FakeLibrary', 'tags': ['action'], 'type': 'KEYWORD',
+                           'status': 'PASS', 'args': []}
+            library._start_keyword('Excluded', task_attrs)
+            library._start_keyword('Click', click_attrs)
+            library._end_keyword('Click', click_attrs)
+            library._end_keyword('Excluded', task_attrs)
+            library._end_test('Test', {'status': 'PASS'})
+            with open(os.path.join(tmpdirname, 'Test.json')) as f:
+                return json.load(f)
+
+        for journal in (False, True):
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                self.assertEqual(record(tmpdirname, journal)['steps'], [], f"journal={journal}")
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRecordingJournal)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+import base64
+import os
+from ButlerRobot.src.blob_store import BlobStore
+from ButlerRobot.src.data_types import ActionArgs, BBox, Context, Observation, PageAction, Task
+from ButlerRobot.src.recording_stream import ScreenshotSlice, iter_steps
+
+
+def _context(screenshot) -> Context:
+    return Context(start_observation=Observation(time='2023-01-01T12:00:00', screenshot=screenshot, dom='<html>ñ</html>', pointer_xy=(1, 2)),
+                   status='PASS',
+                   end_observation=Observation(time='2023-01-01T12:00:01', screenshot=screenshot, dom='<html></html>', pointer_xy=(3, 4)))
+
+
+class TestRecordingStream(unittest.TestCase):
+
+    def setUp(self):
+        self.screenshot = base64.b64encode(os.urandom(3000)).decode('ascii')
+        action = PageAction(id=3, name='Type Text', context=_context(self.screenshot), tags=['PageContent'],
+                            action_args=ActionArgs('input', 'Hello "World"', BBox(1, 2, 3, 4)))
+        sub_task = Task(id=2, name='Login', context=_context(''), steps=[action])
+        empty_task = Task(id=4, name='Empty', context=None)
+        self.task = Task(id=1, name='Test', context=_context(self.screenshot), steps=[sub_task, empty_task])
+
+    def test_same_steps_as_from_dict(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'task.json')
+            self.task.save(file_path)
+
+            # Small chunks to cut the strings and numbers between reads
+            for chunk_size in (7, 64, 1 << 16):
+                streamed = list(iter_steps(file_path, chunk_size=chunk_size))
+                self.assertEqual([step.id for _, step in streamed], [step.id for step in self.task.get_all_steps()])
+                self.assertEqual([parent_id for parent_id, _ in streamed], [None, 1, 2, 1])
+
+                _, action = streamed[2]
+                assert isinstance(action, PageAction)
+                self.assertEqual(action.action_args.string, 'Hello "World"')
+                self.assertEqual(action.action_args.bbox, BBox(1, 2, 3, 4))
+                self.assertEqual(action.tags, ['PageContent'])
+                assert action.context is not None
+                self.assertIsInstance(action.context.start_observation._screenshot, ScreenshotSlice)  # Not read yet
+                self.assertEqual(action.context.start_observation.screenshot, self.screenshot)
+                self.assertEqual(action.context.start_observation.dom, '<html>ñ</html>')
+                self.assertEqual(action.context.end_observation.pointer_xy, [3, 4])
+
+                _, sub_task = streamed[1]
+                assert isinstance(sub_task, Task) and sub_task.context is not None
+                self.assertEqual(sub_task.steps, [])
+                self.assertEqual(sub_task.context.start_observation.screenshot, '')
+                self.assertIsNone(streamed[3][1].context)
+
+    def test_without_dom_and_with_references(self):
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            store = BlobStore(os.path.join(tmpdirname, BlobStore.DIR_NAME))
+            ref = store.put_base64(self.screenshot)
+            self.task.context = _context(ref)
+            file_path = os.path.join(tmpdirname, 'task.json')
+            self.task.save(file_path)
+
+            _, root = next(iter_steps(file_path, with_dom=False))
+            assert root.context is not None
+            self.assertEqual(root.context.start_observation.dom, '')
+            self.assertEqual(root.context.start_observation.screenshot_ref, ref)
+            self.assertEqual(root.context.start_observation.screenshot, self.screenshot)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRecordingStream)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,111 @@
+import unittest
+import tempfile
+import os
+import base64
+import copy
+import threading
+from io import BytesIO
+from PIL import Image, ImageDraw
+from ButlerRobot.src.screenshot_codec import ScreenshotCodec, EncodingPool, PendingScreenshot
+from ButlerRobot.src.data_types import Observation
+from ButlerRobot.test.fake_library import FakeDataLibrary
+
+
+def _png(size=(320, 200)) -> bytes:
+    im = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(im)
+    for i in range(0, size[0], 20):
+        draw.rectangle((i, 10, i + 10, 50), fill=(i % 255, 100, 200))
+    buff = BytesIO()
+    im.save(buff, format='PNG')
+    return buff.getvalue()
+
+
+class TestScreenshotCodec(unittest.TestCase):
+
+    def test_png_without_transform(self):
+        data = _png()
+        codec = ScreenshotCodec()
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            file_path = os.path.join(tmpdirname, 'screenshot.png')
+            with open(file_path, 'wb') as f:
+                f.write(data)
+            self.assertEqual(codec.encode_file(file_path), data)  # Same bytes, not encoded again
+        self.assertEqual(codec.encode(data), data)
+
+        stats = codec.pop_stats()
+        self.assertEqual((stats.count, stats.encoded, stats.bytes), (2, 0, 2 * len(data)))
+        self.assertEqual(codec.pop_stats().count, 0)
+        self.assertEqual(codec.total_stats.count, 2)
+
+    def test_formats_and_downscale(self):
+        data = _png()
+        for format, pil_format in (('jpeg', 'JPEG'), ('webp', 'WEBP'), ('png', 'PNG')):
+            codec = ScreenshotCodec(format, quality=80, max_size='160x160')
+            im = Image.open(BytesIO(codec.encode(data)))
+            self.assertEqual(im.format, pil_format)
+            self.assertEqual(im.size, (160, 100))
+            self.assertEqual(codec.stats.encoded, 1)
+
+        # Lossless webp keeps the pixels
+        webp = ScreenshotCodec('webp').encode(data)
+        self.assertEqual(Image.open(BytesIO(webp)).convert('RGB').tobytes(), Image.open(BytesIO(data)).tobytes())
+
+        with self.assertRaises(ValueError):
+            ScreenshotCodec('gif')
+
+    def test_encoding_pool(self):
+        data = _png()
+        codec = ScreenshotCodec('jpeg', quality=80)
+        expected = codec.to_base64(ScreenshotCodec('jpeg', quality=80).encode(data))
+        pool = EncodingPool(codec, workers=2, max_pending=2)
+        try:
+            pending = [pool.submit(data) for _ in range(6)]
+            observation = Observation('2023-01-01T00:00:00', pending[0], '<html/>')
+            self.assertEqual(observation.to_dict()['screenshot'], expected)  # Resolved before serialization
+            self.assertIsInstance(observation._screenshot, PendingScreenshot)  # Reads do not store the result
+            self.assertEqual([p.result() for p in pending], [expected] * 6)
+            self.assertEqual(codec.total_stats.encoded, 6)
+
+            # Copies of observations still encoding get the screenshot
+            observation = Observation('2023-01-01T00:00:00', pool.submit(data), '<html/>')
+            self.assertEqual(copy.deepcopy(observation).screenshot, expected)
+
+            stored = pool.submit(data, store=len)
+            self.assertEqual(stored.result(), len(base64.b64decode(expected)))
+        finally:
+            pool.close()
+
+    def test_pool_stats_of_the_keyword(self):
+        with self.assertRaises(AssertionError):
+            FakeDataLibrary(screenshot_workers=2)  # Saved in the keyword, it would wait for the screenshots
+
+        library = FakeDataLibrary(async_save=True, screenshot_workers=1)
+        assert library.encoding_pool is not None
+        logged = []
+        library.logger.debug = lambda msg, *args, **kwargs: logged.append(args)  # type: ignore
+        busy = threading.Event()
+        library.encoding_pool._executor.submit(busy.wait)
+        try:
+            library._encode_screenshot(_png())
+            library._log_screenshot_stats('Take Screenshot')
+            library._log_screenshot_stats('Click')
+            self.assertEqual(logged, [])  # Still encoding
+            busy.set()
+            library._log_screenshot_stats('Go To', wait=True)
+            self.assertEqual([(name, stats.count) for name, stats in logged], [('Take Screenshot', 1)])
+
+            # Summary of the test in info
+            library.screenshot_codec.encode(_png())
+            library.logger.info = lambda msg, *args, **kwargs: logged.append(args)  # type: ignore
+            library._log_test_screenshot_stats('Test')
+            self.assertEqual([(name, stats.count) for name, stats in logged[-2:]], [('Test', 1), ('Test', 2)])
+            self.assertEqual(library.test_screenshot_stats.count, 0)
+        finally:
+            busy.set()
+            library._close()
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestScreenshotCodec)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,158 @@
+import unittest
+import random
+import json
+from ButlerRobot.src.data_types import ActionArgs, PageAction, Task, CustomJSONEncoder
+
+
+def build_tree(n_steps: int, seed: int = 0) -> Task:
+    """
+    Random recording: tasks nested up to 6 levels with page actions.
+    """
+    rand = random.Random(seed)
+    root = Task(id=0, name='Test')
+    tasks = [root]
+    for step_id in range(1, n_steps):
+        parent = rand.choice(tasks[-6:])
+        if rand.random() < 0.3:
+            step = Task(id=step_id, name=f'Task {step_id}')
+            tasks.append(step)
+        else:
+            step = PageAction(id=step_id, name=f'Click {step_id}', action_args=ActionArgs(f'id=button-{step_id}', ''))
+        parent.add_step(step)
+    return root
+
+
+def recursive_parents_ids(task: Task, step_id: int) -> list[int]:
+    """
+    Previous recursive search of the parents.
+    """
+    def search(ids, step):
+        if step_id in [sub_step.id for sub_step in step.steps]:
+            return True
+        for sub_step in step.steps:
+            if isinstance(sub_step, Task):
+                ids.append(sub_step.id)
+                if search(ids, sub_step):
+                    return True
+                ids.pop()
+        return False
+
+    if step_id == task.id:
+        return []
+    ids = [task.id]
+    if not search(ids, task):
+        raise ValueError(f"Step with id {step_id} not found")
+    return ids
+
+
+class TestTaskIndex(unittest.TestCase):
+
+    def test_same_as_recursive_search(self):
+        root = build_tree(300)
+        for step in root.get_all_steps():
+            self.assertIs(root.find_step(step.id), step)
+            self.assertEqual(root._get_parents_ids(step.id), recursive_parents_ids(root, step.id))
+            if step is not root:
+                parent = root.get_parent(step.id)
+                self.assertTrue(any(sub_step is step for sub_step in parent.steps))
+
+        # Lookups in a subtree only find its steps
+        sub_task = next(step for step in root.steps if isinstance(step, Task) and step.steps)
+        inner = sub_task.steps[-1]
+        self.assertEqual(sub_task._get_parents_ids(inner.id), recursive_parents_ids(sub_task, inner.id))
+        outside = next(step for step in root.steps if step is not sub_task)
+        with self.assertRaises(ValueError):
+            sub_task.find_step(outside.id)
+        with self.assertRaises(ValueError):
+            root.find_step(1000)
+
+    def test_index_is_maintained(self):
+        root = build_tree(50)
+        root.find_step(1)  # Builds the index
+        task = Task(id=100, name='New Task')
+        action = PageAction(id=101, name='Click', action_args=ActionArgs('id=new', ''))
+        task.add_step(action)
+        parent = root.steps[0] if isinstance(root.steps[0], Task) else root
+        parent.add_step(task)
+        self.assertIs(root.find_step(101), action)
+        self.assertEqual(root._get_parents_ids(101), recursive_parents_ids(root, 101))
+
+        root.get_parent(100).remove_step(task)
+        with self.assertRaises(ValueError):
+            root.find_step(101)
+        # The removed task has its own index
+        self.assertIs(task.find_step(101), action)
+
+        replacement = PageAction(id=102, name='Type', action_args=ActionArgs('id=text', 'hello'))
+        root.replace_step_by_id(1, replacement)
+        self.assertIs(root.find_step(102), replacement)
+        with self.assertRaises(ValueError):
+            root.find_step(1)
+
+        # Steps appended to the list without add_step are found after rebuilding the index
+        hidden = PageAction(id=103, name='Click', action_args=ActionArgs('id=hidden', ''))
+        root.steps.append(hidden)
+        self.assertIs(root.find_step(103), hidden)
+
+    def test_from_dict(self):
+        root = build_tree(100)
+        data = json.loads(json.dumps(root, cls=CustomJSONEncoder))
+        self.assertNotIn('_index', json.dumps(data))
+        loaded = Task.from_dict(data)
+        for step in root.get_all_steps():
+            self.assertEqual(loaded._get_parents_ids(step.id), root._get_parents_ids(step.id))
+            self.assertEqual(loaded.find_step(step.id).name, step.name)
+        self.assertEqual(loaded, root)
+
+
+class TestTaskHistory(unittest.TestCase):
+
+    def test_history(self):
+        root = Task(id=0, name='Test')
+        login = Task(id=1, name='Login')
+        root.add_step(login)
+        login.add_step(PageAction(id=2, name='Type Text', action_args=ActionArgs('id=user', 'john')))
+        login.add_step(PageAction(id=3, name='Click', action_args=ActionArgs('id=submit', '')))
+
+        def entry(step_id, name, type_='task', args=None, steps=None):
+            return {"id": step_id, "name": name, "type": type_, "args": args or {}, "steps": steps or []}
+        type_text = entry(2, 'Type Text', 'action', {'selector_dom': 'id=user', 'string': 'john', 'bbox': None})
+        click = entry(3, 'Click', 'action', {'selector_dom': 'id=submit', 'string': '', 'bbox': None})
+
+        self.assertEqual(root.get_history_instructions(3), entry(1, 'Login', steps=[type_text, click]))
+        self.assertEqual(root.get_history_instructions(1), entry(1, 'Login'))
+        self.assertEqual(root.get_history_instructions(3, with_tasks=True),
+                         entry(0, 'Test', steps=[entry(1, 'Login', steps=[type_text, click])]))
+
+    def test_bulk_history_is_the_same(self):
+        root = build_tree(200, seed=1)
+        for with_tasks in (False, True):
+            histories = list(root.iter_history_instructions(with_tasks))
+            self.assertEqual([step.id for step, _ in histories], [step.id for step in root.get_all_steps()])
+            for step, history in histories:
+                self.assertEqual(history, root.get_history_instructions(step.id, with_tasks))
+
+    def test_bulk_history_shares_siblings(self):
+        root = Task(id=0, name='Test')
+        task = Task(id=1, name='Fill form')
+        root.add_step(task)
+        for step_id in range(2, 5002):
+            task.add_step(PageAction(id=step_id, name='Click', action_args=ActionArgs(f'id=button-{step_id}', '')))
+
+        histories = list(root.iter_history_instructions(with_tasks=True))
+        first_steps = histories[2][1]["steps"][0]["steps"]
+        last_steps = histories[-1][1]["steps"][0]["steps"]
+        # The sibling entries are not copied for every step
+        self.assertIs(first_steps._entries, last_steps._entries)
+        self.assertEqual(len(first_steps), 1)
+        self.assertEqual(len(last_steps), 5000)
+        self.assertEqual([entry["id"] for entry in last_steps[-2:]], [5000, 5001])
+        self.assertEqual(last_steps, root.get_history_instructions(5001, with_tasks=True)["steps"][0]["steps"])
+        self.assertEqual(json.loads(json.dumps(histories[3][1], cls=CustomJSONEncoder)),
+                         root.get_history_instructions(3, with_tasks=True))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTaskIndex)
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestTaskHistory))
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,32 @@
+import unittest
+from ButlerRobot.test.fake_library import FakeViewportLibrary
+
+
+class TestViewportCache(unittest.TestCase):
+
+    def test_cache_and_invalidation(self):
+        library = FakeViewportLibrary()
+        self.assertEqual(library._get_viewport(), {'width': 800, 'height': 600})
+        library._get_viewport()['width'] = 0  # Returns a copy
+        library.run_keyword('click', ['ok'], {})
+        self.assertEqual(library._get_viewport(), {'width': 800, 'height': 600})
+        self.assertEqual(library.reads, 1)
+
+        library.run_keyword('set_viewport_size', [1024, 768], {})
+        self.assertEqual(library._get_viewport(), {'width': 1024, 'height': 768})
+        self.assertEqual(library.reads, 2)
+
+        with self.assertRaises(AssertionError):
+            library.run_keyword('click', ['fail'], {})
+        library._get_viewport()
+        self.assertEqual(library.reads, 3)
+
+        # Viewport read from the page, Ex: in the page state
+        library._set_viewport({'width': 640, 'height': 480})
+        self.assertEqual(library._get_viewport(), {'width': 640, 'height': 480})
+        self.assertEqual(library.reads, 3)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestViewportCache)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,88 @@
+"""
+Memory used by a large recording loaded in memory.
+
+Builds a synthetic recording (tasks with page actions, every step with its context, observations and bbox), saves it
+as json and loads it back with load_recording, like the dataset jobs do. Screenshots and doms are short references
+(--payload-bytes) so the measure is the cost of the objects of data_types, not of the payloads. Reports:
+- load s: time to load the recording.
+- retained MB: memory allocated by python that is still used by the loaded recording (tracemalloc).
+- bytes/step: retained bytes per step.
+- instance bytes: size of one instance of every class of data_types, with its __dict__ if it has one.
+
+    python benchmarks/data_types_memory_benchmark.py [--steps 100000] [--payload-bytes 48]
+"""
+
+import os
+import gc
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ButlerRobot.src.data_types import ActionArgs, BBox, Context, Observation, PageAction, Task  # noqa: E402
+from ButlerRobot.src.recording_format import load_recording, save_recording  # noqa: E402
+
+
+def build_task(n_steps: int, payload_bytes: int) -> Task:
+    def observation(i: int) -> Observation:
+        return Observation('2023-01-01T12:00:00', f'{i:0{payload_bytes}d}', f'{i:0{payload_bytes}d}', (i, i))
+
+    root = Task(id=0, name='Benchmark', context=Context(observation(0), 'PASS', observation(n_steps)))
+    task = root
+    for i in range(1, n_steps):
+        if i % 10 == 1:
+            task = Task(id=i, name=f'Task {i}', context=Context(observation(i), 'PASS', observation(i + 9)))
+            root.add_step(task)
+            continue
+        task.add_step(PageAction(id=i, name='Click', context=Context(observation(i), 'PASS', observation(i + 1)),
+                                 action_args=ActionArgs(f'id=button{i}', '', BBox(i, i, 10, 10))))
+    return root
+
+
+def instance_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=100000)
+    parser.add_argument('--payload-bytes', type=int, default=48)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, 'recording.json')
+        save_recording(build_task(args.steps, args.payload_bytes), path)
+        gc.collect()
+
+        start = time.perf_counter()
+        task = load_recording(path)
+        load_time = time.perf_counter() - start
+        del task
+        gc.collect()
+
+        tracemalloc.start()
+        task = load_recording(path)
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"{args.steps} steps, payloads of {args.payload_bytes} bytes")
+    print(f"{'load s':>10}{'retained MB':>14}{'bytes/step':>12}")
+    print(f"{load_time:>10.2f}{retained / 1024 / 1024:>14.1f}{retained / args.steps:>12.0f}")
+
+    action = next(step for step in task.get_all_steps() if isinstance(step, PageAction))
+    instances = {
+        'Task': task, 'PageAction': action, 'Context': action.context, 'Observation': action.context.start_observation,
+        'ActionArgs': action.action_args, 'BBox': action.action_args.bbox,
+    }
+    print('instance bytes: ' + ', '.join(f"{name} {instance_size(obj)}" for name, obj in instances.items()))
+
+
+if __name__ == '__main__':
+    main()
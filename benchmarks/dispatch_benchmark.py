@@ -0,0 +1,69 @@
+"""
+Overhead of DataWrapperLibrary.run_keyword when dispatching a keyword.
+
+The wrapped library does nothing, and no step is being recorded, so the time is the dispatch of the wrapper:
+finding a @keyword override, an added keyword or proxying to the wrapped library.
+
+    python benchmarks/dispatch_benchmark.py [--calls 200000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from robot.api.deco import keyword  # noqa: E402
+from ButlerRobot.DataWrapperLibrary import DataWrapperLibrary  # noqa: E402
+
+
+class NullLibrary:
+    """
+    Library with the number of keywords of Browser that does nothing.
+    """
+    def __init__(self, n_keywords: int = 200):
+        self.keyword_names = [f'keyword_{i}' for i in range(n_keywords)]
+
+    def get_keyword_names(self):
+        return self.keyword_names
+
+    def run_keyword(self, name, args, kwargs=None):
+        return None
+
+
+class BenchmarkLibrary(DataWrapperLibrary):
+    def __init__(self):
+        super().__init__(NullLibrary(), console=False, record=False)
+        self.added_keywords.extend(['added_keyword'])
+
+    def added_keyword(self):
+        return None
+
+    @keyword(name='Last Override', tags=['action'])
+    def last_override(self):
+        return None
+
+
+def measure(library: DataWrapperLibrary, name: str, calls: int) -> float:
+    run_keyword = library.run_keyword
+    start = time.perf_counter()
+    for _ in range(calls):
+        run_keyword(name, [], {})
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    library = BenchmarkLibrary()
+    print(f"{len(library.keywords_decorator)} @keyword overrides, {len(library._library.keyword_names)} library keywords")
+    print(f"{'keyword':<24}{'us/call':>10}")
+    for name in ('keyword_100', 'added_keyword', 'last_override'):
+        print(f"{name:<24}{measure(library, name, args.calls) * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Offline stand-in of Browser for the benchmarks. See recording_overhead_benchmark.py.
+
+FakeBrowser implements the calls of Browser used by the recorder (take_screenshot, get_page_source, get_element,
+get_boundingbox, get_browser_catalog, evaluate_javascript, scrollElementIfNeeded...) and a few page actions. Every
+call sleeps a configurable latency and returns synthetic payloads of a configurable size, so the recorder can run
+without playwright.
+
+RecordedFakeBrowser is the DataWrapperLibrary of FakeBrowser. Its hooks call FakeBrowser the same way
+DataBrowserLibrary calls Browser. Import it with `AS    FakeBrowser`: only the page actions of the library with
+the name of the wrapped class are recorded.
+"""
+
+import time
+import random
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageDraw
+from ButlerRobot.DataWrapperLibrary import DataWrapperLibrary
+from ButlerRobot.src.data_types import BBox
+
+
+@lru_cache(maxsize=None)
+def build_screenshot(size=(1280, 720), seed=0) -> bytes:
+    """
+    PNG that looks like a page: blocks of text-like noise on a white background. Cached, built once per process.
+    """
+    rand = random.Random(seed)
+    im = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(im)
+    for y in range(20, size[1], 24):
+        x = 20
+        while x < size[0] - 100:
+            width = rand.randint(20, 90)
+            draw.rectangle((x, y, x + width, y + 10), fill=(rand.randint(0, 80),) * 3)
+            x += width + 8
+    buff = BytesIO()
+    im.save(buff, format='PNG')
+    return buff.getvalue()
+
+
+class FakeBrowser:
+    """
+    Page with a form. Actions change the page. Latencies in ms.
+    """
+    ACTIONS = {'click', 'fill_text', 'new_page'}
+    GETTERS = {'get_text', 'take_screenshot', 'get_page_source', 'get_element', 'get_boundingbox',
+               'get_browser_catalog', 'get_viewport_size', 'evaluate_javascript', 'scrollElementIfNeeded',
+               'getPageState'}
+    N_SCREENSHOTS = 4  # Different screenshots returned in turns
+
+    def __init__(self, action_ms: float = 5, screenshot_ms: float = 15, dom_ms: float = 5, element_ms: float = 1,
+                 screenshot_size: str = '1280x720', dom_kb: float = 200):
+        self.action_ms = action_ms
+        self.screenshot_ms = screenshot_ms
+        self.dom_ms = dom_ms
+        self.element_ms = element_ms
+        size = tuple(int(v) for v in screenshot_size.lower().split('x'))
+        self.screenshots = [build_screenshot(size, seed) for seed in range(self.N_SCREENSHOTS)]
+        rows, size_bytes = [], 0
+        while size_bytes < dom_kb * 1024:
+            i = len(rows)
+            rows.append(f'<div class="row" id="row-{i}"><label for="field-{i}">Field {i}</label>'
+                        f'<input id="field-{i}" name="field-{i}" type="text" value=""></div>')
+            size_bytes += len(rows[-1])
+        self.dom_body = ''.join(rows)
+        self.viewport = {'width': size[0], 'height': size[1]}
+        self.changes = 0  # Times the page changed
+        self.calls: dict[str, int] = {}
+
+    def _wait(self, name: str, ms: float):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if ms:
+            time.sleep(ms / 1000)
+
+    # ======= Hybrid library API =======
+    def get_keyword_names(self):
+        return sorted(self.ACTIONS | self.GETTERS)
+
+    def run_keyword(self, name, args, kwargs=None):
+        return getattr(self, name)(*args, **(kwargs or {}))
+
+    def get_keyword_arguments(self, name):
+        return ['*args']
+
+    def get_keyword_documentation(self, name):
+        return ''
+
+    def get_keyword_tags(self, name):
+        return ['PageContent'] if name in self.ACTIONS else ['Getter']
+
+    def get_keyword_types(self, name):
+        return None
+
+    def get_keyword_source(self, name):
+        return None
+
+    # ======= Actions =======
+    def new_page(self, url: str = 'about:blank'):
+        self._wait('new_page', self.action_ms)
+        self.changes += 1
+
+    def click(self, selector: str, *args):
+        self._wait('click', self.action_ms)
+        self.changes += 1
+
+    def fill_text(self, selector: str, text: str, *args):
+        self._wait('fill_text', self.action_ms)
+        self.changes += 1
+
+    def get_text(self, selector: str, *args):
+        self._wait('get_text', self.action_ms)
+        return selector
+
+    # ======= Calls of the recorder =======
+    def take_screenshot(self, selector: Optional[str] = None, **kwargs) -> bytes:
+        self._wait('take_screenshot', self.screenshot_ms)
+        return self.screenshots[self.changes % self.N_SCREENSHOTS]
+
+    def get_page_source(self) -> str:
+        self._wait('get_page_source', self.dom_ms)
+        return f'<html><body><!-- {self.changes} -->{self.dom_body}</body></html>'
+
+    def get_element(self, selector: str) -> str:
+        self._wait('get_element', self.element_ms)
+        return f'element={selector}'
+
+    def get_boundingbox(self, element: str) -> dict:
+        self._wait('get_boundingbox', self.element_ms)
+        index = sum(map(ord, element)) % 20
+        return {'x': 100, 'y': 30 + index * 30, 'width': 200, 'height': 20}
+
+    def get_browser_catalog(self) -> list:
+        self._wait('get_browser_catalog', self.element_ms)
+        return [{'contexts': [{'pages': [{'url': 'https://example.com/form'}]}]}]
+
+    def get_viewport_size(self) -> dict:
+        self._wait('get_viewport_size', self.element_ms)
+        return dict(self.viewport)
+
+    def evaluate_javascript(self, selector: Optional[str], *functions):
+        self._wait('evaluate_javascript', self.element_ms)
+        return None
+
+    def scrollElementIfNeeded(self, selector: str) -> dict:
+        self._wait('scrollElementIfNeeded', self.element_ms)
+        return {'is_element_scrolled': False}
+
+    def getPageState(self) -> dict:
+        self._wait('getPageState', self.element_ms)
+        return {'url': 'https://example.com/form', 'viewport': dict(self.viewport), 'frames': [f'main:{self.changes}']}
+
+
+class RecordedFakeBrowser(DataWrapperLibrary):
+    """
+    Recorder of FakeBrowser. The arguments of the page are passed to FakeBrowser, the rest to DataWrapperLibrary.
+    """
+    def __init__(self, output_path: Optional[str] = None, action_ms: float = 5, screenshot_ms: float = 15,
+                 dom_ms: float = 5, element_ms: float = 1, screenshot_size: str = '1280x720', dom_kb: float = 200,
+                 journal: bool = False, screenshot_store: bool = False, async_save: bool = False,
+                 recording_format: str = 'json', screenshot_format: str = 'png', screenshot_workers: int = 0,
+                 change_detection: bool = False, profile: bool = False):
+        page = FakeBrowser(action_ms, screenshot_ms, dom_ms, element_ms, screenshot_size, dom_kb)
+        super().__init__(page, console=False, output_path=output_path, journal=journal,
+                         screenshot_store=screenshot_store, async_save=async_save, recording_format=recording_format,
+                         screenshot_format=screenshot_format, screenshot_workers=screenshot_workers,
+                         change_detection=change_detection, profile=profile)
+        self._library: FakeBrowser = self._library
+        self.action_tags = ['PageContent']
+        self.exclude_tags = ['Getter']
+
+    def _get_action_tags(self):
+        return self.action_tags
+
+    def _get_exclude_tags(self):
+        return self.exclude_tags
+
+    def _is_browser_open(self):
+        catalog = self._library.get_browser_catalog()
+        return bool(catalog and catalog[0]['contexts'] and catalog[0]['contexts'][0]['pages'])
+
+    def _read_viewport(self) -> dict:
+        return self._library.get_viewport_size()
+
+    def _get_screenshot(self, selector=None):
+        return self._encode_screenshot(self._library.take_screenshot(selector=selector))
+
+    def _get_dom(self):
+        return self._library.get_page_source()
+
+    def _get_page_state(self) -> Optional[dict]:
+        return self._library.getPageState()
+
+    def _add_scroll_when_recording(self, step):
+        # Like DataBrowserLibrary, the scroll is checked when retrieving the bbox
+        return step
+
+    def _retrieve_bbox_and_pointer_from_page(self, selector) -> tuple[None, None] | tuple[BBox, tuple]:
+        bbox_ = self._library.get_boundingbox(self._library.get_element(selector))
+        self.last_observation = self._get_observation()
+        self._library.scrollElementIfNeeded(selector)
+        return BBox(**bbox_), (bbox_['x'] + bbox_['width'] / 2, bbox_['y'] + bbox_['height'] / 2)
@@ -0,0 +1,85 @@
+"""
+Calls to the browser made by DataBrowserLibrary to resolve the selector of a page action, with and without
+probeSelector.
+
+Every call of Browser is a round trip to the playwright process. _retrieve_bbox_and_pointer resolves a selector with
+one probeSelector call (bbox, viewport, in_view and page state). The previous path, still used when the selector
+can not be probed, calls get_element, get_boundingbox and scrollElementIfNeeded, and getPageState with
+change_detection. DataBrowserLibrary runs against FakeBrowser (see fake_browser.py) with a latency per call, so the
+time is the latency of the round trips. The page does not change, so with change_detection the observation is
+captured once and reused.
+
+Needs Browser installed (robotframework-butlerhat[full]), only to import DataBrowserLibrary. Nothing is launched.
+
+    python benchmarks/probe_selector_benchmark.py [--selectors 200] [--element-ms 1]
+"""
+
+import os
+import sys
+import time
+import argparse
+from unittest import mock
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_browser import FakeBrowser  # noqa: E402
+from ButlerRobot.DataBrowserLibrary import DataBrowserLibrary  # noqa: E402
+
+# Calls that capture the observation. Not part of resolving the selector
+CAPTURE_CALLS = ('take_screenshot', 'get_page_source')
+
+
+class ProbedFakeBrowser(FakeBrowser):
+    """
+    FakeBrowser with the probeSelector keyword of the js extension. Elements are unique and in view.
+    """
+    def probeSelector(self, selector: str) -> dict:
+        self._wait('probeSelector', self.element_ms)
+        index = sum(map(ord, selector)) % 20
+        return {'found': True, 'bbox': {'x': 100, 'y': 30 + index * 30, 'width': 200, 'height': 20},
+                'viewport': dict(self.viewport), 'in_view': True,
+                'state': {'url': 'https://example.com/form', 'viewport': dict(self.viewport),
+                          'frames': [f'main:{self.changes}']}}
+
+
+def run(args, probe: bool, change_detection: bool) -> tuple[float, float]:
+    """
+    Returns (calls to the browser per selector, ms per selector).
+    """
+    with mock.patch('ButlerRobot.DataBrowserLibrary.Browser',
+                    lambda: ProbedFakeBrowser(element_ms=args.element_ms, screenshot_ms=0, dom_ms=0)):
+        library = DataBrowserLibrary(console=False, record=False, change_detection=change_detection)
+    browser: ProbedFakeBrowser = library._library  # type: ignore
+    if not probe:
+        library._probe_selector = lambda selector: None  # type: ignore
+    library._retrieve_bbox_and_pointer('id=warmup')  # First observation and viewport
+    browser.calls.clear()
+
+    start = time.perf_counter()
+    for i in range(args.selectors):
+        library._retrieve_bbox_and_pointer(f'id=field-{i}')
+    seconds = time.perf_counter() - start
+    calls = sum(count for name, count in browser.calls.items() if name not in CAPTURE_CALLS)
+    return calls / args.selectors, seconds / args.selectors * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--selectors', type=int, default=200)
+    parser.add_argument('--element-ms', type=float, default=1, help='Latency of every call to the browser')
+    args = parser.parse_args()
+
+    print(f"{args.selectors} selectors, {args.element_ms} ms per call to the browser")
+    print(f"{'mode':<36}{'calls/selector':>16}{'ms/selector':>14}")
+    for change_detection in (False, True):
+        for probe in (False, True):
+            name = ('probeSelector' if probe else 'get_element + get_boundingbox') + \
+                   (' + cd' if change_detection else '')
+            calls, ms = run(args, probe, change_detection)
+            print(f"{name:<36}{calls:>16.1f}{ms:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
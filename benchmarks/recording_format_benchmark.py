@@ -0,0 +1,89 @@
+"""
+Size and load time of the recording formats.
+
+Builds a synthetic recording (tasks with page actions, screenshots repeated between consecutive observations like
+in a real test) and saves it as json and as binary (.bhr).
+
+    python benchmarks/recording_format_benchmark.py [--steps 300] [--screenshot-kb 150] [--dom-kb 60]
+"""
+
+import os
+import sys
+import time
+import base64
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ButlerRobot.src.data_types import ActionArgs, BBox, Context, Observation, PageAction, Task  # noqa: E402
+from ButlerRobot.src.recording_format import BinaryRecordingReader, load_recording, save_recording  # noqa: E402
+from ButlerRobot.src.recording_stream import iter_steps  # noqa: E402
+
+
+def build_task(n_steps: int, screenshot_kb: int, dom_kb: int) -> Task:
+    random.seed(0)
+    # Screenshots are already compressed images: random bytes are a good approximation of their entropy
+    screenshots = [base64.b64encode(os.urandom(screenshot_kb * 1024)).decode('ascii') for _ in range(n_steps // 2 + 1)]
+    doms = [f"<html>{i}" + "<div class='row'>text</div>" * (dom_kb * 1024 // 27) + "</html>" for i in range(n_steps // 4 + 1)]
+
+    def observation(i: int) -> Observation:
+        return Observation('2023-01-01T12:00:00', screenshots[i // 2], doms[i // 4], (i, i))
+
+    root = Task(id=0, name='Benchmark', context=Context(observation(0), 'PASS', observation(n_steps)))
+    task = root
+    for i in range(1, n_steps + 1):
+        if i % 10 == 1:
+            task = Task(id=i, name=f'Task {i}', context=Context(observation(i), 'PASS', observation(i + 9)))
+            root.steps.append(task)
+            continue
+        task.steps.append(PageAction(id=i, name='Click', context=Context(observation(i), 'PASS', observation(i + 1)),
+                                     action_args=ActionArgs(f'id=button{i}', '', BBox(i, i, 10, 10))))
+    return root
+
+
+def measure(function, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--screenshot-kb', type=int, default=150)
+    parser.add_argument('--dom-kb', type=int, default=60)
+    args = parser.parse_args()
+
+    task = build_task(args.steps, args.screenshot_kb, args.dom_kb)
+    step_id = args.steps - 1
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        json_path = os.path.join(tmpdirname, 'recording.json')
+        binary_path = os.path.join(tmpdirname, 'recording.bhr')
+
+        rows = []
+        for path in (json_path, binary_path):
+            save_time = measure(lambda: save_recording(task, path))
+            load_time = measure(lambda: load_recording(path))
+            if path == json_path:
+                seek_time = measure(lambda: next(step for _, step in iter_steps(path) if step.id == step_id))
+            else:
+                def seek():
+                    with BinaryRecordingReader(path) as reader:
+                        reader.get_step(step_id)
+                seek_time = measure(seek)
+            rows.append((os.path.basename(path), os.path.getsize(path), save_time, load_time, seek_time))
+
+    print(f"{args.steps} steps, {args.screenshot_kb} KB screenshots, {args.dom_kb} KB doms")
+    print(f"{'file':<16}{'size (MB)':>12}{'save (s)':>12}{'load (s)':>12}{'step (ms)':>12}")
+    for name, size, save_time, load_time, seek_time in rows:
+        print(f"{name:<16}{size / 1e6:>12.1f}{save_time:>12.3f}{load_time:>12.3f}{seek_time * 1000:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Cost of recording a Robot Framework test with DataWrapperLibrary compared with running it with the plain library.
+
+The test runs N steps (Click, Fill Text and Get Text grouped in user keywords) against FakeBrowser, an offline
+stand-in of Browser with synthetic latencies and payloads (see fake_browser.py). The same suite is run with the plain
+FakeBrowser and with RecordedFakeBrowser in several recorder configurations. For every configuration it reports:
+- ms/keyword: wall time of the run per step (best of --repeat runs). Includes the start of Robot Framework.
+- overhead: ms/keyword over the plain library. The start of Robot Framework cancels out.
+- peak MB: peak of the memory allocated by python during the run (tracemalloc, measured in a separate run).
+- output KB: size of the recordings, screenshots and journals written.
+
+    python benchmarks/recording_overhead_benchmark.py [--steps 60] [--repeat 3] [--screenshot-ms 15] [--dom-kb 50]
+        [--config fast:async_save=True,screenshot_store=True] [--only record,fast]
+"""
+
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import robot  # noqa: E402
+from fake_browser import FakeBrowser  # noqa: E402
+
+PLAIN = 'plain'
+# Name: arguments of RecordedFakeBrowser. None runs the plain FakeBrowser
+CONFIGS = {
+    PLAIN: None,
+    'record': {},
+    'journal+store': {'journal': True, 'screenshot_store': True},
+    'async+pool': {'async_save': True, 'screenshot_store': True, 'screenshot_workers': 2},
+    'change_detection': {'change_detection': True},
+}
+STEPS_PER_TASK = 5
+
+
+def build_suite(steps: int, library: str, arguments: dict) -> str:
+    """
+    Test with `steps` keywords of the page. Steps are grouped in tasks (user keywords) like recorded tests.
+    """
+    actions = []
+    for i in range(steps):
+        kind = i % 3
+        if kind == 0:
+            actions.append(f'    FakeBrowser.Click    id=button-{i}')
+        elif kind == 1:
+            actions.append(f'    FakeBrowser.Fill Text    id=input-{i}    value {i}')
+        else:
+            actions.append(f'    FakeBrowser.Get Text    id=label-{i}')
+    tasks = [actions[i:i + STEPS_PER_TASK] for i in range(0, steps, STEPS_PER_TASK)]
+    library_args = ''.join(f'    {k}={v}' for k, v in arguments.items())
+    lines = ['*** Settings ***', f'Library    {library}{library_args}    AS    FakeBrowser', '',
+             '*** Test Cases ***', 'Fill Form', '    FakeBrowser.New Page    https://example.com/form']
+    lines += [f'    Task {t}' for t in range(len(tasks))]
+    lines += ['', '*** Keywords ***']
+    for t, task in enumerate(tasks):
+        lines += [f'Task {t}'] + task
+    return '\n'.join(lines) + '\n'
+
+
+def parse_config(value: str) -> tuple[str, dict]:
+    """
+    name:key=value,key=value
+    """
+    name, _, options = value.partition(':')
+    return name, dict(option.split('=', 1) for option in options.split(',') if option)
+
+
+def output_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+def run_suite(suite_path: str, output_path: str) -> float:
+    shutil.rmtree(output_path, ignore_errors=True)
+    stdout = io.StringIO()
+    start = time.perf_counter()
+    rc = robot.run(suite_path, pythonpath=[BENCHMARKS_DIR], output='NONE', log='NONE', report='NONE',
+                   stdout=stdout, stderr=stdout)
+    elapsed = time.perf_counter() - start
+    if rc != 0:
+        raise RuntimeError(f"Benchmark suite {suite_path} failed:\n{stdout.getvalue()}")
+    return elapsed
+
+
+def measure(name: str, options, args, tmpdir: str) -> tuple[float, float, int]:
+    """
+    Returns (best seconds, peak MB, output bytes) of the configuration.
+    """
+    output_path = os.path.join(tmpdir, name)
+    arguments = {'action_ms': args.action_ms, 'screenshot_ms': args.screenshot_ms, 'dom_ms': args.dom_ms,
+                 'element_ms': args.element_ms, 'screenshot_size': args.screenshot_size, 'dom_kb': args.dom_kb}
+    if options is None:
+        library = 'fake_browser.FakeBrowser'
+    else:
+        library = 'fake_browser.RecordedFakeBrowser'
+        arguments = {**arguments, 'output_path': output_path, **options}
+    suite_path = os.path.join(tmpdir, f"{name.replace('+', '_')}.robot")
+    with open(suite_path, 'w') as f:
+        f.write(build_suite(args.steps, library, arguments))
+
+    best = min(run_suite(suite_path, output_path) for _ in range(args.repeat))
+    size = output_size(output_path)
+    tracemalloc.start()
+    try:
+        run_suite(suite_path, output_path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1024 / 1024, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--action-ms', type=float, default=5)
+    parser.add_argument('--screenshot-ms', type=float, default=15)
+    parser.add_argument('--dom-ms', type=float, default=5)
+    parser.add_argument('--element-ms', type=float, default=1)
+    parser.add_argument('--screenshot-size', default='1280x720')
+    parser.add_argument('--dom-kb', type=float, default=50)
+    parser.add_argument('--config', action='append', default=[], type=parse_config,
+                        help='Extra configuration name:arg=value,... of RecordedFakeBrowser')
+    parser.add_argument('--only', default=None, help='Comma separated configurations to run. plain is always run')
+    args = parser.parse_args()
+
+    configs = {**CONFIGS, **dict(args.config)}
+    if args.only:
+        names = {PLAIN, *args.only.split(',')}
+        configs = {name: options for name, options in configs.items() if name in names}
+
+    print(f"{args.steps} steps, latency ms: action {args.action_ms}, screenshot {args.screenshot_ms}, "
+          f"dom {args.dom_ms}, element {args.element_ms}. Screenshot {args.screenshot_size}, dom {args.dom_kb} KB")
+    print(f"{'config':<20}{'ms/keyword':>12}{'overhead':>10}{'peak MB':>10}{'output KB':>12}")
+    FakeBrowser(screenshot_size=args.screenshot_size)  # Screenshots are built out of the measures
+    with tempfile.TemporaryDirectory() as tmpdir:
+        plain_ms = None
+        for name, options in configs.items():
+            seconds, peak_mb, size = measure(name, options, args, tmpdir)
+            ms = seconds / args.steps * 1000
+            plain_ms = ms if plain_ms is None else plain_ms
+            print(f"{name:<20}{ms:>12.2f}{ms - plain_ms:>10.2f}{peak_mb:>10.1f}{size / 1024:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
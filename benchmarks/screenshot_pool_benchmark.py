@@ -0,0 +1,104 @@
+"""
+Time spent by the keyword thread in screenshots and saves, with and without EncodingPool and BackgroundSaver.
+
+Every iteration simulates a keyword like the recorder runs it: the keyword waits for the browser (sleep), then the
+end observation is captured and the recording is saved with the new step. Without pool the screenshot is encoded
+before the save. With the pool it is encoded in a worker, but a synchronous save serializes the observation and
+waits for it. With async_save the save is done in the saver thread, so the encoding overlaps the next keyword.
+
+    python benchmarks/screenshot_pool_benchmark.py [--keywords 40] [--format webp] [--keyword-ms 150] [--workers 2]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image, ImageDraw  # noqa: E402
+from ButlerRobot.src.screenshot_codec import ScreenshotCodec, EncodingPool  # noqa: E402
+from ButlerRobot.src.background_saver import BackgroundSaver  # noqa: E402
+from ButlerRobot.src.data_types import Context, Observation, PageAction, Task  # noqa: E402
+from ButlerRobot.src.recording_format import save_recording  # noqa: E402
+
+
+def build_screenshot(size=(1280, 720)) -> bytes:
+    """
+    PNG that looks like a page: blocks of text-like noise on a white background.
+    """
+    random.seed(0)
+    im = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(im)
+    for y in range(20, size[1], 24):
+        x = 20
+        while x < size[0] - 100:
+            width = random.randint(20, 90)
+            draw.rectangle((x, y, x + width, y + 10), fill=(random.randint(0, 80),) * 3)
+            x += width + 8
+    buff = BytesIO()
+    im.save(buff, format='PNG')
+    return buff.getvalue()
+
+
+def run(data: bytes, args, pool: bool, async_save: bool) -> tuple[float, float]:
+    """
+    Returns (seconds of the keyword thread in screenshots and saves, total seconds).
+    """
+    codec = ScreenshotCodec(args.format, quality=80)
+    encoding_pool = EncodingPool(codec, args.workers) if pool else None
+    saver = BackgroundSaver() if async_save else None
+    blocked = 0.0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        save_path = os.path.join(tmpdirname, 'recording.json')
+        last_observation = Observation('2023-01-01T12:00:00', '', '<html></html>')
+        task = Task(id=0, name='Benchmark', context=Context(last_observation, 'PASS'))
+        for i in range(args.keywords):
+            time.sleep(args.keyword_ms / 1000)  # The keyword waits for the browser
+            t = time.perf_counter()
+            if encoding_pool is not None:
+                screenshot = encoding_pool.submit(data)
+            else:
+                screenshot = codec.to_base64(codec.encode(data))
+            observation = Observation('2023-01-01T12:00:00', screenshot, '<html></html>')
+            task.add_step(PageAction(id=i + 1, name='Click', context=Context(last_observation, 'PASS', observation)))
+            last_observation = observation
+            # The recorder saves the root at the end of every keyword
+            if saver is not None:
+                saver.save(task, save_path)
+            else:
+                save_recording(task, save_path)
+            blocked += time.perf_counter() - t
+        # The end of the test waits for the last save
+        t = time.perf_counter()
+        if saver is not None:
+            saver.close()
+        blocked += time.perf_counter() - t
+    if encoding_pool is not None:
+        encoding_pool.close()
+    return blocked, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keywords', type=int, default=40)
+    parser.add_argument('--format', default='webp')
+    parser.add_argument('--keyword-ms', type=float, default=150)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    data = build_screenshot()
+    print(f"{args.keywords} keywords, {len(data) / 1024:.0f} KB PNG -> {args.format}, {os.cpu_count()} cpus")
+    print(f"{'mode':<20}{'ms/keyword blocked':>20}{'total s':>10}")
+    for name, pool, async_save in (('inline', False, False), ('pool', True, False),
+                                   ('inline + async_save', False, True), ('pool + async_save', True, True)):
+        blocked, total = run(data, args, pool, async_save)
+        print(f"{name:<20}{blocked / args.keywords * 1000:>20.1f}{total:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -78,7 +78,7 @@ setup_kwargs = {
     "packages": packages,
     "install_requires": base_requires,
     "entry_points": {"console_scripts": ["rfbrowser=Browser.entry:main"]},
-    "python_requires": ">=3.7,<4.0",
+    "python_requires": ">=3.10,<4.0",
     "classifiers": [
         "Operating System :: OS Independent",
         "Programming Language :: Python :: 3",